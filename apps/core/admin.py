@@ -1,3 +1,60 @@
 from django.contrib import admin
 
-# Register your models here.
+from apps.core.models import BackgroundJob, ChunkedUpload, MediaBlob
+from apps.core.services.blob_index import BlobIndex
+from apps.core.services.job_queue import JobQueue
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['handler', 'status', 'attempts', 'created_at', 'run_after', 'get_latency']
+    list_filter = ['status', 'handler']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'last_error', 'result']
+    date_hierarchy = 'created_at'
+
+    def get_latency(self, obj):
+        latency = obj.latency
+        return f"{latency.total_seconds():.1f}s" if latency else '-'
+
+    get_latency.short_description = 'Latência'
+
+    def changelist_view(self, request, extra_context=None):
+        stats = JobQueue.stats()
+        latency = stats['avg_latency_seconds']
+        self.message_user(
+            request,
+            f"Fila: {stats['pending']} pendentes, {stats['running']} em execução, "
+            f"{stats['failed']} falhadas. Latência média: "
+            f"{f'{latency:.1f}s' if latency is not None else '-'}",
+        )
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['file_id', 'ref_count', 'size', 'created_at', 'last_used_at']
+    search_fields = ['file_id', 'digest']
+    readonly_fields = ['digest', 'file_id', 'variants', 'size', 'created_at', 'last_used_at']
+
+    def changelist_view(self, request, extra_context=None):
+        stats = BlobIndex.stats()
+        self.message_user(
+            request,
+            f"{stats['blobs']} ficheiros, {stats['refs'] or 0} referências, "
+            f"{stats['uploads_saved']} uploads evitados por deduplicação",
+        )
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'status', 'get_progress', 'chunks_uploaded', 'chunks_total', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['file_name', 'file_id']
+    readonly_fields = ['file_id', 'fingerprint', 'total_size', 'chunk_size', 'chunks_total',
+                       'chunks_uploaded', 'chunk_digests', 'last_error', 'created_at', 'updated_at']
+
+    def get_progress(self, obj):
+        return f"{obj.progress}%"
+
+    get_progress.short_description = 'Progresso'
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.core.services.job_queue import JobQueue
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de tarefas em segundo plano (uploads para o Appwrite, QR codes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Processa as tarefas pendentes e termina")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Segundos de espera quando a fila está vazia")
+        parser.add_argument('--batch-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        requeued = JobQueue.requeue_stale()
+        if requeued:
+            self.stdout.write(f"{requeued} tarefas interrompidas devolvidas à fila")
+
+        processed = 0
+        while self._running:
+            close_old_connections()
+            jobs = JobQueue.due_jobs(options['batch_size'])
+            for job in jobs:
+                if not self._running:
+                    break
+                if JobQueue.run(job):
+                    processed += 1
+
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} tarefas concluídas"))
+
+    def _stop(self, signum, frame):
+        self._running = False
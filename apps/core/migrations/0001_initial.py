@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('handler', models.CharField(max_length=200)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('file_path', models.CharField(blank=True, max_length=500, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em execução'), ('done', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('run_after', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='core_backgr_status_24aba0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('file_id', models.CharField(db_index=True, max_length=100)),
+                ('variants', models.JSONField(blank=True, null=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_media_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.CharField(max_length=36, unique=True)),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('file_name', models.CharField(max_length=255)),
+                ('total_size', models.PositiveBigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('chunks_total', models.PositiveIntegerField()),
+                ('chunks_uploaded', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('uploading', 'A enviar'), ('complete', 'Concluído'), ('failed', 'Interrompido')], default='uploading', max_length=10)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
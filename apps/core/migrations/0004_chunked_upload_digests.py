@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='chunk_digests',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,118 @@
+from django.db import models
+
+
+class BackgroundJob(models.Model):
+    """
+    Tarefa da fila local (ver `apps/core/services/job_queue.py`).
+    `handler` é o caminho da função que a executa e `file_path` um ficheiro
+    preparado em disco (ex.: imagem a enviar para o Appwrite).
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('running', 'Em execução'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+
+    handler = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    file_path = models.CharField(max_length=500, blank=True, null=True)
+    file_name = models.CharField(max_length=255, blank=True, null=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+
+    run_after = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    @property
+    def latency(self):
+        """Tempo entre a criação e a conclusão da tarefa"""
+        if self.finished_at and self.created_at:
+            return self.finished_at - self.created_at
+        return None
+
+    def __str__(self):
+        return f"{self.handler} ({self.status})"
+
+
+class MediaBlob(models.Model):
+    """
+    Índice de conteúdo dos ficheiros enviados para o Appwrite (ver
+    `apps/core/services/blob_index.py`). `digest` identifica os bytes de origem
+    e o processamento aplicado; `ref_count` conta as referências (avatar ou
+    recordação de um convidado) e o ficheiro só é apagado quando chega a zero.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    file_id = models.CharField(max_length=100, db_index=True)
+    # Variantes geradas com o ficheiro (ver ImageDerivativeService), se existirem
+    variants = models.JSONField(blank=True, null=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=1)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def file_ids(self):
+        """Todos os ficheiros do Appwrite que pertencem a este blob"""
+        ids = {self.file_id}
+        for variant in (self.variants or {}).values():
+            ids.update(value for key, value in variant.items() if key not in ('width', 'height') and value)
+        return sorted(ids)
+
+    def __str__(self):
+        return f"{self.file_id} ({self.ref_count} refs)"
+
+
+class ChunkedUpload(models.Model):
+    """
+    Estado de um upload em partes para o Appwrite (ver
+    `apps/core/services/chunked_upload.py`). Permite retomar um envio
+    interrompido a partir da última parte confirmada e acompanhar o progresso.
+    """
+
+    STATUS_CHOICES = [
+        ('uploading', 'A enviar'),
+        ('complete', 'Concluído'),
+        ('failed', 'Interrompido'),
+    ]
+
+    file_id = models.CharField(max_length=36, unique=True)
+    # Identifica o mesmo ficheiro numa nova tentativa (nome, tamanho e primeira parte)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    file_name = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    chunks_total = models.PositiveIntegerField()
+    chunks_uploaded = models.PositiveIntegerField(default=0)
+    # SHA-256 de cada parte enviada: ao retomar, uma parte diferente (o ficheiro
+    # mudou depois da primeira parte) faz recomeçar o upload do zero
+    chunk_digests = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def progress(self):
+        """Percentagem de partes confirmadas pelo Appwrite"""
+        if not self.chunks_total:
+            return 100.0
+        return round(self.chunks_uploaded / self.chunks_total * 100, 1)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.progress}%)"
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+
+import requests
+from appwrite import client as appwrite_client_module
+from appwrite.client import Client
+from appwrite.services.storage import Storage
+from requests.adapters import HTTPAdapter
+
+from digital_invite.settings import base
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledRequests:
+    """
+    Faz de módulo `requests` para o SDK do Appwrite: as chamadas passam por
+    uma `requests.Session` por processo, com pool de ligações e timeouts
+    configuráveis, e são contabilizadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def __getattr__(self, name):
+        # exceptions, codes, etc. continuam a vir do módulo original
+        return getattr(requests, name)
+
+    def _get_session(self):
+        # Depois de um fork (gunicorn/uwsgi) não reutiliza sockets do processo pai
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    pool_size = getattr(base, 'APPWRITE_POOL_SIZE', 10)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (
+            getattr(base, 'APPWRITE_CONNECT_TIMEOUT', 5),
+            getattr(base, 'APPWRITE_READ_TIMEOUT', 30),
+        ))
+        start = time.perf_counter()
+        try:
+            return self._get_session().request(method=method, url=url, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.calls += 1
+                self.total_seconds += elapsed
+
+    def connection_stats(self):
+        new_connections = requests_served = 0
+        session = self._session
+        if session is not None and self._pid == os.getpid():
+            for adapter in set(session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        new_connections += pool.num_connections
+                        requests_served += pool.num_requests
+        return new_connections, requests_served
+
+
+_pooled_requests = _PooledRequests()
+
+
+def install_pooled_requests():
+    """
+    Liga o SDK ao pool de `_PooledRequests`.
+
+    `Client.call` faz cada chamada com `requests.request` (sessão nova, sem
+    keep-alive nem timeout), lido do global `requests` de `appwrite.client`.
+    Só esse atributo é substituído: o módulo `requests` continua intacto para
+    o resto do processo.
+    """
+    appwrite_client_module.requests = _pooled_requests
+
+
+class AppwriteClientPool:
+    """
+    Cliente e serviço Storage do Appwrite partilhados pelo processo.
+    O `Client` do SDK só guarda configuração, por isso pode ser usado por
+    várias threads; as ligações HTTP ficam no pool de `_PooledRequests`
+    (ver `install_pooled_requests`).
+    """
+
+    _lock = threading.Lock()
+    _client = None
+    _storage = None
+    _pid = None
+
+    @classmethod
+    def get_client(cls) -> Client:
+        if cls._client is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._client is None or cls._pid != os.getpid():
+                    install_pooled_requests()
+                    client = Client()
+                    client.set_endpoint(base.APPWRITE_ENDPOINT)
+                    client.set_project(base.APPWRITE_PROJECT_ID)
+                    client.set_key(base.APPWRITE_API_KEY)
+                    cls._client = client
+                    cls._storage = Storage(client)
+                    cls._pid = os.getpid()
+        return cls._client
+
+    @classmethod
+    def get_storage(cls) -> Storage:
+        cls.get_client()
+        return cls._storage
+
+    @classmethod
+    def reset(cls):
+        """Descarta o cliente (ex.: depois de mudar endpoint ou chave)"""
+        with cls._lock:
+            cls._client = None
+            cls._storage = None
+
+    @staticmethod
+    def stats() -> dict:
+        """
+        Chamadas ao Appwrite, latência média e reutilização de ligações
+        """
+        new_connections, requests_served = _pooled_requests.connection_stats()
+        with _pooled_requests._stats_lock:
+            calls, errors, total_seconds = (_pooled_requests.calls, _pooled_requests.errors,
+                                            _pooled_requests.total_seconds)
+        return {
+            'calls': calls,
+            'errors': errors,
+            'avg_latency_ms': (total_seconds / calls * 1000) if calls else None,
+            'connections_opened': new_connections,
+            'connections_reused': max(requests_served - new_connections, 0),
+        }
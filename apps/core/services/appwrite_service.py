@@ -1,19 +1,40 @@
+import io
 import logging
 import os
 import tempfile
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
 
 from appwrite.client import Client
-from appwrite.services.storage import Storage
 from appwrite.input_file import InputFile
+from apps.core.services.appwrite_client import AppwriteClientPool
+from apps.core.services.storage_backends import get_storage
 from digital_invite.settings import base
 from PIL import Image, UnidentifiedImageError
 
+# Assinaturas dos formatos de imagem suportados (primeiros bytes do ficheiro)
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+
+# Buffer de codificação reutilizado por thread (evita realocações por upload)
+_encode_buffers = threading.local()
+
 
 class AppwriteService:
     """
     Serviço utilitário para integração com Appwrite Storage.
     Arquivo: `apps/core/services/appwrite_service.py`
+
+    O armazenamento em si é feito pelo backend de `STORAGE_BACKEND`
+    (ver `storage_backends.py`): Appwrite, disco local ou memória.
     """
 
     @staticmethod
@@ -26,11 +47,8 @@ class AppwriteService:
 
     @staticmethod
     def get_client() -> Client:
-        client = Client()
-        client.set_endpoint(base.APPWRITE_ENDPOINT)
-        client.set_project(base.APPWRITE_PROJECT_ID)
-        client.set_key(base.APPWRITE_API_KEY)
-        return client
+        # Cliente partilhado pelo processo, com pool de ligações e timeouts
+        return AppwriteClientPool.get_client()
 
     @staticmethod
     def _is_image(path: str) -> bool:
@@ -40,92 +58,340 @@ class AppwriteService:
         except (UnidentifiedImageError, OSError):
             return False
 
+    @staticmethod
+    def _resize_pil(img, target_size: Tuple[int, int]):
+        """
+        Redimensiona `img` para caber dentro de `target_size` mantendo a proporção.
+        Retorna (imagem, kwargs para `save`).
+        Compatível com diferentes versões do Pillow.
+        """
+        target_w, target_h = target_size
+        img_format = img.format or "JPEG"
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+        # Converte para RGB quando não há alpha (compatibilidade JPEG)
+        if not has_alpha:
+            img = img.convert("RGB")
+
+        # Compatibilidade Pillow: usa Image.Resampling.LANCZOS quando disponível
+        resample = getattr(Image, "Resampling", Image).LANCZOS
+        img.thumbnail((target_w, target_h), resample=resample)
+
+        save_kwargs = {}
+        if has_alpha and img_format.upper() == "PNG":
+            save_kwargs["format"] = "PNG"
+        else:
+            save_kwargs["format"] = "JPEG"
+            save_kwargs["quality"] = 85
+        return img, save_kwargs
+
     @staticmethod
     def _resize_image(path: str, target_size: Tuple[int, int]) -> None:
         """
         Redimensiona a imagem em `path` para caber dentro de `target_size`
         mantendo a proporção. Substitui o ficheiro original.
-        Compatível com diferentes versões do Pillow.
         """
         try:
             with Image.open(path) as img:
-                target_w, target_h = target_size
-                if img.size == (target_w, target_h):
+                if img.size == tuple(target_size):
                     return
+                resized, save_kwargs = AppwriteService._resize_pil(img, target_size)
+                resized.save(path, **save_kwargs)
+        except (UnidentifiedImageError, OSError) as exc:
+            logging.warning("Falha ao redimensionar imagem (%s): %s", path, exc)
+            # prosseguir sem redimensionamento
+        except Exception as exc:
+            logging.warning("Falha inesperada ao redimensionar imagem (%s): %s", path, exc)
+
+    @staticmethod
+    def _detect_format(head: bytes) -> Optional[str]:
+        """
+        Identifica o formato da imagem pelos primeiros bytes, sem abrir o Pillow
+        """
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return "WEBP"
+        for signature, image_format in _IMAGE_SIGNATURES:
+            if head.startswith(signature):
+                return image_format
+        return None
 
-                img_format = img.format or "JPEG"
-                has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    @staticmethod
+    def _encode_buffer() -> io.BytesIO:
+        buffer = getattr(_encode_buffers, "buffer", None)
+        if buffer is None:
+            buffer = _encode_buffers.buffer = io.BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        return buffer
 
-                # Converte para RGB quando não há alpha (compatibilidade JPEG)
-                if not has_alpha:
-                    img = img.convert("RGB")
+    @staticmethod
+    def _resize_bytes(source, name: str, target_size: Optional[Tuple[int, int]]) -> Optional[Tuple[bytes, str]]:
+        """
+        Descodifica `source` (bytes ou caminho) uma única vez e redimensiona-o em
+        memória. JPEGs usam o modo draft do Pillow, que reduz a escala logo na
+        descodificação (fotos de telemóvel de 12MP não são descodificadas inteiras).
+        Retorna (bytes, nome) ou None se não for uma imagem ou não precisar de resize.
+        """
+        if not target_size:
+            return None
 
-                # Compatibilidade Pillow: usa Image.Resampling.LANCZOS quando disponível
-                resample = getattr(Image, "Resampling", Image).LANCZOS
-                img.thumbnail((target_w, target_h), resample=resample)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            head = bytes(source[:16])
+            stream = io.BytesIO(source)
+        else:
+            with open(source, "rb") as f:
+                head = f.read(16)
+            stream = source
 
-                save_kwargs = {}
-                if has_alpha and img_format.upper() == "PNG":
-                    save_kwargs["format"] = "PNG"
-                else:
-                    save_kwargs["format"] = "JPEG"
-                    save_kwargs["quality"] = 85
+        image_format = AppwriteService._detect_format(head)
+        if image_format is None:
+            return None
 
-                img.save(path, **save_kwargs)
+        try:
+            with Image.open(stream) as img:
+                if img.size == tuple(target_size):
+                    return None
+                if image_format == "JPEG":
+                    img.draft("RGB", tuple(target_size))
+                resized, save_kwargs = AppwriteService._resize_pil(img, target_size)
+                buffer = AppwriteService._encode_buffer()
+                resized.save(buffer, **save_kwargs)
+                data = buffer.getvalue()
         except (UnidentifiedImageError, OSError) as exc:
-            logging.warning("Falha ao redimensionar imagem (%s): %s", path, exc)
-            # prosseguir sem redimensionamento
-        except Exception as exc:
-            logging.warning("Falha inesperada ao redimensionar imagem (%s): %s", path, exc)
+            logging.warning("Falha ao redimensionar imagem (%s): %s", name, exc)
+            return None
+
+        root = os.path.splitext(name)[0]
+        extension = ".png" if save_kwargs["format"] == "PNG" else ".jpg"
+        return data, f"{root}{extension}"
+
+    @staticmethod
+    def _disk_path(file) -> Optional[str]:
+        """
+        Caminho do ficheiro se já estiver em disco (upload grande do Django ou
+        ficheiro preparado pela fila de tarefas), para não o copiar
+        """
+        if hasattr(file, "temporary_file_path"):
+            return file.temporary_file_path()
+        path = getattr(getattr(file, "file", None), "name", None)
+        if isinstance(path, str) and os.path.isfile(path):
+            return path
+        return None
 
     @staticmethod
     def _create_input_file(path: str) -> InputFile:
         return InputFile.from_path(path)
 
     @staticmethod
-    def _upload_to_appwrite(input_file: InputFile, permissions: list) -> Optional[str]:
-        client = AppwriteService.get_client()
-        storage = Storage(client)
-        result = storage.create_file(
-            bucket_id=base.APPWRITE_BUCKET_ID,
-            file_id="unique()",
-            file=input_file,
-            permissions=permissions,
-        )
-        # result normalmente é um dict com $id
-        return result.get("$id") if isinstance(result, dict) else None
+    def _upload_to_storage(input_file: InputFile, permissions: list) -> Optional[str]:
+        # Envia para o backend configurado em STORAGE_BACKEND (Appwrite, disco ou memória)
+        storage = get_storage()
+        if input_file.source_type == "path":
+            return storage.save_path(input_file.path, input_file.filename, permissions)
+        return storage.save(input_file.data, input_file.filename, permissions, input_file.mime_type)
 
     @staticmethod
-    def upload_file(file, permissions: Optional[list] = None, resize_to: Optional[Tuple[int, int]] = None) -> Optional[str]:
+    def upload_file(file, permissions: Optional[list] = None, resize_to: Optional[Tuple[int, int]] = None,
+                    dedupe: bool = True) -> Optional[str]:
         """
         Faz upload de `file` para Appwrite. Se `resize_to` for fornecido e o ficheiro
         for uma imagem, redimensiona antes do upload. Retorna o id do ficheiro ou None.
+
+        Ficheiros pequenos são processados inteiramente em memória; o disco só é
+        usado quando o ficheiro já lá está ou excede `UPLOAD_MEMORY_LIMIT`.
+
+        Com `dedupe`, conteúdo já enviado (mesmos bytes e mesmo resize) não é
+        processado de novo: retorna o id existente e soma-lhe uma referência
+        (ver `BlobIndex`).
         """
+        from apps.core.services.blob_index import BlobIndex  # importação local
+
         permissions = permissions or ['read("any")']
-        temp_path = AppwriteService._save_temp_file(file)
+        name = os.path.basename(getattr(file, "name", None) or "upload")
+        temp_path = None
 
         try:
-            if resize_to and AppwriteService._is_image(temp_path):
-                AppwriteService._resize_image(temp_path, resize_to)
+            size = getattr(file, "size", None) or 0
+            if not resize_to and size > getattr(base, "UPLOAD_MEMORY_LIMIT", 25 * 1024 * 1024):
+                # Ficheiros grandes sem processamento (ex.: vídeos) vão em partes
+                return AppwriteService.upload_large(file, permissions)
 
-            input_file = AppwriteService._create_input_file(temp_path)
-            file_id = AppwriteService._upload_to_appwrite(input_file, permissions)
+            path = AppwriteService._disk_path(file)
+            data = None
+            if path is None:
+                if size > getattr(base, "UPLOAD_MEMORY_LIMIT", 25 * 1024 * 1024):
+                    path = temp_path = AppwriteService._save_temp_file(file)
+                else:
+                    data = b"".join(file.chunks())
+            source = data if data is not None else path
+
+            digest = None
+            if dedupe:
+                digest = BlobIndex.digest(source, f"upload:{tuple(resize_to) if resize_to else None}")
+                blob = BlobIndex.acquire(digest)
+                if blob is not None:
+                    return blob.file_id
+            source_size = len(data) if data is not None else os.path.getsize(path)
+
+            resized = AppwriteService._resize_bytes(source, name, resize_to)
+            if resized is not None:
+                data, name = resized
+
+            if data is not None:
+                input_file = InputFile.from_bytes(data, name)
+            else:
+                input_file = AppwriteService._create_input_file(path)
+                input_file.filename = name
+            file_id = AppwriteService._upload_to_storage(input_file, permissions)
+            if file_id and digest:
+                file_id = BlobIndex.register(digest, file_id, size=source_size).file_id
             return file_id
         except Exception as exc:
             logging.error("Erro ao fazer upload para Appwrite: %s", exc)
             return None
         finally:
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 try:
                     os.unlink(temp_path)
                 except OSError:
                     logging.warning("Falha ao remover ficheiro temporário: %s", temp_path)
 
+    @staticmethod
+    def upload_large(file, permissions: Optional[list] = None, on_progress=None) -> Optional[str]:
+        """
+        Upload em partes de 5MB lidas diretamente de `file.chunks()`, retomável
+        (ver `ChunkedUploadService`). Retorna o id do ficheiro ou None.
+        """
+        from apps.core.services.chunked_upload import ChunkedUploadService  # importação local
+
+        try:
+            return ChunkedUploadService.upload(file, permissions, on_progress=on_progress).file_id
+        except Exception as exc:
+            logging.error("Erro no upload em partes para Appwrite: %s", exc)
+            return None
+
+    @staticmethod
+    def _upload_bytes(data: bytes, name: str, permissions: list) -> Optional[str]:
+        file_id = AppwriteService._upload_to_storage(InputFile.from_bytes(data, name), permissions)
+        if not file_id:
+            raise RuntimeError(f"Appwrite não devolveu id para {name}")
+        return file_id
+
+    @staticmethod
+    def _completed(fn, *args) -> Future:
+        """Corre `fn` já e devolve um Future com o resultado ou a exceção"""
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    @staticmethod
+    def upload_many(files, permissions: Optional[list] = None, resize_to: Optional[Tuple[int, int]] = None,
+                    max_processes: Optional[int] = None, max_uploads: Optional[int] = None,
+                    dedupe: bool = True) -> List[dict]:
+        """
+        Faz upload de vários ficheiros: o redimensionamento (CPU) corre num pool
+        de processos e cada ficheiro pronto é logo enviado por um pool limitado
+        de threads (rede), sobrepondo as duas fases.
+
+        Retorna uma lista na mesma ordem de `files`, com um dict por ficheiro:
+        {'name', 'file_id', 'error'}. Uma falha não interrompe o lote.
+
+        Com `dedupe`, como em `upload_file`, conteúdo já enviado não é
+        redimensionado nem enviado de novo (ver `BlobIndex`).
+        """
+        from apps.core.services.blob_index import BlobIndex  # importação local
+
+        permissions = permissions or ['read("any")']
+        max_processes = max_processes or getattr(base, 'UPLOAD_RESIZE_PROCESSES', None) or os.cpu_count() or 1
+        max_uploads = max_uploads or getattr(base, 'UPLOAD_CONCURRENCY', 4)
+
+        results = []
+        sources = []
+        digests = []
+        for file in files:
+            name = os.path.basename(getattr(file, 'name', None) or 'upload')
+            data = b"".join(file.chunks()) if hasattr(file, 'chunks') else file.read()
+            result = {'name': name, 'file_id': None, 'error': None}
+            digest = None
+            if dedupe:
+                digest = BlobIndex.digest(data, f"upload:{tuple(resize_to) if resize_to else None}")
+                blob = BlobIndex.acquire(digest)
+                if blob is not None:
+                    result['file_id'] = blob.file_id
+                    data = None
+            results.append(result)
+            sources.append(data)
+            digests.append(digest)
+
+        pending = [i for i, data in enumerate(sources) if data is not None]
+        if not pending:
+            return results
+
+        # Sem pool de processos para um único ficheiro (o arranque custa mais que o ganho)
+        use_processes = resize_to and len(pending) > 1 and max_processes > 1
+        resize_pool = ProcessPoolExecutor(max_workers=min(max_processes, len(pending))) if use_processes else None
+        upload_pool = ThreadPoolExecutor(max_workers=min(max_uploads, len(pending)))
+
+        try:
+            if resize_pool:
+                resizes = {
+                    resize_pool.submit(AppwriteService._resize_bytes, sources[i], results[i]['name'], resize_to): i
+                    for i in pending
+                }
+                ready = ((resizes[future], future) for future in as_completed(resizes))
+            else:
+                # Também como Future, para os erros caírem no try de cada ficheiro
+                ready = ((i, AppwriteService._completed(AppwriteService._resize_bytes, sources[i],
+                                                        results[i]['name'], resize_to))
+                         for i in pending)
+
+            uploads = {}
+            for index, future in ready:
+                try:
+                    resized = future.result()
+                except Exception as exc:
+                    logging.error("Erro ao redimensionar %s: %s", results[index]['name'], exc)
+                    results[index]['error'] = f"resize: {exc}"
+                    sources[index] = None
+                    continue
+                data, name = resized or (sources[index], results[index]['name'])
+                source_size = len(sources[index])
+                sources[index] = None  # liberta o original assim que possível
+                future = upload_pool.submit(AppwriteService._upload_bytes, data, name, permissions)
+                uploads[future] = (index, source_size)
+
+            for future in as_completed(uploads):
+                index, source_size = uploads[future]
+                try:
+                    file_id = future.result()
+                    if digests[index]:
+                        file_id = BlobIndex.register(digests[index], file_id, size=source_size).file_id
+                    results[index]['file_id'] = file_id
+                except Exception as exc:
+                    logging.error("Erro ao fazer upload de %s para Appwrite: %s", results[index]['name'], exc)
+                    results[index]['error'] = str(exc)
+        finally:
+            upload_pool.shutdown(wait=True)
+            if resize_pool:
+                resize_pool.shutdown(wait=True)
+
+        return results
+
+    @staticmethod
+    def delete_file(file_id: str) -> bool:
+        """Apaga um ficheiro do storage; um ficheiro que já não existe conta como apagado"""
+        return get_storage().delete(file_id)
+
+    @staticmethod
+    def download_file(file_id: str) -> bytes:
+        """Conteúdo de um ficheiro do storage (ex.: para gerar variantes)"""
+        return get_storage().read(file_id)
+
     @staticmethod
     def get_file_url(file_id: str) -> Optional[str]:
         if not file_id:
             return None
-        endpoint = base.APPWRITE_ENDPOINT.rstrip("/")
-        bucket_id = base.APPWRITE_BUCKET_ID
-        project_id = base.APPWRITE_PROJECT_ID
-        return f"{endpoint}/storage/buckets/{bucket_id}/files/{file_id}/view?project={project_id}"
+        return get_storage().url(file_id)
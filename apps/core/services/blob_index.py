@@ -0,0 +1,118 @@
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from apps.core.models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+
+class BlobIndex:
+    """
+    Deduplicação por conteúdo dos uploads para o Appwrite.
+
+    O digest é o SHA-256 dos bytes de origem mais uma chave com o processamento
+    aplicado (ex.: tamanho do resize), por isso a mesma foto enviada para vários
+    convidados é redimensionada e enviada uma única vez. Cada upload que
+    reutiliza ou cria um blob soma uma referência; `release` retira-as e apaga
+    do Appwrite (pela fila de tarefas) os ficheiros que ficaram sem nenhuma.
+    """
+
+    @staticmethod
+    def digest(source, key: str = '') -> str:
+        """`source` são bytes ou o caminho de um ficheiro"""
+        sha = hashlib.sha256(key.encode())
+        sha.update(b'\0')
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            sha.update(source)
+        else:
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def acquire(digest: str) -> Optional[MediaBlob]:
+        """
+        Se o conteúdo já foi enviado, soma uma referência e retorna o blob
+        """
+        with transaction.atomic():
+            if not MediaBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1):
+                return None
+            return MediaBlob.objects.get(digest=digest)
+
+    @staticmethod
+    def register(digest: str, file_id: str, size: int = 0, variants: Optional[dict] = None) -> MediaBlob:
+        """
+        Regista um upload novo com uma referência. Se outro processo registou o
+        mesmo conteúdo entretanto, usa o blob existente e descarta o upload duplicado.
+        """
+        try:
+            with transaction.atomic():
+                return MediaBlob.objects.create(digest=digest, file_id=file_id, size=size, variants=variants)
+        except IntegrityError:
+            blob = BlobIndex.acquire(digest)
+            if blob is None:
+                raise
+            duplicate = MediaBlob(file_id=file_id, variants=variants)
+            BlobIndex._delete_later(duplicate.file_ids)
+            return blob
+
+    @staticmethod
+    def release(file_ids: Iterable[str], delete_untracked: bool = False) -> int:
+        """
+        Retira uma referência por cada id (repetidos contam várias vezes).
+        Ficheiros fora do índice (uploads anteriores à deduplicação) são
+        mantidos, porque não se sabe quem mais os usa, exceto com
+        `delete_untracked` (ficheiros que o chamador sabe serem só seus).
+        Retorna o nº de blobs apagados.
+        """
+        file_ids = [file_id for file_id in file_ids if file_id]
+        if not file_ids:
+            return 0
+
+        to_delete = []
+        with transaction.atomic():
+            for file_id in file_ids:
+                released = MediaBlob.objects.filter(file_id=file_id, ref_count__gt=0).update(
+                    ref_count=F('ref_count') - 1
+                )
+                if not released and delete_untracked and not MediaBlob.objects.filter(file_id=file_id).exists():
+                    to_delete.append(file_id)
+            orphans = list(MediaBlob.objects.select_for_update().filter(file_id__in=set(file_ids), ref_count=0))
+            for blob in orphans:
+                to_delete.extend(blob.file_ids)
+            MediaBlob.objects.filter(pk__in=[blob.pk for blob in orphans]).delete()
+
+        if to_delete:
+            transaction.on_commit(lambda: BlobIndex._delete_later(to_delete))
+        return len(orphans)
+
+    @staticmethod
+    def _delete_later(file_ids):
+        from apps.core.services.job_queue import JobQueue  # importação local
+
+        JobQueue.enqueue("apps.core.services.blob_index.delete_files", {'file_ids': list(file_ids)})
+
+    @staticmethod
+    def stats() -> dict:
+        from django.db.models import Count, Sum
+
+        totals = MediaBlob.objects.aggregate(blobs=Count('pk'), refs=Sum('ref_count'), bytes=Sum('size'))
+        refs = totals['refs'] or 0
+        # cada referência além da primeira é um upload evitado
+        totals['uploads_saved'] = max(refs - totals['blobs'], 0)
+        return totals
+
+
+def delete_files(payload, file):
+    """Handler da fila: apaga do Appwrite os ficheiros de blobs sem referências"""
+    from apps.core.services.appwrite_service import AppwriteService  # importação local
+
+    failed = [file_id for file_id in payload['file_ids'] if not AppwriteService.delete_file(file_id)]
+    if failed:
+        raise RuntimeError(f"Falha ao apagar {len(failed)} ficheiros do Appwrite: {failed}")
+    return {'deleted': len(payload['file_ids'])}
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from typing import Callable, Iterator, Optional
+
+from apps.core.models import ChunkedUpload
+from apps.core.services.storage_backends import get_storage
+from digital_invite.settings import base
+
+logger = logging.getLogger(__name__)
+
+# O Appwrite exige partes de 5MB (exceto a última); os outros backends usam o mesmo tamanho
+CHUNK_SIZE = 5 * 1024 * 1024
+
+
+class ChunkedUploadService:
+    """
+    Upload em partes de ficheiros grandes (ex.: vídeos dos convites) para o
+    storage (Appwrite ou os backends locais, ver `storage_backends.py`). As
+    partes são lidas de `UploadedFile.chunks()` e enviadas uma a uma, por
+    isso a memória usada é a de uma parte, qualquer que seja o tamanho do
+    ficheiro.
+
+    O progresso fica em `ChunkedUpload`. Uma parte que falha é repetida com
+    backoff depois de confirmar no storage quantas partes ele já recebeu; se
+    o envio for abandonado, um novo upload do mesmo ficheiro retoma a partir
+    da última parte confirmada. As partes saltadas ao retomar são comparadas
+    com o SHA-256 guardado: se o ficheiro mudou, o upload recomeça do zero.
+    """
+
+    @staticmethod
+    def _exact_chunks(file, chunk_size: int) -> Iterator[bytes]:
+        """
+        Reagrupa `file.chunks()` em partes de exatamente `chunk_size` bytes
+        (a última pode ser menor), com no máximo uma parte em memória
+        """
+        buffer = bytearray()
+        for piece in file.chunks(chunk_size=chunk_size):
+            buffer.extend(piece)
+            while len(buffer) >= chunk_size:
+                yield bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+        if buffer:
+            yield bytes(buffer)
+
+    @staticmethod
+    def _fingerprint(name: str, size: int, first_chunk: bytes) -> str:
+        sha = hashlib.sha256(f"{name}:{size}:".encode())
+        sha.update(first_chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def remote_chunks(file_id: str) -> Optional[int]:
+        """Partes que o storage já confirmou, ou None se o ficheiro não existir lá"""
+        return get_storage().chunks_uploaded(file_id)
+
+    @staticmethod
+    def _send_chunk(record, index: int, data: bytes, permissions: list, mime_type: Optional[str]):
+        get_storage().save_chunk(
+            record.file_id, record.file_name, data,
+            start=index * record.chunk_size,
+            total_size=record.total_size,
+            permissions=permissions,
+            mime_type=mime_type,
+        )
+
+    @staticmethod
+    def _start_or_resume(name: str, size: int, first_chunk: bytes) -> ChunkedUpload:
+        fingerprint = ChunkedUploadService._fingerprint(name, size, first_chunk)
+        record = (
+            ChunkedUpload.objects
+            .filter(fingerprint=fingerprint, chunk_size=CHUNK_SIZE)
+            .exclude(status='complete')
+            .order_by('-updated_at')
+            .first()
+        )
+        if record is not None:
+            confirmed = ChunkedUploadService.remote_chunks(record.file_id)
+            record.chunks_uploaded = confirmed or 0
+            record.status = 'uploading'
+            record.save(update_fields=['chunks_uploaded', 'status', 'updated_at'])
+            logger.info(f"A retomar upload {record.file_id} ({name}) na parte {record.chunks_uploaded + 1}/{record.chunks_total}")
+            return record
+
+        return ChunkedUpload.objects.create(
+            file_id=uuid.uuid4().hex,
+            fingerprint=fingerprint,
+            file_name=name,
+            total_size=size,
+            chunk_size=CHUNK_SIZE,
+            chunks_total=max(1, -(-size // CHUNK_SIZE)),
+        )
+
+    @staticmethod
+    def _fail(record: ChunkedUpload, message: str):
+        record.status = 'failed'
+        record.last_error = message
+        record.save(update_fields=['status', 'last_error', 'updated_at'])
+
+    @staticmethod
+    def _restart(record: ChunkedUpload):
+        """Descarta um upload cujas partes já enviadas são de outro conteúdo"""
+        logger.warning(f"Upload {record.file_id} ({record.file_name}) não corresponde ao ficheiro; a recomeçar")
+        try:
+            get_storage().delete(record.file_id)
+        except Exception as exc:
+            logger.warning(f"Falha ao apagar o upload parcial {record.file_id}: {exc}")
+        record.delete()
+
+    @staticmethod
+    def upload(file, permissions: Optional[list] = None,
+               on_progress: Optional[Callable[[ChunkedUpload], None]] = None,
+               max_retries: Optional[int] = None) -> ChunkedUpload:
+        """
+        Envia `file` (um `UploadedFile` ou `File` do Django) em partes.
+        Retorna o `ChunkedUpload` concluído; levanta exceção se uma parte
+        falhar mais de `max_retries` vezes (o registo fica 'failed' e pode ser retomado)
+        e ValueError se o conteúdo não tiver `file.size` bytes.
+        """
+        permissions = permissions or ['read("any")']
+        max_retries = max_retries if max_retries is not None else getattr(base, 'UPLOAD_CHUNK_RETRIES', 3)
+        name = os.path.basename(getattr(file, 'name', None) or 'upload')
+        size = file.size
+        mime_type = getattr(file, 'content_type', None) or mimetypes.guess_type(name)[0]
+
+        record, received = None, 0
+        for index, data in enumerate(ChunkedUploadService._exact_chunks(file, CHUNK_SIZE)):
+            if record is None:
+                record = ChunkedUploadService._start_or_resume(name, size, data)
+            received += len(data)
+            if received > size:
+                ChunkedUploadService._fail(record, f"O ficheiro tem mais de {size} bytes")
+                raise ValueError(f"{name}: o conteúdo é maior que o tamanho indicado ({size} bytes)")
+            digest = hashlib.sha256(data).hexdigest()
+            if index < record.chunks_uploaded:
+                # já confirmada numa tentativa anterior, se for a mesma parte
+                if index >= len(record.chunk_digests):
+                    record.chunk_digests.append(digest)  # registo anterior aos digests
+                if record.chunk_digests[index] == digest:
+                    continue
+                ChunkedUploadService._restart(record)
+                return ChunkedUploadService.upload(file, permissions, on_progress, max_retries)
+
+            attempt = 0
+            while True:
+                try:
+                    ChunkedUploadService._send_chunk(record, index, data, permissions, mime_type)
+                    break
+                except Exception as exc:
+                    attempt += 1
+                    # A parte pode ter chegado apesar do erro (ex.: timeout na resposta)
+                    try:
+                        confirmed = ChunkedUploadService.remote_chunks(record.file_id) or 0
+                    except Exception:
+                        confirmed = record.chunks_uploaded
+                    if confirmed > index:
+                        break
+                    if attempt > max_retries:
+                        ChunkedUploadService._fail(record, f"Parte {index + 1}/{record.chunks_total}: {exc}")
+                        logger.error(f"Upload {record.file_id} ({name}) interrompido: {exc}")
+                        raise
+                    delay = min(2 ** (attempt - 1), 30)
+                    logger.warning(f"Falha na parte {index + 1} de {name}, nova tentativa em {delay}s: {exc}")
+                    time.sleep(delay)
+
+            record.chunks_uploaded = index + 1
+            record.chunk_digests = record.chunk_digests[:index] + [digest]
+            record.save(update_fields=['chunks_uploaded', 'chunk_digests', 'updated_at'])
+            if on_progress is not None:
+                on_progress(record)
+
+        if record is None:
+            raise ValueError(f"Ficheiro vazio: {name}")
+        if received != size:
+            ChunkedUploadService._fail(record, f"Recebidos {received} de {size} bytes")
+            raise ValueError(f"{name}: o conteúdo tem {received} bytes em vez de {size}")
+
+        record.status = 'complete'
+        record.last_error = None
+        record.save(update_fields=['status', 'last_error', 'updated_at'])
+        logger.info(f"Upload {record.file_id} ({name}, {size} bytes) concluído em {record.chunks_total} partes")
+        return record
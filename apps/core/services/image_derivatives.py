@@ -0,0 +1,164 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from apps.core.services.appwrite_service import AppwriteService
+from digital_invite.settings import base
+
+logger = logging.getLogger(__name__)
+
+_SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+_EXTENSIONS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+
+class ImageDerivativeService:
+    """
+    Gera as variantes de uma imagem (ex.: thumb/medium/full) em WebP e JPEG a
+    partir de um único decode, e envia-as para o Appwrite como ficheiros
+    separados. As variantes são calculadas da maior para a menor, cada uma a
+    partir da anterior.
+
+    `sizes` mapeia o nome da variante para o lado maior em píxeis, ex.:
+    {'thumb': 300, 'medium': 600, 'full': 800}.
+    """
+
+    @staticmethod
+    def sizes_for(kind: str) -> Dict[str, int]:
+        return dict(getattr(base, 'MEDIA_DERIVATIVE_SIZES', {}).get(kind, {}))
+
+    @staticmethod
+    def formats() -> tuple:
+        return tuple(getattr(base, 'MEDIA_DERIVATIVE_FORMATS', ('webp', 'jpeg')))
+
+    @staticmethod
+    def _flatten(img):
+        # JPEG não tem canal alfa: compõe sobre fundo branco
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            return background
+        return img.convert('RGB')
+
+    @staticmethod
+    def render(source: bytes, name: str, sizes: Dict[str, int], formats=None) -> Optional[dict]:
+        """
+        Retorna {variante: {'width', 'height', formato: (bytes, nome)}} ou None
+        se `source` não for uma imagem.
+        """
+        formats = formats or ImageDerivativeService.formats()
+        if not sizes or AppwriteService._detect_format(bytes(source[:16])) is None:
+            return None
+
+        root = os.path.splitext(os.path.basename(name or 'image'))[0]
+        resample = getattr(Image, 'Resampling', Image).LANCZOS
+        largest = max(sizes.values())
+        variants = {}
+
+        try:
+            with Image.open(io.BytesIO(source)) as original:
+                if original.format == 'JPEG':
+                    original.draft('RGB', (largest, largest))
+                img = ImageDerivativeService._flatten(original)
+
+            previous = None
+            for label, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+                img.thumbnail((edge, edge), resample=resample)
+                if previous and (previous['width'], previous['height']) == img.size:
+                    # imagem menor que a variante: reutiliza a anterior em vez de a repetir
+                    variants[label] = previous
+                    continue
+                variant = {'width': img.width, 'height': img.height}
+                for image_format in formats:
+                    buffer = io.BytesIO()
+                    img.save(buffer, **_SAVE_OPTIONS[image_format])
+                    variant[image_format] = (buffer.getvalue(), f"{root}_{label}{_EXTENSIONS[image_format]}")
+                variants[label] = previous = variant
+        except (UnidentifiedImageError, OSError) as exc:
+            logger.warning(f"Falha ao gerar variantes de {name}: {exc}")
+            return None
+        return variants
+
+    @staticmethod
+    def upload(source: bytes, name: str, sizes: Dict[str, int], formats=None,
+               permissions: Optional[list] = None, max_uploads: Optional[int] = None,
+               dedupe: bool = True) -> Optional[dict]:
+        """
+        Gera e envia as variantes. Retorna {variante: {'width', 'height', formato: file_id}}
+        ou None se não for uma imagem. Levanta exceção se algum upload falhar,
+        depois de apagar as variantes do lote que já tinham sido enviadas.
+
+        Com `dedupe`, uma imagem já processada com os mesmos tamanhos e formatos
+        reutiliza as variantes existentes (ver `BlobIndex`).
+        """
+        from apps.core.services.blob_index import BlobIndex  # importação local
+
+        formats = formats or ImageDerivativeService.formats()
+        digest = None
+        if dedupe and sizes:
+            digest = BlobIndex.digest(source, f"variants:{sorted(sizes.items())}:{list(formats)}")
+            blob = BlobIndex.acquire(digest)
+            if blob is not None:
+                return blob.variants
+
+        variants = ImageDerivativeService.render(source, name, sizes, formats)
+        if variants is None:
+            return None
+
+        permissions = permissions or ['read("any")']
+        max_uploads = max_uploads or getattr(base, 'UPLOAD_CONCURRENCY', 4)
+        # Variantes partilhadas (ver `render`) são enviadas uma só vez
+        unique = {id(variant[image_format]): variant[image_format]
+                  for variant in variants.values() for image_format in formats}
+
+        with ThreadPoolExecutor(max_workers=min(max_uploads, len(unique))) as pool:
+            futures = {
+                key: pool.submit(AppwriteService._upload_bytes, data, file_name, permissions)
+                for key, (data, file_name) in unique.items()
+            }
+        failed = [future.exception() for future in futures.values() if future.exception()]
+        if failed:
+            # As variantes já enviadas ficariam órfãs, fora do índice, e uma
+            # nova tentativa da tarefa enviava-as outra vez
+            ImageDerivativeService._discard([future.result() for future in futures.values()
+                                             if not future.exception()])
+            raise failed[0]
+        file_ids = {key: future.result() for key, future in futures.items()}
+
+        result = {}
+        for label, variant in variants.items():
+            result[label] = {'width': variant['width'], 'height': variant['height']}
+            for image_format in formats:
+                result[label][image_format] = file_ids[id(variant[image_format])]
+
+        if digest:
+            blob = BlobIndex.register(digest, ImageDerivativeService.largest(result), len(source), result)
+            result = blob.variants
+        return result
+
+    @staticmethod
+    def _discard(file_ids):
+        """Apaga uploads de um lote que falhou; o que não se conseguir apagar fica no log"""
+        for file_id in file_ids:
+            try:
+                deleted = AppwriteService.delete_file(file_id)
+            except Exception as exc:
+                logger.warning(f"Falha ao apagar a variante órfã {file_id}: {exc}")
+                continue
+            if not deleted:
+                logger.warning(f"Falha ao apagar a variante órfã {file_id}")
+
+    @staticmethod
+    def largest(variants: dict, image_format: str = 'jpeg') -> Optional[str]:
+        """file_id da maior variante no formato pedido"""
+        if not variants:
+            return None
+        label = max(variants, key=lambda key: (variants[key].get('width') or 0) * (variants[key].get('height') or 0))
+        return variants[label].get(image_format)
@@ -0,0 +1,179 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.core.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Fila de tarefas local, guardada na base de dados e processada pelo
+    comando `run_jobs`. As tarefas falhadas são repetidas com backoff
+    exponencial até `max_attempts`.
+
+    O handler recebe (payload, file), onde `file` é um `django.core.files.File`
+    aberto sobre o ficheiro preparado, ou None.
+    """
+
+    @staticmethod
+    def _queue_dir():
+        path = getattr(settings, 'JOB_QUEUE_DIR', os.path.join(settings.MEDIA_ROOT, 'job_queue'))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def _stage_file(django_file) -> str:
+        extension = os.path.splitext(django_file.name or '')[1]
+        path = os.path.join(JobQueue._queue_dir(), f"{uuid.uuid4().hex}{extension}")
+        with open(path, 'wb') as staged:
+            for chunk in django_file.chunks():
+                staged.write(chunk)
+        return path
+
+    @staticmethod
+    def enqueue(handler: str, payload: dict = None, file=None, max_attempts: int = None,
+                delay: float = 0) -> BackgroundJob:
+        """
+        Cria uma tarefa, a executar daqui a `delay` segundos. Se
+        `JOB_QUEUE_ENABLED` for False, executa-a de imediato.
+        """
+        job = BackgroundJob(
+            handler=handler,
+            payload=payload or {},
+            run_after=timezone.now() + timedelta(seconds=delay),
+            max_attempts=max_attempts or getattr(settings, 'JOB_QUEUE_MAX_ATTEMPTS', 5),
+        )
+        if file is not None:
+            job.file_path = JobQueue._stage_file(file)
+            job.file_name = os.path.basename(file.name or job.file_path)
+        job.save()
+
+        if not getattr(settings, 'JOB_QUEUE_ENABLED', True):
+            JobQueue.run(job)
+        return job
+
+    @staticmethod
+    def enqueue_once(handler: str, payload: dict = None, max_attempts: int = None,
+                     delay: float = 0) -> Optional[BackgroundJob]:
+        """
+        Como `enqueue`, para tarefas que processam tudo o que encontrarem
+        (ex.: agregações): se já houver uma pendente do mesmo handler, não
+        cria outra e retorna None. A verificação é feita na base de dados,
+        por isso vale entre processos; uma tarefa em execução não conta, e
+        o que chegar entretanto fica para a seguinte.
+        """
+        with transaction.atomic():
+            if BackgroundJob.objects.filter(handler=handler, status='pending').exists():
+                return None
+            return JobQueue.enqueue(handler, payload, max_attempts=max_attempts, delay=delay)
+
+    @staticmethod
+    def claim(job) -> bool:
+        """
+        Marca a tarefa como em execução; False se outro worker a apanhou primeiro
+        """
+        claimed = BackgroundJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+        return bool(claimed)
+
+    @staticmethod
+    def run(job) -> bool:
+        """
+        Executa uma tarefa (reclamando-a se ainda estiver pendente)
+        """
+        if job.status == 'pending' and not JobQueue.claim(job):
+            return False
+
+        try:
+            handler = import_string(job.handler)
+            if job.file_path:
+                with open(job.file_path, 'rb') as f:
+                    result = handler(job.payload, File(f, name=job.file_name))
+            else:
+                result = handler(job.payload, None)
+        except Exception as exc:
+            JobQueue._fail(job, exc)
+            return False
+
+        job.status = 'done'
+        job.result = result
+        job.last_error = None
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'last_error', 'finished_at'])
+        JobQueue._discard_file(job)
+        return True
+
+    @staticmethod
+    def _fail(job, exc):
+        job.last_error = f"{type(exc).__name__}: {exc}"
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Tarefa {job.pk} ({job.handler}) falhou definitivamente: {exc}")
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            JobQueue._discard_file(job)
+        else:
+            base = getattr(settings, 'JOB_QUEUE_BACKOFF_SECONDS', 5)
+            delay = min(base * 2 ** (job.attempts - 1), 3600)
+            logger.warning(f"Tarefa {job.pk} ({job.handler}) falhou, nova tentativa em {delay}s: {exc}")
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        job.save(update_fields=['status', 'last_error', 'run_after', 'finished_at'])
+
+    @staticmethod
+    def _discard_file(job):
+        if job.file_path and os.path.exists(job.file_path):
+            try:
+                os.unlink(job.file_path)
+            except OSError:
+                logger.warning(f"Falha ao remover ficheiro da fila: {job.file_path}")
+
+    @staticmethod
+    def due_jobs(limit=10):
+        return list(
+            BackgroundJob.objects
+            .filter(status='pending', run_after__lte=timezone.now())
+            .order_by('run_after', 'pk')[:limit]
+        )
+
+    @staticmethod
+    def requeue_stale(max_running=timedelta(minutes=10)) -> int:
+        """
+        Devolve à fila tarefas presas em 'running' (worker interrompido)
+        """
+        return BackgroundJob.objects.filter(
+            status='running', started_at__lt=timezone.now() - max_running
+        ).update(status='pending', run_after=timezone.now())
+
+    @staticmethod
+    def stats() -> dict:
+        """
+        Profundidade da fila e latência média das tarefas concluídas
+        """
+        counts = BackgroundJob.objects.aggregate(
+            pending=Count('pk', filter=Q(status='pending')),
+            running=Count('pk', filter=Q(status='running')),
+            failed=Count('pk', filter=Q(status='failed')),
+            done=Count('pk', filter=Q(status='done')),
+        )
+        latency = BackgroundJob.objects.filter(status='done').aggregate(
+            avg=Avg(F('finished_at') - F('created_at'))
+        )['avg']
+        counts['avg_latency_seconds'] = latency.total_seconds() if latency else None
+        return counts
+
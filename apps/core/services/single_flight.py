@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+
+from django.core.cache import cache as default_cache
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error', 'done')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.done = False
+
+
+class SingleFlightCache:
+    """
+    Leitura de cache com proteção contra "stampede":
+
+    - single-flight: por processo, só um pedido recalcula cada chave em falta;
+      os outros esperam pelo resultado (ou pela exceção) desse pedido;
+    - lock opcional no cache partilhado (`cache.add`) para coordenar processos;
+    - refresh antecipado probabilístico (XFetch): chaves muito lidas são
+      recalculadas pouco antes de expirarem, enquanto os outros pedidos
+      continuam a receber o valor antigo;
+    - geração por chave: `invalidate` muda-a, e um cálculo que começou antes
+      não grava o resultado (que pode já estar desatualizado).
+
+    Os valores são guardados como (valor, expira_em, custo_do_cálculo).
+    """
+
+    def __init__(self, cache=None, use_lock=False, lock_timeout=5.0, beta=1.0, poll_interval=0.05):
+        self.cache = cache or default_cache
+        self.use_lock = use_lock
+        self.lock_timeout = lock_timeout
+        self.beta = beta
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._aflights = {}
+
+    @staticmethod
+    def _lock_key(key):
+        return f"{key}:lock"
+
+    @staticmethod
+    def _generation_key(key):
+        return f"{key}:gen"
+
+    def invalidate(self, key):
+        """
+        Apaga `key`; os cálculos em curso não gravam e os pedidos seguintes
+        não esperam por eles
+        """
+        generation_key = self._generation_key(key)
+        self.cache.add(generation_key, 0, None)
+        try:
+            self.cache.incr(generation_key)
+        except ValueError:
+            # despejada entre o add e o incr
+            self.cache.set(generation_key, 1, None)
+        self.cache.delete(key)
+        with self._lock:
+            self._flights.pop(key, None)
+        for flight_key in [flight_key for flight_key in list(self._aflights) if flight_key[1] == key]:
+            self._aflights.pop(flight_key, None)
+
+    def _should_refresh(self, entry):
+        _, expires_at, delta = entry
+        if self.beta <= 0:
+            return False
+        return time.time() - delta * self.beta * math.log(1.0 - random.random()) >= expires_at
+
+    def _store(self, key, value, timeout, delta, generation):
+        if self.cache.get(self._generation_key(key)) != generation:
+            logger.debug(f"{key} invalidada durante o cálculo; resultado não guardado")
+            return
+        self.cache.set(key, (value, time.time() + timeout, delta), timeout)
+
+    # ------------------------
+    # Síncrono
+    # ------------------------
+    def get_or_load(self, key, loader, timeout):
+        """
+        Retorna o valor em cache de `key` ou calcula-o com `loader()`
+        """
+        entry = self.cache.get(key)
+        if entry is not None and not self._should_refresh(entry):
+            return entry[0]
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            # Refresh antecipado em curso: serve o valor antigo sem esperar
+            if entry is not None:
+                return entry[0]
+            if flight.event.wait(self.lock_timeout) and flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            return self._load(key, loader, timeout, entry)
+
+        try:
+            flight.value = self._load(key, loader, timeout, entry)
+            return flight.value
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            flight.done = True
+            flight.event.set()
+            with self._lock:
+                # Depois de `invalidate` a chave pode já ser de outro cálculo
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _load(self, key, loader, timeout, stale):
+        acquired = False
+        if self.use_lock:
+            acquired = self.cache.add(self._lock_key(key), 1, self.lock_timeout)
+            if not acquired:
+                if stale is not None:
+                    return stale[0]
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(self.poll_interval)
+                    entry = self.cache.get(key)
+                    if entry is not None:
+                        return entry[0]
+                logger.warning(f"Lock de cache expirou para {key}; a recalcular")
+
+        try:
+            generation = self.cache.get(self._generation_key(key))
+            start = time.monotonic()
+            value = loader()
+            self._store(key, value, timeout, time.monotonic() - start, generation)
+            return value
+        finally:
+            if acquired:
+                self.cache.delete(self._lock_key(key))
+
+    # ------------------------
+    # Assíncrono
+    # ------------------------
+    async def aget_or_load(self, key, aloader, timeout):
+        """
+        Versão assíncrona de `get_or_load`; `aloader` é uma corrotina
+        """
+        entry = await self.cache.aget(key)
+        if entry is not None and not self._should_refresh(entry):
+            return entry[0]
+
+        flight_key = (id(asyncio.get_running_loop()), key)
+        future = self._aflights.get(flight_key)
+        if future is not None:
+            if entry is not None:
+                return entry[0]
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._aflights[flight_key] = future
+        try:
+            value = await self._aload(key, aloader, timeout, entry)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Evita o aviso "exception never retrieved" quando ninguém esperava
+            future.exception()
+            raise
+        finally:
+            if self._aflights.get(flight_key) is future:
+                del self._aflights[flight_key]
+
+    async def _aload(self, key, aloader, timeout, stale):
+        acquired = False
+        if self.use_lock:
+            acquired = await self.cache.aadd(self._lock_key(key), 1, self.lock_timeout)
+            if not acquired:
+                if stale is not None:
+                    return stale[0]
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.poll_interval)
+                    entry = await self.cache.aget(key)
+                    if entry is not None:
+                        return entry[0]
+                logger.warning(f"Lock de cache expirou para {key}; a recalcular")
+
+        try:
+            generation_key = self._generation_key(key)
+            generation = await self.cache.aget(generation_key)
+            start = time.monotonic()
+            value = await aloader()
+            if await self.cache.aget(generation_key) == generation:
+                await self.cache.aset(key, (value, time.time() + timeout, time.monotonic() - start), timeout)
+            return value
+        finally:
+            if acquired:
+                await self.cache.adelete(self._lock_key(key))
@@ -0,0 +1,365 @@
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'appwrite': 'apps.core.services.storage_backends.AppwriteBackend',
+    'local': 'apps.core.services.storage_backends.LocalFileSystemBackend',
+    'memory': 'apps.core.services.storage_backends.InMemoryBackend',
+}
+
+
+class StorageBackend(ABC):
+    """
+    Armazenamento dos ficheiros enviados (avatares, recordações, QR codes,
+    vídeos). Todos os backends geram ids ao estilo do Appwrite e URLs com o
+    mesmo formato (`{endpoint}/storage/buckets/{bucket}/files/{id}/view?project=...`),
+    por isso os dados gravados nos modelos não dependem do backend.
+    """
+
+    endpoint = ''
+
+    def __init__(self):
+        self.bucket_id = settings.APPWRITE_BUCKET_ID or 'local'
+        self.project_id = settings.APPWRITE_PROJECT_ID or 'local'
+
+    @staticmethod
+    def new_id() -> str:
+        # Mesmo formato dos ids gerados pelo Appwrite com 'unique()'
+        return uuid.uuid4().hex[:20]
+
+    def url(self, file_id: str) -> str:
+        return (f"{self.endpoint}/storage/buckets/{self.bucket_id}"
+                f"/files/{file_id}/view?project={self.project_id}")
+
+    def signature(self) -> dict:
+        """Identifica o armazenamento (ver MediaManifestService.is_stale)"""
+        return {'endpoint': self.endpoint, 'bucket': self.bucket_id, 'project': self.project_id}
+
+    @abstractmethod
+    def save(self, data: bytes, name: str, permissions: list, mime_type: Optional[str] = None) -> str:
+        """Grava o ficheiro e retorna o id gerado"""
+
+    def save_path(self, path: str, name: str, permissions: list) -> str:
+        with open(path, 'rb') as f:
+            return self.save(f.read(), name, permissions)
+
+    @abstractmethod
+    def save_chunk(self, file_id: str, name: str, data: bytes, start: int, total_size: int,
+                   permissions: list, mime_type: Optional[str] = None) -> None:
+        """Grava uma parte de um upload em partes (ver ChunkedUploadService)"""
+
+    @abstractmethod
+    def chunks_uploaded(self, file_id: str) -> Optional[int]:
+        """Partes confirmadas de um upload em partes, ou None se o ficheiro não existir"""
+
+    @abstractmethod
+    def read(self, file_id: str) -> bytes:
+        """Conteúdo do ficheiro (ex.: para gerar variantes)"""
+
+    @abstractmethod
+    def open(self, file_id: str):
+        """Retorna (ficheiro aberto, nome, mime type) para servir o ficheiro, ou None"""
+
+    @abstractmethod
+    def delete(self, file_id: str) -> bool:
+        """Apaga o ficheiro; um ficheiro que já não existe conta como apagado"""
+
+
+class AppwriteBackend(StorageBackend):
+    """Appwrite Storage, através do cliente partilhado (AppwriteClientPool)"""
+
+    def __init__(self):
+        super().__init__()
+        self.endpoint = (settings.APPWRITE_ENDPOINT or '').rstrip('/')
+        self.bucket_id = settings.APPWRITE_BUCKET_ID
+        self.project_id = settings.APPWRITE_PROJECT_ID
+
+    @staticmethod
+    def _storage():
+        from apps.core.services.appwrite_client import AppwriteClientPool  # importação local
+
+        return AppwriteClientPool.get_storage()
+
+    def _create(self, input_file, permissions) -> Optional[str]:
+        result = self._storage().create_file(
+            bucket_id=self.bucket_id,
+            file_id="unique()",
+            file=input_file,
+            permissions=permissions,
+        )
+        # Versões antigas do SDK devolvem um dict, as atuais um modelo com `id`
+        return result.get("$id") if isinstance(result, dict) else getattr(result, 'id', None)
+
+    def save(self, data, name, permissions, mime_type=None):
+        from appwrite.input_file import InputFile
+
+        return self._create(InputFile.from_bytes(data, name, mime_type), permissions)
+
+    def save_path(self, path, name, permissions):
+        from appwrite.input_file import InputFile
+
+        input_file = InputFile.from_path(path)
+        input_file.filename = name
+        return self._create(input_file, permissions)
+
+    def _files_path(self) -> str:
+        return f"/storage/buckets/{self.bucket_id}/files"
+
+    def save_chunk(self, file_id, name, data, start, total_size, permissions, mime_type=None):
+        from appwrite.input_file import InputFile
+        from apps.core.services.appwrite_client import AppwriteClientPool
+
+        headers = {'content-type': 'multipart/form-data'}
+        if len(data) < total_size:
+            headers['content-range'] = f"bytes {start}-{start + len(data) - 1}/{total_size}"
+        if start > 0:
+            headers['x-appwrite-id'] = file_id
+        params = {
+            'fileId': file_id,
+            'file': InputFile.from_bytes(data, name, mime_type),
+            'permissions': permissions,
+        }
+        AppwriteClientPool.get_client().call('post', self._files_path(), headers, params)
+
+    def chunks_uploaded(self, file_id):
+        from appwrite.exception import AppwriteException
+        from apps.core.services.appwrite_client import AppwriteClientPool
+
+        try:
+            result = AppwriteClientPool.get_client().call(
+                'get', f"{self._files_path()}/{file_id}", {'content-type': 'application/json'},
+            )
+        except AppwriteException as exc:
+            if exc.code == 404:
+                return None
+            raise
+        return int(result.get('chunksUploaded') or 0)
+
+    def read(self, file_id):
+        return self._storage().get_file_download(bucket_id=self.bucket_id, file_id=file_id)
+
+    def open(self, file_id):
+        # Os ficheiros são servidos diretamente pelo Appwrite
+        return None
+
+    def delete(self, file_id):
+        from appwrite.exception import AppwriteException
+
+        try:
+            self._storage().delete_file(bucket_id=self.bucket_id, file_id=file_id)
+            return True
+        except AppwriteException as exc:
+            if exc.code == 404:
+                return True
+            logger.error(f"Erro ao apagar ficheiro {file_id} do Appwrite: {exc}")
+            return False
+        except Exception as exc:
+            logger.error(f"Erro ao apagar ficheiro {file_id} do Appwrite: {exc}")
+            return False
+
+
+class LocalFileSystemBackend(StorageBackend):
+    """
+    Ficheiros em `STORAGE_LOCAL_ROOT/<bucket>/`, servidos pelo Django em
+    `STORAGE_LOCAL_ENDPOINT` (ver apps/core/urls.py). Cada ficheiro tem ao lado
+    um `.json` com o nome original, mime type e partes recebidas.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.endpoint = getattr(settings, 'STORAGE_LOCAL_ENDPOINT', '/local/v1').rstrip('/')
+        self.root = os.path.join(
+            getattr(settings, 'STORAGE_LOCAL_ROOT', os.path.join(settings.MEDIA_ROOT, 'storage')),
+            self.bucket_id,
+        )
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, file_id: str) -> str:
+        if not file_id or os.path.basename(file_id) != file_id or file_id.startswith('.'):
+            raise ValueError(f"Id de ficheiro inválido: {file_id!r}")
+        return os.path.join(self.root, file_id)
+
+    def _meta(self, file_id: str) -> Optional[dict]:
+        try:
+            with open(f"{self._path(file_id)}.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, file_id: str, meta: dict):
+        temp = f"{self._path(file_id)}.json.tmp"
+        with open(temp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp, f"{self._path(file_id)}.json")
+
+    def _commit(self, file_id, temp, name, mime_type, size, permissions):
+        os.replace(temp, self._path(file_id))
+        self._write_meta(file_id, {
+            'name': name,
+            'mime_type': mime_type or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'size': size,
+            'permissions': permissions,
+        })
+
+    def save(self, data, name, permissions, mime_type=None):
+        file_id = self.new_id()
+        temp = f"{self._path(file_id)}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        self._commit(file_id, temp, name, mime_type, len(data), permissions)
+        return file_id
+
+    def save_path(self, path, name, permissions):
+        file_id = self.new_id()
+        temp = f"{self._path(file_id)}.tmp"
+        shutil.copyfile(path, temp)
+        self._commit(file_id, temp, name, None, os.path.getsize(temp), permissions)
+        return file_id
+
+    def save_chunk(self, file_id, name, data, start, total_size, permissions, mime_type=None):
+        path = self._path(file_id)
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        with open(path, mode) as f:
+            f.seek(start)
+            f.write(data)
+        meta = self._meta(file_id) or {
+            'name': name,
+            'mime_type': mime_type or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'size': total_size,
+            'permissions': permissions,
+            'chunks': [],
+        }
+        # Reenviar a mesma parte não a conta duas vezes
+        meta['chunks'] = sorted(set(meta.get('chunks') or []) | {start})
+        self._write_meta(file_id, meta)
+
+    def chunks_uploaded(self, file_id):
+        meta = self._meta(file_id)
+        if meta is None:
+            return None
+        return len(meta.get('chunks') or [])
+
+    def read(self, file_id):
+        with open(self._path(file_id), 'rb') as f:
+            return f.read()
+
+    def open(self, file_id):
+        meta = self._meta(file_id)
+        if meta is None:
+            return None
+        return open(self._path(file_id), 'rb'), meta['name'], meta['mime_type']
+
+    def delete(self, file_id):
+        for path in (self._path(file_id), f"{self._path(file_id)}.json"):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.error(f"Erro ao apagar ficheiro local {path}: {exc}")
+                return False
+        return True
+
+
+class InMemoryBackend(StorageBackend):
+    """
+    Ficheiros num dicionário do processo, servidos como os do backend local.
+    Para testes e benchmarks sem rede nem disco.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.endpoint = getattr(settings, 'STORAGE_LOCAL_ENDPOINT', '/local/v1').rstrip('/')
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def save(self, data, name, permissions, mime_type=None):
+        file_id = self.new_id()
+        with self._lock:
+            self._files[file_id] = {
+                'data': bytes(data),
+                'name': name,
+                'mime_type': mime_type or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                'chunks': set(),
+            }
+        return file_id
+
+    def save_chunk(self, file_id, name, data, start, total_size, permissions, mime_type=None):
+        with self._lock:
+            entry = self._files.setdefault(file_id, {
+                'data': bytearray(total_size),
+                'name': name,
+                'mime_type': mime_type or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                'chunks': set(),
+            })
+            entry['data'][start:start + len(data)] = data
+            entry['chunks'].add(start)
+
+    def chunks_uploaded(self, file_id):
+        entry = self._files.get(file_id)
+        if entry is None:
+            return None
+        return len(entry['chunks'])
+
+    def read(self, file_id):
+        try:
+            return bytes(self._files[file_id]['data'])
+        except KeyError:
+            raise FileNotFoundError(file_id)
+
+    def open(self, file_id):
+        import io
+
+        entry = self._files.get(file_id)
+        if entry is None:
+            return None
+        return io.BytesIO(bytes(entry['data'])), entry['name'], entry['mime_type']
+
+    def delete(self, file_id):
+        with self._lock:
+            self._files.pop(file_id, None)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+
+
+_backend = None
+_backend_key = None
+_backend_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """
+    Backend configurado em `STORAGE_BACKEND` ('appwrite', 'local', 'memory'
+    ou o caminho de uma classe), partilhado pelo processo
+    """
+    global _backend, _backend_key
+    key = getattr(settings, 'STORAGE_BACKEND', 'appwrite')
+    if _backend is None or _backend_key != key:
+        with _backend_lock:
+            if _backend is None or _backend_key != key:
+                _backend = import_string(BACKENDS.get(key, key))()
+                _backend_key = key
+    return _backend
+
+
+def reset_storage():
+    """Descarta o backend (ex.: depois de mudar as settings nos testes)"""
+    global _backend, _backend_key
+    with _backend_lock:
+        _backend = None
+        _backend_key = None
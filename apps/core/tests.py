@@ -1,3 +1,395 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import threading
+from unittest import mock
 
-# Create your tests here.
+import appwrite.client
+import requests
+from PIL import Image, JpegImagePlugin
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from apps.core.models import BackgroundJob, ChunkedUpload, MediaBlob
+from apps.core.services.appwrite_client import AppwriteClientPool, _pooled_requests
+from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.blob_index import BlobIndex, delete_files
+from apps.core.services.chunked_upload import ChunkedUploadService
+from apps.core.services.image_derivatives import ImageDerivativeService
+from apps.core.services.single_flight import SingleFlightCache
+from apps.core.services.storage_backends import StorageBackend, get_storage, reset_storage
+from digital_invite.settings import base
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class UploadManyTests(TestCase):
+    """Upload em lote: falhas por ficheiro e deduplicação como em upload_file"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    @staticmethod
+    def _files(*contents):
+        return [SimpleUploadedFile(f"f{i}.bin", data) for i, data in enumerate(contents)]
+
+    def test_resize_error_without_process_pool_does_not_abort_batch(self):
+        real_resize = AppwriteService._resize_bytes
+
+        def resize(source, name, target_size):
+            if name == "f0.bin":
+                raise ValueError("imagem demasiado grande")
+            return real_resize(source, name, target_size)
+
+        with mock.patch.object(AppwriteService, '_resize_bytes', staticmethod(resize)):
+            results = AppwriteService.upload_many(self._files(b"a", b"b"), resize_to=(10, 10), max_processes=1)
+
+        self.assertIsNone(results[0]['file_id'])
+        self.assertIn("imagem demasiado grande", results[0]['error'])
+        self.assertIsNotNone(results[1]['file_id'])
+        self.assertEqual(get_storage().read(results[1]['file_id']), b"b")
+
+    def test_dedupe_reuses_blobs_and_counts_references(self):
+        first = AppwriteService.upload_many(self._files(b"x", b"y"))
+        again = AppwriteService.upload_many(self._files(b"x"))
+
+        self.assertEqual(again[0]['file_id'], first[0]['file_id'])
+        self.assertEqual(MediaBlob.objects.get(file_id=first[0]['file_id']).ref_count, 2)
+        # Mesmo conteúdo que upload_file: partilha o blob
+        self.assertEqual(AppwriteService.upload_file(self._files(b"y")[0]), first[1]['file_id'])
+
+    def test_without_dedupe_uploads_again(self):
+        first = AppwriteService.upload_many(self._files(b"x"), dedupe=False)
+        again = AppwriteService.upload_many(self._files(b"x"), dedupe=False)
+        self.assertNotEqual(first[0]['file_id'], again[0]['file_id'])
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class BlobIndexTests(TestCase):
+    """Deduplicação por conteúdo: referências contadas e ficheiros apagados quando ficam sem nenhuma"""
+
+    HANDLER = "apps.core.services.blob_index.delete_files"
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    def _upload(self, data, resize_to=None):
+        return AppwriteService.upload_file(SimpleUploadedFile("f.bin", data), resize_to=resize_to)
+
+    def _queued_deletes(self):
+        return [file_id for job in BackgroundJob.objects.filter(handler=self.HANDLER)
+                for file_id in job.payload['file_ids']]
+
+    def test_same_content_is_uploaded_once(self):
+        file_id = self._upload(b"foto")
+        self.assertEqual(self._upload(b"foto"), file_id)
+        self.assertEqual(len(get_storage()._files), 1)
+        # O processamento faz parte do digest: outro resize é outro blob
+        self.assertNotEqual(self._upload(b"foto", resize_to=(10, 10)), file_id)
+        self.assertEqual(BlobIndex.stats()['uploads_saved'], 1)
+
+    def test_last_release_deletes_the_file(self):
+        file_id = self._upload(b"foto")
+        self._upload(b"foto")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(BlobIndex.release([file_id]), 0)
+        self.assertEqual(self._queued_deletes(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(BlobIndex.release([file_id]), 1)
+        self.assertEqual(self._queued_deletes(), [file_id])
+        delete_files({'file_ids': [file_id]}, None)
+        self.assertEqual(get_storage()._files, {})
+
+    def test_untracked_files_are_kept_unless_asked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            BlobIndex.release(["antigo"])
+        self.assertEqual(self._queued_deletes(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            BlobIndex.release(["antigo"], delete_untracked=True)
+        self.assertEqual(self._queued_deletes(), ["antigo"])
+
+    def test_concurrent_register_keeps_one_blob(self):
+        digest = BlobIndex.digest(b"foto")
+        first = BlobIndex.register(digest, "primeiro")
+        with self.captureOnCommitCallbacks(execute=True):
+            blob = BlobIndex.register(digest, "segundo")
+        self.assertEqual((blob.pk, blob.file_id), (first.pk, "primeiro"))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        # O upload duplicado do outro processo é apagado
+        self.assertEqual(self._queued_deletes(), ["segundo"])
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class InMemoryImagePipelineTests(TestCase):
+    """Uploads pequenos são identificados e redimensionados em memória, sem ficheiros temporários"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    @staticmethod
+    def _image(image_format, size=(400, 300), mode='RGB'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (10, 120, 200) if mode == 'RGB' else (10, 120, 200, 128)).save(buffer, format=image_format)
+        return buffer.getvalue()
+
+    def _stored(self, file_id):
+        entry = get_storage()._files[file_id]
+        with Image.open(io.BytesIO(entry['data'])) as img:
+            return entry['name'], img.format, img.size
+
+    def test_detects_formats_by_magic_bytes(self):
+        for image_format in ('JPEG', 'PNG', 'GIF', 'BMP', 'WEBP'):
+            self.assertEqual(AppwriteService._detect_format(self._image(image_format)[:16]), image_format)
+        self.assertIsNone(AppwriteService._detect_format(b"texto simples"))
+
+    def test_jpeg_is_resized_in_memory_with_draft_decoding(self):
+        real_draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True, side_effect=real_draft) as draft, \
+                mock.patch.object(AppwriteService, '_save_temp_file') as save_temp_file:
+            file_id = AppwriteService.upload_file(SimpleUploadedFile("foto.jpeg", self._image('JPEG')), resize_to=(100, 100))
+
+        draft.assert_called_once()
+        save_temp_file.assert_not_called()
+        self.assertEqual(self._stored(file_id), ("foto.jpg", 'JPEG', (100, 75)))
+
+    def test_png_with_alpha_stays_png(self):
+        file_id = AppwriteService.upload_file(SimpleUploadedFile("logo.png", self._image('PNG', mode='RGBA')),
+                                              resize_to=(100, 100))
+        self.assertEqual(self._stored(file_id), ("logo.png", 'PNG', (100, 75)))
+
+    def test_non_image_is_uploaded_unchanged(self):
+        file_id = AppwriteService.upload_file(SimpleUploadedFile("notas.txt", b"texto"), resize_to=(100, 100))
+        self.assertEqual(get_storage().read(file_id), b"texto")
+
+    def test_upload_above_the_memory_limit_spills_to_a_temp_file(self):
+        data = self._image('JPEG')
+        real_save_temp_file = AppwriteService._save_temp_file
+        paths = []
+
+        def save_temp_file(file):
+            paths.append(real_save_temp_file(file))
+            return paths[-1]
+
+        with mock.patch.object(base, 'UPLOAD_MEMORY_LIMIT', len(data) - 1, create=True), \
+                mock.patch.object(AppwriteService, '_save_temp_file', staticmethod(save_temp_file)):
+            file_id = AppwriteService.upload_file(SimpleUploadedFile("foto.jpg", data), resize_to=(100, 100))
+
+        self.assertEqual(self._stored(file_id)[1:], ('JPEG', (100, 75)))
+        self.assertEqual(len(paths), 1)
+        self.assertFalse(os.path.exists(paths[0]))
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class ImageDerivativeUploadTests(TestCase):
+    """Envio das variantes: um lote que falha não deixa ficheiros órfãos"""
+
+    SIZES = {'thumb': 8, 'medium': 16}
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 24), (200, 10, 10)).save(buffer, format='PNG')
+        self.source = buffer.getvalue()
+
+    def test_failed_variant_deletes_the_ones_already_uploaded(self):
+        real_upload = AppwriteService._upload_bytes
+
+        def upload(data, name, permissions):
+            if name.endswith("_thumb.webp"):
+                raise RuntimeError("rede em baixo")
+            return real_upload(data, name, permissions)
+
+        with mock.patch.object(AppwriteService, '_upload_bytes', staticmethod(upload)):
+            with self.assertRaisesMessage(RuntimeError, "rede em baixo"):
+                ImageDerivativeService.upload(self.source, "foto.png", self.SIZES, max_uploads=1)
+
+        self.assertEqual(get_storage()._files, {})
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_retry_after_failure_registers_the_blob(self):
+        with mock.patch.object(AppwriteService, '_upload_bytes', side_effect=RuntimeError("rede em baixo")):
+            with self.assertRaises(RuntimeError):
+                ImageDerivativeService.upload(self.source, "foto.png", self.SIZES)
+
+        variants = ImageDerivativeService.upload(self.source, "foto.png", self.SIZES)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.file_id, ImageDerivativeService.largest(variants))
+        self.assertEqual(sorted(get_storage()._files), blob.file_ids)
+
+
+class SingleFlightCacheTests(TestCase):
+    """Um cálculo invalidado a meio não grava o valor antigo no cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlightCache(beta=0)
+
+    def test_invalidate_during_load_skips_store(self):
+        def load():
+            self.flight.invalidate("k")
+            return "antigo"
+
+        self.assertEqual(self.flight.get_or_load("k", load, 60), "antigo")
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(self.flight.get_or_load("k", lambda: "novo", 60), "novo")
+        self.assertEqual(self.flight.get_or_load("k", lambda: "outro", 60), "novo")
+
+    def test_request_after_invalidate_does_not_join_the_old_flight(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load():
+            started.set()
+            release.wait(5)
+            return "antigo"
+
+        leader = threading.Thread(target=self.flight.get_or_load, args=("k", slow_load, 60))
+        leader.start()
+        started.wait(5)
+        self.flight.invalidate("k")
+        self.assertEqual(self.flight.get_or_load("k", lambda: "novo", 60), "novo")
+        release.set()
+        leader.join(5)
+        self.assertEqual(cache.get("k")[0], "novo")
+
+    def test_async_invalidate_during_load_skips_store(self):
+        async def load():
+            self.flight.invalidate("k")
+            return "antigo"
+
+        self.assertEqual(asyncio.run(self.flight.aget_or_load("k", load, 60)), "antigo")
+        self.assertIsNone(cache.get("k"))
+
+
+class StorageBackendTests(TestCase):
+
+    def test_backend_missing_an_operation_cannot_be_instantiated(self):
+        class ReadOnlyBackend(StorageBackend):
+            def read(self, file_id):
+                return b""
+
+        with self.assertRaises(TypeError):
+            ReadOnlyBackend()
+
+
+class PooledClientTests(TestCase):
+    """O cliente do Appwrite usa o pool sem alterar o módulo `requests` do processo"""
+
+    def setUp(self):
+        AppwriteClientPool.reset()
+        self.addCleanup(AppwriteClientPool.reset)
+
+    def test_calls_go_through_the_pooled_session_only(self):
+        response = mock.Mock(headers={'Content-Type': 'application/json'})
+        response.json.return_value = {'status': 'pass'}
+        session = mock.Mock()
+        session.request.return_value = response
+        before = AppwriteClientPool.stats()['calls']
+
+        with mock.patch.object(_pooled_requests, '_get_session', return_value=session):
+            result = AppwriteClientPool.get_client().call('get', '/health', {'content-type': 'application/json'})
+
+        self.assertEqual(result, {'status': 'pass'})
+        self.assertIn('timeout', session.request.call_args.kwargs)
+        self.assertEqual(AppwriteClientPool.stats()['calls'], before + 1)
+        self.assertIs(appwrite.client.requests, _pooled_requests)
+        # Exceções e o resto do módulo continuam a ser os do `requests`
+        self.assertIs(appwrite.client.requests.HTTPError, requests.HTTPError)
+        self.assertIs(requests.request, requests.api.request)
+
+
+@override_settings(STORAGE_BACKEND='memory')
+@mock.patch('apps.core.services.chunked_upload.CHUNK_SIZE', 4)
+class ChunkedUploadTests(TestCase):
+    """Upload em partes: retoma, partes repetidas e ficheiros que não correspondem"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.sent = []
+        self.fail_at = set()
+        self.real_send = ChunkedUploadService._send_chunk
+        patcher = mock.patch.object(ChunkedUploadService, '_send_chunk', staticmethod(self._send))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _send(self, record, index, data, permissions, mime_type):
+        if index in self.fail_at:
+            self.fail_at.discard(index)
+            raise ConnectionError("ligação perdida")
+        self.sent.append(index)
+        self.real_send(record, index, data, permissions, mime_type)
+
+    @staticmethod
+    def _upload(content, name="video.mp4"):
+        return ChunkedUploadService.upload(SimpleUploadedFile(name, content), max_retries=0)
+
+    def test_resumes_after_a_partial_upload(self):
+        self.fail_at = {2}
+        with self.assertRaises(ConnectionError):
+            self._upload(b"aaaabbbbccccdd")
+        failed = ChunkedUpload.objects.get()
+        self.assertEqual((failed.status, failed.chunks_uploaded), ('failed', 2))
+
+        self.sent = []
+        record = self._upload(b"aaaabbbbccccdd")
+        self.assertEqual(record.file_id, failed.file_id)
+        self.assertEqual(self.sent, [2, 3])
+        self.assertEqual(record.status, 'complete')
+        self.assertEqual(get_storage().read(record.file_id), b"aaaabbbbccccdd")
+
+    def test_chunk_that_arrived_despite_the_error_is_not_sent_again(self):
+        def send(record, index, data, permissions, mime_type):
+            self.sent.append(index)
+            self.real_send(record, index, data, permissions, mime_type)
+            if index == 1 and self.sent.count(1) == 1:
+                raise TimeoutError("sem resposta")
+
+        with mock.patch.object(ChunkedUploadService, '_send_chunk', staticmethod(send)):
+            record = self._upload(b"aaaabbbbcc")
+        self.assertEqual(self.sent, [0, 1, 2])
+        self.assertEqual(get_storage().read(record.file_id), b"aaaabbbbcc")
+
+    def test_storage_counts_duplicate_and_out_of_order_chunks_once(self):
+        storage = get_storage()
+        for start, data in ((4, b"bbbb"), (0, b"aaaa"), (4, b"bbbb")):
+            storage.save_chunk("f", "video.mp4", data, start, 8, [])
+        self.assertEqual(storage.chunks_uploaded("f"), 2)
+        self.assertEqual(storage.read("f"), b"aaaabbbb")
+
+    def test_size_mismatch(self):
+        # Mesmo nome e primeira parte, outro tamanho: não retoma o upload anterior
+        self.fail_at = {1}
+        with self.assertRaises(ConnectionError):
+            self._upload(b"aaaabbbb")
+        record = self._upload(b"aaaabbbbcc")
+        self.assertEqual(ChunkedUpload.objects.count(), 2)
+        self.assertEqual(get_storage().read(record.file_id), b"aaaabbbbcc")
+
+        # Conteúdo com menos bytes do que o tamanho indicado
+        short = SimpleUploadedFile("curto.mp4", b"aaaabb")
+        short.size = 10
+        with self.assertRaises(ValueError):
+            ChunkedUploadService.upload(short, max_retries=0)
+        self.assertEqual(ChunkedUpload.objects.get(file_name="curto.mp4").status, 'failed')
+
+    def test_fingerprint_match_with_different_content_restarts(self):
+        self.fail_at = {2}
+        with self.assertRaises(ConnectionError):
+            self._upload(b"aaaabbbbcccc")
+        stale = ChunkedUpload.objects.get()
+
+        # Mesmo nome, tamanho e primeira parte: só a segunda parte mudou
+        self.sent = []
+        record = self._upload(b"aaaaXXXXcccc")
+        self.assertNotEqual(record.file_id, stale.file_id)
+        self.assertEqual(self.sent, [0, 1, 2])
+        self.assertEqual(get_storage().read(record.file_id), b"aaaaXXXXcccc")
+        self.assertFalse(ChunkedUpload.objects.filter(pk=stale.pk).exists())
+        with self.assertRaises(FileNotFoundError):
+            get_storage().read(stale.file_id)
@@ -0,0 +1,9 @@
+from django.urls import path
+from apps.core import views
+
+app_name = 'core'
+
+# Montado em STORAGE_LOCAL_ENDPOINT (ver digital_invite/urls.py)
+urlpatterns = [
+    path("storage/buckets/<str:bucket_id>/files/<str:file_id>/view", views.storage_file_view, name="storage_file_view"),
+]
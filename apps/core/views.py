@@ -1 +1,25 @@
-# Create your views here.
+from django.http import FileResponse, Http404
+
+from apps.core.services.storage_backends import get_storage
+
+
+def storage_file_view(request, bucket_id, file_id):
+    """
+    Serve ficheiros dos backends de storage locais no mesmo caminho que o
+    Appwrite usa (`/storage/buckets/<bucket>/files/<id>/view`). Os ids nunca são
+    reutilizados para outro conteúdo, por isso a resposta pode ficar em cache.
+    """
+    storage = get_storage()
+    if bucket_id != storage.bucket_id:
+        raise Http404("Bucket desconhecido")
+    try:
+        opened = storage.open(file_id)
+    except ValueError:
+        opened = None
+    if opened is None:
+        raise Http404("Ficheiro não encontrado")
+
+    stream, name, mime_type = opened
+    response = FileResponse(stream, content_type=mime_type, filename=name)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
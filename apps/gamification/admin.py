@@ -1,5 +1,7 @@
 from django.contrib import admin
-from apps.gamification.models import Gamification
+from django.db.models import Count
+from apps.gamification.models import Achievement, Gamification, GamificationEvent
+from apps.gamification.services.event_log import GamificationEventLog
 
 
 @admin.register(Gamification)
@@ -13,3 +15,51 @@ class GamificationAdmin(admin.ModelAdmin):
         return f"{obj.invite.guest.first_name} {obj.invite.guest.last_name or ''}"
 
     get_guest_name.short_description = 'Convidado'
+
+
+@admin.register(Achievement)
+class AchievementAdmin(admin.ModelAdmin):
+    list_display = ['code', 'kind', 'title', 'get_holders']
+    list_filter = ['kind']
+    search_fields = ['name', 'title']
+    readonly_fields = ['code', 'created_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(holders_count=Count('awards'))
+
+    def save_model(self, request, obj, form, change):
+        obj.code = Achievement.code_for(obj.kind, obj.name)
+        super().save_model(request, obj, form, change)
+
+    def get_holders(self, obj):
+        return obj.holders_count
+
+    get_holders.short_description = 'Convidados'
+    get_holders.admin_order_field = 'holders_count'
+
+
+@admin.register(GamificationEvent)
+class GamificationEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'invite', 'kind', 'amount', 'name', 'applied', 'created_at']
+    list_filter = ['kind', 'applied']
+    search_fields = ['invite__token', 'name']
+    list_select_related = ['invite']
+
+    # Registo só de acrescento
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        stats = GamificationEventLog.stats()
+        self.message_user(
+            request,
+            f"Agregação: {stats['pending_events']} eventos pendentes, "
+            f"atraso {stats['lag_seconds']:.1f}s (último somado: {stats['last_event_id']})",
+        )
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,61 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.gamification.services.event_log import GamificationEventLog
+
+
+class Command(BaseCommand):
+    help = "Soma os eventos de gamificação pendentes à Gamification de cada convite"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Continua a agregar até ser interrompido")
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help="Segundos de espera quando não há eventos (com --loop)")
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'GAMIFICATION_EVENT_BATCH_SIZE', 1000))
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recalcula todas as linhas a partir de todos os eventos")
+        parser.add_argument('--stats', action='store_true',
+                            help="Mostra o atraso da agregação e termina")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self._write_stats()
+            return
+
+        if options['rebuild']:
+            rows = GamificationEventLog.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"{rows} linhas reconstruídas"))
+            return
+
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        processed = 0
+        while self._running:
+            close_old_connections()
+            batch = GamificationEventLog.aggregate(options['batch_size'])
+            processed += batch
+            if not batch:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} eventos agregados"))
+        self._write_stats()
+
+    def _write_stats(self):
+        stats = GamificationEventLog.stats()
+        self.stdout.write(
+            f"{stats['pending_events']} eventos pendentes, último somado {stats['last_event_id']}, "
+            f"atraso {stats['lag_seconds']:.1f}s"
+        )
+
+    def _stop(self, signum, frame):
+        self._running = False
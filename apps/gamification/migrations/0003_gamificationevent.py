@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_events(apps, schema_editor):
+    """
+    Regista o estado atual de cada Gamification como eventos já aplicados,
+    para que a reconstrução a partir dos eventos dê os mesmos totais
+    """
+    Gamification = apps.get_model('gamification', 'Gamification')
+    GamificationEvent = apps.get_model('gamification', 'GamificationEvent')
+
+    events = []
+    for row in Gamification.objects.iterator():
+        if row.points:
+            events.append(GamificationEvent(invite_id=row.invite_id, kind='points', amount=row.points, applied=True))
+        for kind, items in (('badge', row.badges), ('mission', row.completed_missions),
+                            ('secret_mission', row.secret_missions)):
+            for item in items or []:
+                events.append(GamificationEvent(invite_id=row.invite_id, kind=kind, name=item, applied=True))
+    GamificationEvent.objects.bulk_create(events, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0002_gamification_updated_at'),
+        ('invitations', '0003_invite_qr_code_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GamificationEventCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GamificationEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('points', 'Pontos'), ('spend', 'Gasto'), ('badge', 'Badge'), ('mission', 'Missão'), ('secret_mission', 'Missão secreta')], max_length=20)),
+                ('amount', models.IntegerField(default=0)),
+                ('name', models.CharField(blank=True, default='', max_length=100)),
+                ('applied', models.BooleanField(default=False)),
+                ('dedupe_key', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('invite', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gamification_events', to='invitations.invite')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['invite', 'id'], name='gamificatio_invite__68bebb_idx')],
+            },
+        ),
+        migrations.RunPython(seed_events, migrations.RunPython.noop),
+    ]
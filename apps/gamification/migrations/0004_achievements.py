@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# Tipo de conquista de cada lista JSON antiga
+KIND_FIELDS = (('badge', 'badges'), ('mission', 'completed_missions'), ('secret_mission', 'secret_missions'))
+
+
+def copy_achievements(apps, schema_editor):
+    """
+    Passa as listas JSON para o registo e a tabela de ligação, pela ordem
+    das listas. O badge da primeira aceitação fica sempre registado.
+    """
+    Gamification = apps.get_model('gamification', 'Gamification')
+    Achievement = apps.get_model('gamification', 'Achievement')
+    GamificationAchievement = apps.get_model('gamification', 'GamificationAchievement')
+
+    codes, links = {('badge', 'first_acceptance')}, []
+    for row in Gamification.objects.iterator():
+        seen = set()
+        for kind, field in KIND_FIELDS:
+            for name in getattr(row, field) or []:
+                if (kind, name) in seen:
+                    continue
+                seen.add((kind, name))
+                codes.add((kind, name))
+                links.append(GamificationAchievement(gamification_id=row.invite_id, achievement_id=f"{kind}:{name}"))
+
+    Achievement.objects.bulk_create(
+        [Achievement(code=f"{kind}:{name}", kind=kind, name=name) for kind, name in sorted(codes)],
+        ignore_conflicts=True,
+    )
+    GamificationAchievement.objects.bulk_create(links, batch_size=500)
+
+
+def copy_back(apps, schema_editor):
+    Gamification = apps.get_model('gamification', 'Gamification')
+    GamificationAchievement = apps.get_model('gamification', 'GamificationAchievement')
+
+    rows = Gamification.objects.in_bulk(field_name='invite_id')
+    fields = dict(KIND_FIELDS)
+    for row in rows.values():
+        for field in fields.values():
+            setattr(row, field, [])
+    links = GamificationAchievement.objects.select_related('achievement').order_by('pk')
+    for link in links.iterator():
+        row = rows[link.gamification_id]
+        getattr(row, fields[link.achievement.kind]).append(link.achievement.name)
+    Gamification.objects.bulk_update(rows.values(), list(fields.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0003_gamificationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Achievement',
+            fields=[
+                ('code', models.CharField(max_length=130, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('badge', 'Badge'), ('mission', 'Missão'), ('secret_mission', 'Missão secreta')], max_length=20)),
+                ('name', models.CharField(max_length=100)),
+                ('title', models.CharField(blank=True, default='', max_length=150)),
+                ('description', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'name'), name='unique_achievement_kind_name')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GamificationAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('achievement', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='awards', to='gamification.achievement')),
+                ('gamification', models.ForeignKey(db_column='invite_id', on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='gamification.gamification', to_field='invite')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['achievement', 'gamification'], name='gamificatio_achieve_18d66c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('gamification', 'achievement'), name='unique_gamification_achievement')],
+            },
+        ),
+        migrations.RunPython(copy_achievements, copy_back),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """As listas JSON passaram para GamificationAchievement (0004)"""
+
+    dependencies = [
+        ('gamification', '0004_achievements'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='gamification',
+            name='badges',
+        ),
+        migrations.RemoveField(
+            model_name='gamification',
+            name='completed_missions',
+        ),
+        migrations.RemoveField(
+            model_name='gamification',
+            name='secret_missions',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0005_remove_gamification_lists'),
+        ('invitations', '0003_invite_qr_code_link'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamificationevent',
+            index=models.Index(condition=models.Q(('applied', False)), fields=['id'], name='gamification_event_pending'),
+        ),
+    ]
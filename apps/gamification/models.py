@@ -1,6 +1,40 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_save
+from django.utils import timezone
 from apps.invitations.models import Invite
 
+# Tipos de evento aceites por Gamification.apply: (tipo, valor)
+POINTS = 'points'
+SPEND = 'spend'
+BADGE = 'badge'
+MISSION = 'mission'
+SECRET_MISSION = 'secret_mission'
+
+# Prémio da primeira aceitação do convite
+FIRST_ACCEPTANCE_BADGE = "first_acceptance"
+FIRST_ACCEPTANCE_POINTS = 10
+
+# Conquistas (Achievement) atribuídas por cada tipo de evento, e a propriedade
+# da Gamification que lista os nomes de cada tipo
+ACHIEVEMENT_FIELDS = {
+    BADGE: 'badges',
+    MISSION: 'completed_missions',
+    SECRET_MISSION: 'secret_missions',
+}
+
+
+def _log_applied(invite_id, events):
+    """
+    Regista no GamificationEvent as alterações já aplicadas diretamente à
+    linha (applied=True), para auditoria e para `GamificationEventLog.rebuild`
+    """
+    if events:
+        GamificationEvent.objects.bulk_create([
+            GamificationEvent.from_tuple(invite_id, kind, value, applied=True) for kind, value in events
+        ])
+
+
 # Create your models here.
 class Gamification(models.Model):
     invite = models.OneToOneField(
@@ -10,39 +44,354 @@ class Gamification(models.Model):
     )
 
     points = models.IntegerField(default=0)
-    badges = models.JSONField(default=list, blank=True)
-    completed_missions = models.JSONField(default=list, blank=True)
-    secret_missions = models.JSONField(default=list, blank=True)
     rank = models.IntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def record_acceptance(invite_id):
+        """
+        Primeira aceitação: soma o badge e os pontos iniciais à Gamification
+        (criada se não existir) na transação do RSVP, com os eventos
+        (applied=True) como registo. O UPDATE do RSVP já bloqueia a linha do
+        convite, por isso a verificação da chave única dos eventos não corre
+        em paralelo; numa segunda aceitação nada é somado. Retorna True se somou.
+        """
+        from apps.gamification.services.leaderboard import leaderboard  # importação local
+
+        keys = {kind: f"first_acceptance:{invite_id}:{kind}" for kind in (BADGE, POINTS)}
+        # Sem savepoint: no RSVP já corre dentro da transação do UPDATE
+        with transaction.atomic(savepoint=False):
+            if GamificationEvent.objects.filter(dedupe_key__in=keys.values()).exists():
+                return False
+            GamificationEvent.objects.bulk_create([
+                GamificationEvent.from_tuple(invite_id, BADGE, FIRST_ACCEPTANCE_BADGE, applied=True,
+                                             dedupe_key=keys[BADGE]),
+                GamificationEvent.from_tuple(invite_id, POINTS, FIRST_ACCEPTANCE_POINTS, applied=True,
+                                             dedupe_key=keys[POINTS]),
+            ])
+            # Upsert: cria a linha se faltar e soma com F() (o agregador pode estar a escrevê-la)
+            Gamification.objects.bulk_create([Gamification(invite_id=invite_id)], ignore_conflicts=True)
+            Gamification.objects.filter(invite_id=invite_id).update(
+                points=F('points') + FIRST_ACCEPTANCE_POINTS, updated_at=timezone.now(),
+            )
+            pk, points = Gamification.objects.values_list('pk', 'points').get(invite_id=invite_id)
+            Gamification._award([(invite_id, BADGE, FIRST_ACCEPTANCE_BADGE)])
+            # update() não dispara post_save; o RSVP já invalida as páginas do convite
+            transaction.on_commit(lambda: leaderboard.update(pk, points))
+        return True
+
+    # ------------------------
+    # Conquistas
+    # ------------------------
+    def _achievement_codes(self):
+        """
+        Códigos das conquistas por ordem de atribuição; usa o prefetch de
+        `achievements` quando existe, senão uma query (guardada na instância)
+        """
+        if not hasattr(self, '_achievements'):
+            if 'achievements' in getattr(self, '_prefetched_objects_cache', {}):
+                held = sorted(self.achievements.all(), key=lambda row: row.pk)
+                self._achievements = [row.achievement_id for row in held]
+            else:
+                self._achievements = list(
+                    self.achievements.order_by('pk').values_list('achievement_id', flat=True)
+                )
+        return self._achievements
+
+    def _names(self, kind):
+        prefix = Achievement.code_for(kind, '')
+        return [code[len(prefix):] for code in self._achievement_codes() if code.startswith(prefix)]
+
+    @property
+    def badges(self):
+        return self._names(BADGE)
+
+    @property
+    def completed_missions(self):
+        return self._names(MISSION)
+
+    @property
+    def secret_missions(self):
+        return self._names(SECRET_MISSION)
+
+    def has_achievement(self, kind, name):
+        """Se tem a conquista (consulta pelo índice único, sem ler as restantes)"""
+        return self.achievements.filter(achievement_id=Achievement.code_for(kind, name)).exists()
+
+    # ------------------------
+    # Operações atómicas
+    # ------------------------
+    def _updated(self, fields):
+        """
+        Depois de um queryset.update(): recarrega os campos alterados e dispara
+        post_save, para os recetores (ex.: cache das páginas) verem a alteração
+        """
+        self.refresh_from_db(fields=[*fields, 'updated_at'])
+        post_save.send(sender=Gamification, instance=self, created=False,
+                       update_fields=frozenset(fields), raw=False, using=self._state.db)
 
     def add_points(self, amount):
-        self.points += amount
-        self.save()
+        """Soma pontos na base de dados (F()), sem perder somas concorrentes"""
+        with transaction.atomic():
+            Gamification.objects.filter(pk=self.pk).update(points=F('points') + amount, updated_at=timezone.now())
+            _log_applied(self.invite_id, [(POINTS, amount)])
+        self._updated(['points'])
 
     def spend_points(self, amount):
-        if self.points >= amount:
-            self.points -= amount
-            self.save()
-            return True
-        return False
+        """
+        Gasta pontos só se o saldo chegar, numa única query condicional.
+        Retorna False se não houver pontos suficientes.
+        """
+        with transaction.atomic():
+            spent = Gamification.objects.filter(pk=self.pk, points__gte=amount).update(
+                points=F('points') - amount, updated_at=timezone.now(),
+            )
+            if spent:
+                _log_applied(self.invite_id, [(SPEND, amount)])
+        if not spent:
+            return False
+        self._updated(['points'])
+        return True
 
     def add_badge(self, badge_name):
-        if not self.badges:
-            self.badges = []
-        if badge_name not in self.badges:
-            self.badges.append(badge_name)
-            self.save()
+        return self.apply([(BADGE, badge_name)])[0]
 
     def complete_mission(self, mission_name):
-        if not self.completed_missions:
-            self.completed_missions = []
-        if mission_name not in self.completed_missions:
-            self.completed_missions.append(mission_name)
-            self.save()
+        return self.apply([(MISSION, mission_name)])[0]
 
     def unlock_secret_mission(self, mission_name):
-        if not self.secret_missions:
-            self.secret_missions = []
-        if mission_name not in self.secret_missions:
-            self.secret_missions.append(mission_name)
-            self.save()
+        return self.apply([(SECRET_MISSION, mission_name)])[0]
+
+    def _fold(self, events, held):
+        """
+        Aplica os eventos aos pontos em memória e ao conjunto `held` de códigos
+        de conquistas, por ordem. Retorna (resultado por evento, se os pontos
+        mudaram, [(tipo, nome)] das conquistas novas).
+        """
+        results, points_changed, awarded = [], False, []
+        for kind, value in events:
+            if kind == POINTS:
+                self.points += value
+                applied = points_changed = True
+            elif kind == SPEND:
+                applied = self.points >= value
+                if applied:
+                    self.points -= value
+                    points_changed = True
+            elif kind in ACHIEVEMENT_FIELDS:
+                code = Achievement.code_for(kind, value)
+                applied = code not in held
+                if applied:
+                    held.add(code)
+                    awarded.append((kind, value))
+            else:
+                raise ValueError(f"Evento de gamificação desconhecido: {kind!r}")
+            results.append(applied)
+        return results, points_changed, awarded
+
+    @staticmethod
+    def _held(invite_ids, events_by_invite):
+        """
+        {invite_id: códigos já atribuídos}, lendo só as conquistas referidas
+        nos eventos (uma query pelo índice único, nenhuma se não houver)
+        """
+        codes = {Achievement.code_for(kind, value)
+                 for events in events_by_invite for kind, value in events if kind in ACHIEVEMENT_FIELDS}
+        held = {invite_id: set() for invite_id in invite_ids}
+        if codes:
+            rows = GamificationAchievement.objects.filter(gamification_id__in=invite_ids, achievement_id__in=codes)
+            for invite_id, code in rows.values_list('gamification_id', 'achievement_id'):
+                held[invite_id].add(code)
+        return held
+
+    @staticmethod
+    def _award(awarded):
+        """Grava [(invite_id, tipo, nome)] no registo e na tabela de ligação"""
+        if not awarded:
+            return
+        Achievement.register((kind, name) for _, kind, name in awarded)
+        GamificationAchievement.objects.bulk_create([
+            GamificationAchievement(gamification_id=invite_id, achievement_id=Achievement.code_for(kind, name))
+            for invite_id, kind, name in awarded
+        ], ignore_conflicts=True)
+
+    def apply(self, events):
+        """
+        Aplica vários eventos [(tipo, valor), ...] numa transação: lê a linha
+        com lock e grava-a uma vez. Um gasto sem saldo ou uma conquista já
+        atribuída não é aplicado (False no resultado).
+        """
+        events = list(events)
+        with transaction.atomic():
+            self.points = Gamification.objects.select_for_update().values_list('points', flat=True).get(pk=self.pk)
+            held = self._held([self.invite_id], [events])[self.invite_id]
+            results, points_changed, awarded = self._fold(events, held)
+            if points_changed or awarded:
+                self._award([(self.invite_id, kind, name) for kind, name in awarded])
+                self.__dict__.pop('_achievements', None)  # lista em cache desatualizada
+                # Grava sempre updated_at: o post_save invalida as páginas em cache
+                self.save(update_fields=['points', 'updated_at'] if points_changed else ['updated_at'])
+                _log_applied(self.invite_id, [event for event, applied in zip(events, results) if applied])
+        return results
+
+    @classmethod
+    def apply_batch(cls, events_by_pk, log=True):
+        """
+        Aplica {pk: [(tipo, valor), ...]} a várias linhas numa única
+        transação: uma leitura com lock para todas, uma para as conquistas e
+        uma escrita por linha alterada. Retorna {pk: [resultado por evento]}.
+        Com `log=False` não regista os eventos (já vêm do GamificationEvent,
+        ver o agregador).
+        """
+        results, applied, awarded = {}, [], []
+        with transaction.atomic():
+            rows = cls.objects.select_for_update().in_bulk(list(events_by_pk))
+            held = cls._held([row.invite_id for row in rows.values()], events_by_pk.values())
+            changed_rows = []
+            for pk, events in events_by_pk.items():
+                row = rows.get(pk)
+                if row is None:
+                    results[pk] = [False] * len(events)
+                    continue
+                results[pk], points_changed, new = row._fold(events, held[row.invite_id])
+                if points_changed or new:
+                    awarded += [(row.invite_id, kind, name) for kind, name in new]
+                    changed_rows.append((row, points_changed))
+                    applied += [GamificationEvent.from_tuple(row.invite_id, kind, value, applied=True)
+                                for (kind, value), ok in zip(events, results[pk]) if ok]
+            cls._award(awarded)
+            for row, points_changed in changed_rows:
+                row.save(update_fields=['points', 'updated_at'] if points_changed else ['updated_at'])
+            if log and applied:
+                GamificationEvent.objects.bulk_create(applied)
+        return results
+
+
+class Achievement(models.Model):
+    """
+    Registo dos badges e missões. A chave é o código `<tipo>:<nome>`, para
+    que as conquistas possam ser ligadas sem ler o registo primeiro.
+    """
+
+    code = models.CharField(max_length=130, primary_key=True)
+    kind = models.CharField(max_length=20, choices=[
+        (BADGE, 'Badge'), (MISSION, 'Missão'), (SECRET_MISSION, 'Missão secreta'),
+    ])
+    name = models.CharField(max_length=100)
+    title = models.CharField(max_length=150, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['kind', 'name'], name='unique_achievement_kind_name')]
+
+    @staticmethod
+    def code_for(kind, name):
+        return f"{kind}:{name}"
+
+    @classmethod
+    def register(cls, pairs):
+        """Acrescenta ao registo os (tipo, nome) que ainda não existem (um INSERT)"""
+        cls.objects.bulk_create([
+            cls(code=cls.code_for(kind, name), kind=kind, name=name) for kind, name in set(pairs)
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def holders(cls, kind, name):
+        """Gamification de quem tem a conquista (pelo índice da tabela de ligação)"""
+        return Gamification.objects.filter(achievements__achievement_id=cls.code_for(kind, name))
+
+    @classmethod
+    def counts(cls, kind=None):
+        """{código: nº de convidados com a conquista}, agrupado na base de dados"""
+        rows = GamificationAchievement.objects.all()
+        if kind is not None:
+            rows = rows.filter(achievement__kind=kind)
+        return dict(rows.values_list('achievement_id').annotate(total=Count('id')).order_by())
+
+    def __str__(self):
+        return self.title or self.code
+
+
+class GamificationAchievement(models.Model):
+    """
+    Conquista atribuída a uma Gamification. Liga pelo invite_id (único na
+    Gamification), que os caminhos em lote já conhecem sem ler a linha.
+    """
+
+    gamification = models.ForeignKey(
+        Gamification, to_field='invite', db_column='invite_id',
+        on_delete=models.CASCADE, related_name='achievements',
+    )
+    achievement = models.ForeignKey(Achievement, on_delete=models.PROTECT, related_name='awards', db_index=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gamification', 'achievement'], name='unique_gamification_achievement'),
+        ]
+        # "Quem tem a conquista X" e as contagens por conquista
+        indexes = [models.Index(fields=['achievement', 'gamification'])]
+
+
+class GamificationEvent(models.Model):
+    """
+    Registo só de acrescento das alterações de gamificação (pontos, gastos,
+    badges, missões). Os eventos com `applied=False` são escritos pelos
+    caminhos quentes (`GamificationEventLog.record`) e ainda não foram somados
+    à Gamification; o agregador soma-os em segundo plano e marca-os com
+    `applied=True`. As operações diretas (`add_points`, `apply`, ...) gravam
+    a linha e registam logo eventos `applied=True`. Todos servem de auditoria
+    e para reconstruir os agregados.
+    """
+
+    KIND_CHOICES = [
+        (POINTS, 'Pontos'),
+        (SPEND, 'Gasto'),
+        (BADGE, 'Badge'),
+        (MISSION, 'Missão'),
+        (SECRET_MISSION, 'Missão secreta'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    invite = models.ForeignKey(Invite, on_delete=models.CASCADE, related_name="gamification_events")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Pontos (POINTS/SPEND) ou nome do badge/missão
+    amount = models.IntegerField(default=0)
+    name = models.CharField(max_length=100, blank=True, default='')
+    # Já incluído na Gamification (ver GamificationEventLog.aggregate)
+    applied = models.BooleanField(default=False)
+    # Evita registar duas vezes o mesmo prémio (ex.: primeira aceitação)
+    dedupe_key = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['invite', 'id']),
+            # Só os eventos por somar, lidos pelo agregador
+            models.Index(fields=['id'], condition=Q(applied=False), name='gamification_event_pending'),
+        ]
+
+    @classmethod
+    def from_tuple(cls, invite_id, kind, value, **kwargs):
+        if kind in (POINTS, SPEND):
+            return cls(invite_id=invite_id, kind=kind, amount=value, **kwargs)
+        return cls(invite_id=invite_id, kind=kind, name=value, **kwargs)
+
+    @property
+    def value(self):
+        return self.amount if self.kind in (POINTS, SPEND) else self.name
+
+    def __str__(self):
+        return f"{self.kind} {self.value} (convite {self.invite_id})"
+
+
+class GamificationEventCursor(models.Model):
+    """
+    Estado do agregador: a linha é bloqueada durante cada lote (um agregador
+    de cada vez) e guarda o último evento somado, só para as estatísticas
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,194 @@
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from apps.gamification.models import (
+    Gamification, GamificationAchievement, GamificationEvent, GamificationEventCursor,
+)
+
+logger = logging.getLogger(__name__)
+
+CURSOR_NAME = 'gamification'
+
+
+class GamificationEventLog:
+    """
+    Escrita de alterações de gamificação como eventos (INSERTs em lote, sem
+    disputar a linha Gamification de cada convite) e agregação em segundo
+    plano para os totais, badges e missões da Gamification.
+
+    Os eventos por somar têm `applied=False`; o agregador marca-os com
+    `applied=True` na mesma transação em que grava os agregados. Um evento
+    de uma transação que faz commit tarde fica simplesmente para o lote
+    seguinte (não há um id máximo que o possa ultrapassar).
+    """
+
+    @staticmethod
+    def record(invite_id, kind, value):
+        GamificationEventLog.record_many([(invite_id, kind, value)])
+
+    @staticmethod
+    def record_many(events: Iterable[Tuple], dedupe: Optional[str] = None):
+        """
+        Regista [(invite_id, tipo, valor), ...] num único INSERT e agenda a agregação.
+        Com `dedupe`, cada evento leva a chave única `<dedupe>:<invite_id>:<tipo>`
+        e um evento já registado é ignorado (INSERT ... ON CONFLICT DO NOTHING).
+        """
+        rows = [
+            GamificationEvent.from_tuple(invite_id, kind, value,
+                                         dedupe_key=f"{dedupe}:{invite_id}:{kind}" if dedupe else None)
+            for invite_id, kind, value in events
+        ]
+        for row in rows:
+            if row.kind not in dict(GamificationEvent.KIND_CHOICES):
+                raise ValueError(f"Evento de gamificação desconhecido: {row.kind!r}")
+        GamificationEvent.objects.bulk_create(rows, batch_size=500, ignore_conflicts=bool(dedupe))
+        transaction.on_commit(GamificationEventLog.schedule)
+
+    @staticmethod
+    def _delay_seconds():
+        return getattr(settings, 'GAMIFICATION_AGGREGATE_DELAY', 2)
+
+    @staticmethod
+    def schedule():
+        """Agenda uma agregação na fila de tarefas, se ainda não houver uma pendente"""
+        from apps.core.services.job_queue import JobQueue  # importação local
+
+        JobQueue.enqueue_once("apps.gamification.services.event_log.aggregate_events",
+                              delay=GamificationEventLog._delay_seconds())
+
+    @staticmethod
+    def _ensure_rows(invite_ids) -> dict:
+        """{invite_id: pk da Gamification}, criando as linhas que faltam"""
+        Gamification.objects.bulk_create(
+            [Gamification(invite_id=invite_id) for invite_id in invite_ids], ignore_conflicts=True,
+        )
+        return dict(Gamification.objects.filter(invite_id__in=invite_ids).values_list('invite_id', 'pk'))
+
+    @staticmethod
+    def aggregate(batch_size: int = 1000) -> int:
+        """
+        Soma o próximo lote de eventos pendentes; retorna o nº de eventos lidos
+        (0 quando não há mais nada a agregar)
+        """
+        with transaction.atomic():
+            # O lock da linha do cursor serializa os agregadores
+            cursor, _ = GamificationEventCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+            events = list(GamificationEvent.objects.filter(applied=False).order_by('id')[:batch_size])
+            if not events:
+                return 0
+
+            by_invite = defaultdict(list)
+            for event in events:
+                by_invite[event.invite_id].append((event.kind, event.value))
+            pks = GamificationEventLog._ensure_rows(list(by_invite))
+            Gamification.apply_batch(
+                {pks[invite_id]: pending for invite_id, pending in by_invite.items() if invite_id in pks},
+                log=False,
+            )
+            GamificationEvent.objects.filter(id__in=[event.id for event in events]).update(applied=True)
+
+            cursor.last_event_id = max(cursor.last_event_id, events[-1].id)
+            cursor.save(update_fields=['last_event_id', 'updated_at'])
+        return len(events)
+
+    @staticmethod
+    def aggregate_all(batch_size: int = 1000) -> int:
+        total = 0
+        while True:
+            processed = GamificationEventLog.aggregate(batch_size)
+            if not processed:
+                return total
+            total += processed
+
+    @staticmethod
+    def rebuild(batch_size: int = 2000) -> int:
+        """
+        Recalcula todas as Gamification a partir de todos os eventos (aplicados
+        ou não), por ordem. Retorna o nº de linhas gravadas. Valores gravados
+        sem passar por eventos (ex.: pontos editados no admin) perdem-se.
+        """
+        from apps.gamification.services.leaderboard import leaderboard  # importação local
+
+        with transaction.atomic():
+            cursor, _ = GamificationEventCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+            last_id = GamificationEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+            rows = {row.invite_id: row for row in Gamification.objects.select_for_update()}
+            held = {invite_id: set() for invite_id in rows}
+            for row in rows.values():
+                row.points = 0
+
+            missing, awarded = set(), []
+            events = GamificationEvent.objects.filter(id__lte=last_id).order_by('id')
+            for event in events.iterator(chunk_size=batch_size):
+                row = rows.get(event.invite_id)
+                if row is None:
+                    missing.add(event.invite_id)
+                    row = rows[event.invite_id] = Gamification(invite_id=event.invite_id)
+                    held[event.invite_id] = set()
+                _, _, new = row._fold([(event.kind, event.value)], held[event.invite_id])
+                awarded += [(event.invite_id, kind, name) for kind, name in new]
+
+            now = timezone.now()
+            for row in rows.values():
+                row.updated_at = now
+            created = [row for invite_id, row in rows.items() if invite_id in missing]
+            Gamification.objects.bulk_create(created, batch_size=500)
+            Gamification.objects.bulk_update(
+                [row for invite_id, row in rows.items() if invite_id not in missing],
+                ['points', 'updated_at'], batch_size=500,
+            )
+            # Conquistas recriadas pela ordem dos eventos
+            GamificationAchievement.objects.all().delete()
+            Gamification._award(awarded)
+
+            # Eventos de transações ainda por fazer commit não estão aqui e
+            # continuam com applied=False, para o agregador
+            GamificationEvent.objects.filter(id__lte=last_id, applied=False).update(applied=True)
+            cursor.last_event_id = last_id
+            cursor.save(update_fields=['last_event_id', 'updated_at'])
+            # bulk_* não disparam sinais: ranking e páginas em cache
+            transaction.on_commit(leaderboard.invalidate)
+            transaction.on_commit(GamificationEventLog._invalidate_pages)
+
+        logger.info(f"Gamificação reconstruída: {len(rows)} linhas, eventos até ao {last_id}")
+        return len(rows)
+
+    @staticmethod
+    def _invalidate_pages():
+        from apps.invitations.models import Invite  # importação local
+        from apps.invitations.signals import invalidate_invite  # importação local
+
+        for token in Invite.objects.filter(gamification__isnull=False).values_list('token', flat=True):
+            invalidate_invite(token)
+
+    @staticmethod
+    def stats() -> dict:
+        """
+        Atraso da agregação: eventos por somar e idade do mais antigo
+        """
+        cursor = GamificationEventCursor.objects.filter(name=CURSOR_NAME).first()
+        pending = GamificationEvent.objects.filter(applied=False)
+        state = pending.aggregate(total=Count('id'), oldest=Min('created_at'))
+        oldest = state['oldest']
+        return {
+            'pending_events': state['total'],
+            'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+            'last_event_id': cursor.last_event_id if cursor else 0,
+            'last_aggregated_at': cursor.updated_at if cursor else None,
+        }
+
+
+def aggregate_events(payload, file):
+    """Handler da fila de tarefas (ver GamificationEventLog.schedule)"""
+    processed = GamificationEventLog.aggregate_all(getattr(settings, 'GAMIFICATION_EVENT_BATCH_SIZE', 1000))
+    # Eventos gravados durante a agregação ficam para a próxima tarefa
+    if GamificationEventLog.stats()['pending_events']:
+        GamificationEventLog.schedule()
+    return {'processed': processed}
@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardEngine:
+    """
+    Ranking dos convites por pontos, mantido em memória por processo numa
+    lista ordenada de chaves (-pontos, pk):
+
+    - posição de um convite, top-N e vizinhos por bisseção (O(log n));
+    - empates: o mesmo rank para os mesmos pontos (1, 2, 2, 4) e, dentro do
+      empate, ordem pela pk (quem chegou primeiro aparece primeiro);
+    - cada alteração de pontos é publicada no cache como um delta numerado
+      (pk, pontos); os outros processos aplicam os deltas que lhes faltam
+      e só reconstroem a lista (uma query) quando faltam deltas, há uma
+      alteração em lote (`invalidate`) ou a lista fica mais velha que `max_age`.
+
+    A partilha entre processos exige um cache partilhado (Redis, Memcached,
+    base de dados): com o LocMemCache cada processo só vê as suas próprias
+    alterações e as dos outros ao fim de `max_age`.
+
+    A coluna `Gamification.rank` é gravada em segundo plano (`persist_ranks`),
+    no máximo uma vez por `persist_interval`.
+    """
+
+    SEQUENCE_KEY = "leaderboard_sequence"
+    DELTA_KEY = "leaderboard_delta_{}"
+    PERSIST_KEY = "leaderboard_persist_pending"
+    # Muda quando os nomes mostrados na página do ranking mudam
+    PAGE_VERSION_KEY = "leaderboard_page_version"
+    # Com mais deltas em atraso é mais barato reconstruir
+    MAX_DELTAS = 500
+
+    def __init__(self, max_age=300, persist_interval=60):
+        self.max_age = max_age
+        self.persist_interval = persist_interval
+        self._keys = None
+        self._points = {}
+        self._sequence = None
+        self._built_at = 0.0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(pk, points):
+        return (-points, pk)
+
+    # ------------------------
+    # Estrutura em memória
+    # ------------------------
+    def rebuild(self, sequence=None):
+        from apps.gamification.models import Gamification  # importação local
+
+        # A sequência é lida antes da query: os deltas seguintes voltam a ser
+        # aplicados, sem efeito se já estiverem na base de dados
+        if sequence is None:
+            cache.add(self.SEQUENCE_KEY, 0, None)
+            sequence = cache.get(self.SEQUENCE_KEY)
+        rows = Gamification.objects.values_list('pk', 'points')
+        with self._lock:
+            self._points = dict(rows)
+            self._keys = sorted(self._key(pk, points) for pk, points in self._points.items())
+            self._sequence = sequence
+            self._built_at = time.monotonic()
+        logger.debug(f"Leaderboard reconstruído com {len(self._keys)} convites")
+
+    def _fresh(self):
+        sequence = cache.get(self.SEQUENCE_KEY)
+        with self._lock:
+            if self._keys is not None and time.monotonic() - self._built_at < self.max_age:
+                if sequence == self._sequence:
+                    return
+                if self._catch_up(sequence):
+                    return
+        self.rebuild(sequence)
+
+    def _catch_up(self, sequence) -> bool:
+        """Aplica os deltas publicados desde a última leitura; False se faltar algum"""
+        if sequence is None or self._sequence is None or not 0 < sequence - self._sequence <= self.MAX_DELTAS:
+            return False
+        keys = [self.DELTA_KEY.format(n) for n in range(self._sequence + 1, sequence + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) != len(keys):
+            return False
+        for key in keys:
+            pk, points = deltas[key]
+            if pk is None:
+                return False  # alteração em lote: só a reconstrução serve
+            self._apply(pk, points)
+        self._sequence = sequence
+        return True
+
+    def _apply(self, pk, points):
+        self._discard(pk)
+        if points is not None:
+            self._points[pk] = points
+            insort(self._keys, self._key(pk, points))
+
+    def _publish(self, pk, points):
+        """Publica o delta (pk, pontos); pontos None = removido, pk None = reconstruir"""
+        cache.add(self.SEQUENCE_KEY, 0, None)
+        try:
+            sequence = cache.incr(self.SEQUENCE_KEY)
+        except ValueError:  # chave removida do cache entretanto
+            cache.set(self.SEQUENCE_KEY, 1, None)
+            sequence = 1
+        cache.set(self.DELTA_KEY.format(sequence), (pk, points), self.max_age + 60)
+
+    def update(self, pk, points):
+        """Pontos de um convite alterados neste processo"""
+        self._publish(pk, points)
+        with self._lock:
+            if self._keys is not None:
+                # Os deltas são valores absolutos: voltar a aplicá-lo no _fresh não muda nada
+                self._apply(pk, points)
+        self.schedule_persist()
+
+    def remove(self, pk):
+        self._publish(pk, None)
+        with self._lock:
+            if self._keys is not None:
+                self._discard(pk)
+        self.schedule_persist()
+
+    def invalidate(self):
+        """Linhas alteradas sem post_save (ex.: bulk_create): força a reconstrução"""
+        self._publish(None, None)
+        self.schedule_persist()
+
+    def _discard(self, pk):
+        points = self._points.pop(pk, None)
+        if points is None:
+            return
+        index = bisect_left(self._keys, self._key(pk, points))
+        if index < len(self._keys) and self._keys[index] == self._key(pk, points):
+            del self._keys[index]
+
+    def _rank_for(self, points) -> int:
+        # Nº de convites com mais pontos + 1
+        return bisect_left(self._keys, (-points,)) + 1
+
+    # ------------------------
+    # Consultas
+    # ------------------------
+    def rank(self, pk) -> Optional[int]:
+        self._fresh()
+        with self._lock:
+            points = self._points.get(pk)
+            return self._rank_for(points) if points is not None else None
+
+    def top(self, n) -> List[Tuple[int, int, int]]:
+        """[(pk, pontos, rank)] dos primeiros `n`"""
+        self._fresh()
+        with self._lock:
+            return [(pk, -neg_points, self._rank_for(-neg_points)) for neg_points, pk in self._keys[:n]]
+
+    def around(self, pk, k=2) -> List[Tuple[int, int, int]]:
+        """[(pk, pontos, rank)] dos `k` convites antes e depois de `pk`, incluindo-o"""
+        self._fresh()
+        with self._lock:
+            points = self._points.get(pk)
+            if points is None:
+                return []
+            index = bisect_left(self._keys, self._key(pk, points))
+            window = self._keys[max(0, index - k):index + k + 1]
+            return [(other, -neg_points, self._rank_for(-neg_points)) for neg_points, other in window]
+
+    def size(self) -> int:
+        self._fresh()
+        with self._lock:
+            return len(self._keys)
+
+    def page_version(self) -> str:
+        return cache.get_or_set(self.PAGE_VERSION_KEY, lambda: uuid.uuid4().hex[:8], None)
+
+    def names_changed(self):
+        """Convidado renomeado ou apagado: a página em cache deixa de servir"""
+        cache.set(self.PAGE_VERSION_KEY, uuid.uuid4().hex[:8], None)
+
+    @staticmethod
+    def signature(entries) -> str:
+        """Identifica o conteúdo de um top-N (chave do cache da página e ETag)"""
+        raw = ";".join(f"{pk}:{points}:{rank}" for pk, points, rank in entries)
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    # ------------------------
+    # Persistência de Gamification.rank
+    # ------------------------
+    def schedule_persist(self):
+        if not self.persist_interval:
+            return
+        # A chave expira sozinha quando a tarefa corre: as alterações até lá
+        # entram nessa tarefa, as seguintes agendam a próxima
+        if cache.add(self.PERSIST_KEY, True, self.persist_interval):
+            from apps.core.services.job_queue import JobQueue  # importação local
+
+            JobQueue.enqueue("apps.gamification.services.leaderboard.persist_ranks", delay=self.persist_interval)
+
+    def persist_ranks(self) -> int:
+        """Grava os ranks que mudaram; retorna o nº de linhas atualizadas"""
+        from apps.gamification.models import Gamification  # importação local
+
+        self.rebuild()
+        with self._lock:
+            ranks = {pk: self._rank_for(points) for pk, points in self._points.items()}
+
+        stale = [
+            Gamification(pk=pk, rank=ranks[pk])
+            for pk, rank in Gamification.objects.values_list('pk', 'rank')
+            if pk in ranks and ranks[pk] != rank
+        ]
+        # bulk_update não mexe em updated_at nem dispara sinais: as páginas não são invalidadas
+        Gamification.objects.bulk_update(stale, ['rank'], batch_size=500)
+        return len(stale)
+
+
+leaderboard = LeaderboardEngine(
+    max_age=getattr(settings, 'LEADERBOARD_MAX_AGE', 300),
+    persist_interval=getattr(settings, 'LEADERBOARD_PERSIST_INTERVAL', 60),
+)
+
+
+def persist_ranks(payload, file):
+    """Handler da fila de tarefas (ver LeaderboardEngine.schedule_persist)"""
+    return {'updated': leaderboard.persist_ranks()}
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.gamification.services.leaderboard import leaderboard
+
+
+def _points_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'points' not in update_fields:
+        return
+    pk, points = instance.pk, instance.points
+    # Só depois do commit: uma transação desfeita não altera o ranking
+    transaction.on_commit(lambda: leaderboard.update(pk, points))
+
+
+def _gamification_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: leaderboard.remove(pk))
+
+
+# Campos do convidado mostrados na página do ranking
+PAGE_GUEST_FIELDS = {'first_name', 'last_name'}
+
+
+def _guest_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not PAGE_GUEST_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(leaderboard.names_changed)
+
+
+def connect_signals():
+    post_save.connect(_points_changed, sender='gamification.Gamification', dispatch_uid="leaderboard_points")
+    post_delete.connect(_gamification_deleted, sender='gamification.Gamification', dispatch_uid="leaderboard_delete")
+    for signal in (post_save, post_delete):
+        signal.connect(_guest_changed, sender='guests.Guest',
+                       dispatch_uid=f"leaderboard_page_guest_{signal is post_save}")
@@ -1,3 +1,281 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.models import BackgroundJob
+from apps.core.services.job_queue import JobQueue
+
+from apps.gamification.models import (
+    BADGE, FIRST_ACCEPTANCE_BADGE, FIRST_ACCEPTANCE_POINTS, MISSION, POINTS, SPEND, Achievement, Gamification,
+    GamificationEvent,
+)
+from apps.gamification.services.event_log import GamificationEventLog
+from apps.gamification.services.leaderboard import LeaderboardEngine, leaderboard
+from apps.guests.models import Guest
+from apps.invitations.models import Invite
+
+
+class AchievementStorageTests(TestCase):
+    """
+    Badges e missões ficam no registo (Achievement) e na tabela de ligação
+    indexada, em vez de listas JSON em cada Gamification
+    """
+
+    def setUp(self):
+        self.rows = [
+            Gamification.objects.create(invite=Invite.objects.create(guest=Guest.objects.create(first_name=name)))
+            for name in ("Ana", "Rui", "Eva")
+        ]
+
+    def test_apply_awards_once_and_keeps_order(self):
+        gamification = self.rows[0]
+        results = gamification.apply([(BADGE, "dj"), (MISSION, "brinde"), (BADGE, "dj"), (POINTS, 5)])
+        self.assertEqual(results, [True, True, False, True])
+        self.assertFalse(gamification.add_badge("dj"))
+        self.assertTrue(gamification.add_badge("fotografo"))
+
+        gamification = Gamification.objects.get(pk=gamification.pk)
+        self.assertEqual(gamification.badges, ["dj", "fotografo"])
+        self.assertEqual(gamification.completed_missions, ["brinde"])
+        self.assertEqual(gamification.points, 5)
+        self.assertTrue(gamification.has_achievement(BADGE, "dj"))
+        self.assertFalse(gamification.has_achievement(MISSION, "dj"))
+
+    def test_holders_and_counts(self):
+        Gamification.apply_batch({
+            self.rows[0].pk: [(BADGE, "dj")],
+            self.rows[1].pk: [(BADGE, "dj"), (MISSION, "brinde")],
+        })
+
+        with self.assertNumQueries(1):
+            holders = set(Achievement.holders(BADGE, "dj").values_list('pk', flat=True))
+        self.assertEqual(holders, {self.rows[0].pk, self.rows[1].pk})
+
+        with self.assertNumQueries(1):
+            counts = Achievement.counts()
+        self.assertEqual(counts, {"badge:dj": 2, "mission:brinde": 1})
+        self.assertEqual(Achievement.counts(MISSION), {"mission:brinde": 1})
+
+    def test_prefetched_lists_need_no_queries(self):
+        self.rows[0].apply([(BADGE, "dj"), (MISSION, "brinde")])
+        rows = list(Gamification.objects.prefetch_related('achievements').order_by('pk'))
+        with self.assertNumQueries(0):
+            self.assertEqual([(row.badges, row.completed_missions) for row in rows],
+                             [(["dj"], ["brinde"]), ([], []), ([], [])])
+
+
+class PointsTests(TestCase):
+    """Somas e gastos de pontos atómicos, registados e visíveis para os sinais"""
+
+    def setUp(self):
+        invite = Invite.objects.create(guest=Guest.objects.create(first_name="Ana"))
+        self.gamification = Gamification.objects.create(invite=invite, points=5)
+        self.saved = []
+        post_save.connect(self._saved, sender=Gamification, dispatch_uid="points_tests")
+        self.addCleanup(post_save.disconnect, sender=Gamification, dispatch_uid="points_tests")
+
+    def _saved(self, sender, instance, update_fields, **kwargs):
+        self.saved.append((instance.points, update_fields))
+
+    def _stale(self):
+        # Cópia carregada antes das alterações de outro pedido
+        return Gamification.objects.get(pk=self.gamification.pk)
+
+    def _points(self):
+        return Gamification.objects.values_list('points', flat=True).get(pk=self.gamification.pk)
+
+    def test_spend_without_balance_changes_nothing(self):
+        self.assertFalse(self.gamification.spend_points(6))
+        self.assertFalse(Gamification.apply_batch({self.gamification.pk: [(SPEND, 6)]})[self.gamification.pk][0])
+        self.assertEqual(self.gamification.apply([(SPEND, 6)]), [False])
+
+        self.assertEqual(self._points(), 5)
+        self.assertFalse(GamificationEvent.objects.filter(kind=SPEND).exists())
+        self.assertEqual(self.saved, [])
+
+    def test_double_apply_from_stale_copies(self):
+        first, second = self._stale(), self._stale()
+        first.add_points(3)
+        second.add_points(4)
+        self.assertEqual(self._points(), 12)
+
+        first, second = self._stale(), self._stale()
+        self.assertTrue(first.spend_points(7))
+        self.assertFalse(second.spend_points(7))
+        self.assertEqual(self._points(), 5)
+
+        first, second = self._stale(), self._stale()
+        self.assertEqual(first.apply([(BADGE, "dj"), (POINTS, 2)]), [True, True])
+        self.assertEqual(second.apply([(BADGE, "dj"), (POINTS, 2)]), [False, True])
+        self.assertEqual(self._points(), 9)
+        self.assertEqual(Gamification.objects.get(pk=self.gamification.pk).badges, ["dj"])
+        self.assertEqual(GamificationEvent.objects.filter(kind=BADGE).count(), 1)
+
+    def test_update_sends_post_save_with_the_new_points(self):
+        self.gamification.add_points(3)
+        self.assertTrue(self.gamification.spend_points(2))
+        self.assertEqual(self.saved, [(8, frozenset({'points'})), (6, frozenset({'points'}))])
+        self.assertEqual(self.gamification.points, 6)
+
+
+class GamificationEventLogTests(TestCase):
+    """Agregação dos eventos escritos pelos caminhos quentes"""
+
+    def setUp(self):
+        self.invites = [Invite.objects.create(guest=Guest.objects.create(first_name=name)) for name in ("Ana", "Rui")]
+
+    def test_late_commit_below_last_aggregated_id_is_not_lost(self):
+        # Evento com id baixo que só fica visível depois de um lote com ids maiores
+        late = GamificationEvent.objects.create(invite=self.invites[0], kind=POINTS, amount=4, applied=True)
+        GamificationEventLog.record(self.invites[1].pk, POINTS, 7)
+        self.assertEqual(GamificationEventLog.aggregate_all(), 1)
+
+        GamificationEvent.objects.filter(pk=late.pk).update(applied=False)
+        self.assertEqual(GamificationEventLog.stats()['pending_events'], 1)
+        self.assertEqual(GamificationEventLog.aggregate_all(), 1)
+        self.assertEqual(Gamification.objects.get(invite=self.invites[0]).points, 4)
+        self.assertEqual(GamificationEventLog.stats()['pending_events'], 0)
+
+    def test_stats_report_pending_events_and_lag(self):
+        GamificationEventLog.record_many([(self.invites[0].pk, POINTS, 1), (self.invites[1].pk, BADGE, "dj")])
+        GamificationEvent.objects.update(created_at=timezone.now() - timedelta(seconds=30))
+
+        stats = GamificationEventLog.stats()
+        self.assertEqual(stats['pending_events'], 2)
+        self.assertGreaterEqual(stats['lag_seconds'], 30)
+
+        GamificationEventLog.aggregate_all()
+        stats = GamificationEventLog.stats()
+        self.assertEqual((stats['pending_events'], stats['lag_seconds']), (0, 0.0))
+        self.assertEqual(Gamification.objects.get(invite=self.invites[1]).badges, ["dj"])
+
+    def test_one_pending_aggregation_job_across_processes(self):
+        handler = "apps.gamification.services.event_log.aggregate_events"
+        with self.captureOnCommitCallbacks(execute=True):
+            GamificationEventLog.record(self.invites[0].pk, POINTS, 1)
+        # Outro processo (cache local vazio) não cria uma segunda tarefa
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            GamificationEventLog.record(self.invites[1].pk, POINTS, 2)
+        job = BackgroundJob.objects.get(handler=handler)
+
+        # Eventos gravados enquanto a tarefa corre agendam a seguinte
+        JobQueue.claim(job)
+        with self.captureOnCommitCallbacks(execute=True):
+            GamificationEventLog.record(self.invites[1].pk, POINTS, 3)
+        self.assertEqual(BackgroundJob.objects.filter(handler=handler, status='pending').count(), 1)
+
+        JobQueue.run(job)
+        self.assertEqual(Gamification.objects.get(invite=self.invites[1]).points, 5)
+
+    def test_acceptance_on_existing_row_matches_rebuild(self):
+        # Linha já criada (ex.: pelo admin) antes da aceitação
+        gamification = Gamification.objects.create(invite=self.invites[0])
+        Gamification.record_acceptance(self.invites[0].pk)
+        Gamification.record_acceptance(self.invites[0].pk)
+        self.assertEqual(GamificationEventLog.aggregate_all(), 0)
+
+        gamification.refresh_from_db()
+        self.assertEqual((gamification.points, gamification.badges),
+                         (FIRST_ACCEPTANCE_POINTS, [FIRST_ACCEPTANCE_BADGE]))
+
+        GamificationEventLog.rebuild()
+        gamification = Gamification.objects.get(pk=gamification.pk)
+        self.assertEqual((gamification.points, gamification.badges),
+                         (FIRST_ACCEPTANCE_POINTS, [FIRST_ACCEPTANCE_BADGE]))
+
+    def test_rebuild_replays_direct_and_aggregated_events(self):
+        gamification = Gamification.objects.create(invite=self.invites[0])
+        gamification.apply([(POINTS, 5), (BADGE, "dj")])
+        gamification.spend_points(2)
+        GamificationEventLog.record_many([(self.invites[0].pk, MISSION, "brinde"), (self.invites[1].pk, POINTS, 3)])
+        GamificationEventLog.aggregate_all()
+        expected = list(Gamification.objects.prefetch_related('achievements').order_by('invite_id'))
+        expected = [(row.invite_id, row.points, row.badges, row.completed_missions) for row in expected]
+
+        Gamification.objects.update(points=999)
+        Gamification.objects.get(invite=self.invites[1]).delete()
+        self.assertEqual(GamificationEventLog.rebuild(), 2)
+
+        rows = Gamification.objects.prefetch_related('achievements').order_by('invite_id')
+        self.assertEqual([(row.invite_id, row.points, row.badges, row.completed_missions) for row in rows], expected)
+        self.assertEqual(expected[0][1:], (3, ["dj"], ["brinde"]))
+        self.assertEqual(GamificationEventLog.stats()['pending_events'], 0)
+
+
+class LeaderboardEngineTests(TestCase):
+    """Dois motores com o mesmo cache fazem de dois processos"""
+
+    def setUp(self):
+        cache.clear()
+        self.rows = [
+            Gamification.objects.create(invite=Invite.objects.create(guest=Guest.objects.create(first_name=name)),
+                                        points=points)
+            for name, points in (("Ana", 10), ("Rui", 5), ("Eva", 5))
+        ]
+        self.writer = LeaderboardEngine(persist_interval=0)
+        self.reader = LeaderboardEngine(persist_interval=0)
+        self.reader.rebuild()
+
+    def test_other_process_applies_deltas_without_reloading(self):
+        self.writer.update(self.rows[2].pk, 20)
+        self.writer.remove(self.rows[0].pk)
+        with self.assertNumQueries(0):
+            top = self.reader.top(3)
+        self.assertEqual(top, [(self.rows[2].pk, 20, 1), (self.rows[1].pk, 5, 2)])
+
+    def test_ties_share_rank(self):
+        self.assertEqual([self.reader.rank(row.pk) for row in self.rows], [1, 2, 2])
+
+    def test_invalidate_or_missing_delta_forces_rebuild(self):
+        Gamification.objects.filter(pk=self.rows[1].pk).update(points=50)
+        self.writer.invalidate()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.reader.rank(self.rows[1].pk), 1)
+
+        self.writer.update(self.rows[0].pk, 60)
+        cache.delete(LeaderboardEngine.DELTA_KEY.format(cache.get(LeaderboardEngine.SEQUENCE_KEY)))
+        with self.assertNumQueries(1):
+            self.reader.rank(self.rows[0].pk)
+
+    def test_persist_key_is_not_cleared_by_the_job(self):
+        engine = LeaderboardEngine(persist_interval=60)
+        with override_settings(JOB_QUEUE_ENABLED=True):
+            engine.schedule_persist()
+            engine.persist_ranks()
+            engine.schedule_persist()
+        self.assertEqual(BackgroundJob.objects.filter(handler__endswith='persist_ranks').count(), 1)
+        self.assertEqual(Gamification.objects.get(pk=self.rows[0].pk).rank, 1)
+
+
+class LeaderboardPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        leaderboard.invalidate()
+        self.guest = Guest.objects.create(first_name="Ana")
+        Gamification.objects.create(invite=Invite.objects.create(guest=self.guest), points=10)
+
+    def test_renaming_a_guest_refreshes_the_cached_page(self):
+        url = reverse('gamification:leaderboard')
+        first = self.client.get(url)
+        self.assertContains(first, "Ana")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest.first_name = "Beatriz"
+            self.guest.save()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, "Beatriz")
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def test_media_only_guest_save_keeps_the_page(self):
+        url = reverse('gamification:leaderboard')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest.save(update_fields=['memories', 'updated_at'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
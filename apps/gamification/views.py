@@ -1,14 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition
 from apps.gamification.models import Gamification
+from apps.gamification.services.leaderboard import leaderboard as leaderboard_engine
 from apps.invitations.models import Invite
 
+
+def _leaderboard_page(entries, version):
+    """
+    HTML do ranking para um top-N; fica em cache pela assinatura do top-N e
+    pela versão dos nomes, por isso só muda quando os primeiros lugares mudam
+    ou um convidado é renomeado
+    """
+    key = f"leaderboard_page_{version}_{leaderboard_engine.signature(entries)}"
+    html = cache.get(key)
+    if html is None:
+        rows = Gamification.objects.select_related('invite__guest').in_bulk([pk for pk, _, _ in entries])
+        html = render_to_string("gamification/leaderboard.html", {
+            "entries": [
+                {"gamification": rows[pk], "points": points, "rank": rank}
+                for pk, points, rank in entries if pk in rows
+            ],
+        })
+        cache.set(key, html, getattr(settings, 'LEADERBOARD_PAGE_CACHE_TIMEOUT', 3600))
+    return html
+
+
+def _achievements_state(request, token):
+    if not hasattr(request, '_achievements_state'):
+        request._achievements_state = Invite.objects.filter(token=token, gamification__isnull=False).values(
+            'updated_at', 'guest__updated_at', 'gamification__updated_at', 'gamification__id',
+        ).first()
+    return request._achievements_state
+
+
+def _achievements_last_modified(request, token):
+    state = _achievements_state(request, token)
+    if state is None:
+        return None
+    return max(d for d in (state['updated_at'], state['guest__updated_at'], state['gamification__updated_at']) if d)
+
+
+def _achievements_etag(request, token):
+    last_modified = _achievements_last_modified(request, token)
+    if last_modified is None:
+        return None
+    # A posição muda com os pontos dos outros convidados
+    rank = leaderboard_engine.rank(_achievements_state(request, token)['gamification__id'])
+    return f"achievements-{token}-{last_modified.timestamp()}-{rank}"
+
+
 def leaderboard(request):
     """
     Exibe o ranking dos convidados por pontos
     """
-    gamifications = Gamification.objects.all().order_by('-points')[:20]
-    return render(request, "gamification/leaderboard.html", {"gamifications": gamifications})
+    entries = leaderboard_engine.top(getattr(settings, 'LEADERBOARD_SIZE', 20))
+    version = leaderboard_engine.page_version()
+    etag = f'"{version}-{leaderboard_engine.signature(entries)}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+    return HttpResponse(_leaderboard_page(entries, version), headers={'ETag': etag})
 
+@condition(etag_func=_achievements_etag, last_modified_func=_achievements_last_modified)
 def user_achievements(request, token):
     """
     Mostra as conquistas do convidado
@@ -16,9 +75,17 @@ def user_achievements(request, token):
     invite = get_object_or_404(Invite, token=token)
     try:
         gamification = invite.gamification
+        neighbours = leaderboard_engine.around(gamification.pk, k=2)
+        rows = Gamification.objects.select_related('invite__guest').in_bulk([pk for pk, _, _ in neighbours])
         return render(request, "gamification/achievements.html", {
             "invite": invite,
-            "gamification": gamification
+            "gamification": gamification,
+            "rank": leaderboard_engine.rank(gamification.pk),
+            "total": leaderboard_engine.size(),
+            "neighbours": [
+                {"gamification": rows[pk], "points": points, "rank": rank, "is_me": pk == gamification.pk}
+                for pk, points, rank in neighbours if pk in rows
+            ],
         })
     except Gamification.DoesNotExist:
         return redirect("invite_detail", token=token)
@@ -1,6 +1,9 @@
+import time
+
 from django import forms
 from apps.guests.models import Guest
-from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.job_queue import JobQueue
+from apps.guests.services.media_manifest import MediaManifestService
 
 
 class GuestForm(forms.ModelForm):
@@ -21,24 +24,42 @@ class GuestForm(forms.ModelForm):
     def save(self, commit=True):
         guest = super().save(commit=False)
 
+        # Os uploads para o Appwrite são feitos pela fila de tarefas (`run_jobs`)
+        # depois de o convidado ser gravado; avatar_id, memories e o manifesto
+        # são preenchidos à medida que as tarefas terminam.
+        self._pending_uploads = []
+
         # Processamento do avatar
         pic = self.cleaned_data.get("avatar")
         if pic:
-            guest.avatar_id = AppwriteService.upload_file(pic, resize_to=(500, 500))
+            self._pending_uploads.append((
+                "apps.guests.services.upload_jobs.upload_avatar",
+                pic,
+                MediaManifestService.image_size(pic, (500, 500)),
+                {},
+            ))
 
         # Processamento das memórias (múltiplas imagens)
         # Busca diretamente da requisição
-        memory_files = self.files.getlist('memories_upload')
-        if memory_files:
-            # Inicializa a lista de memórias se não existir
-            if not guest.memories:
-                guest.memories = []
+        # `position` guarda a ordem escolhida: as tarefas podem terminar por outra
+        first_position = time.time_ns()
+        for index, memory_file in enumerate(self.files.getlist('memories_upload')):
+            self._pending_uploads.append((
+                "apps.guests.services.upload_jobs.upload_memory",
+                memory_file,
+                MediaManifestService.image_size(memory_file, (800, 800)),
+                {'position': first_position + index},
+            ))
 
-            # Processa cada arquivo e adiciona o ID à lista de memórias
-            for memory_file in memory_files:
-                memory_id = AppwriteService.upload_file(memory_file, resize_to=(800, 800))
-                guest.memories.append(memory_id)
+        guest.refresh_media_manifest()
 
         if commit:
             guest.save()
+            self._save_m2m()
         return guest
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        for handler, file, size, extra in getattr(self, '_pending_uploads', []):
+            JobQueue.enqueue(handler, {'guest_id': self.instance.pk, 'size': size, **extra}, file=file)
+        self._pending_uploads = []
@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.blob_index import BlobIndex
+from apps.core.services.image_derivatives import ImageDerivativeService
+from apps.guests.models import Guest
+
+
+def _generate(file_id, kind):
+    data = AppwriteService.download_file(file_id)
+    # O ficheiro principal continua a ser o original; as variantes ficam num blob
+    # do índice (referência libertada com Guest.blob_file_ids)
+    return ImageDerivativeService.upload(data, f"{file_id}.jpg", ImageDerivativeService.sizes_for(kind))
+
+
+class Command(BaseCommand):
+    help = ("Gera as variantes WebP/JPEG (thumb/medium/full) das imagens já enviadas "
+            "e atualiza os manifestos dos convidados")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Imagens processadas em paralelo (por omissão, nº de CPUs)")
+        parser.add_argument('--guest', type=int, action='append', dest='guest_ids',
+                            help="Limita a um convidado (pode repetir)")
+        parser.add_argument('--force', action='store_true',
+                            help="Regenera também imagens que já têm variantes")
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or os.cpu_count() or 1
+        guests = Guest.objects.only('id', 'avatar_id', 'memories', 'media_variants').order_by('pk')
+        if options['guest_ids']:
+            guests = guests.filter(pk__in=options['guest_ids'])
+
+        pending = []
+        for guest in guests.iterator():
+            known = guest.media_variants or {}
+            # Um ficheiro usado duas vezes tem uma só entrada em media_variants
+            files = {guest.avatar_id: 'avatar'}
+            for memory_id in guest.memories or []:
+                files.setdefault(memory_id, 'memory')
+            for file_id, kind in files.items():
+                if file_id and (options['force'] or file_id not in known):
+                    pending.append((guest.pk, file_id, kind))
+
+        if not pending:
+            self.stdout.write("Nenhuma imagem sem variantes")
+            return
+
+        # O Pillow liberta o GIL ao descodificar/redimensionar e o resto é rede,
+        # por isso um pool de threads aproveita vários núcleos
+        generated, failed = {}, 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_generate, file_id, kind): (guest_id, file_id)
+                       for guest_id, file_id, kind in pending}
+            for future in as_completed(futures):
+                guest_id, file_id = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"Falha em {file_id} (convidado {guest_id}): {exc}")
+                    continue
+                if variants:
+                    generated.setdefault(guest_id, {})[file_id] = variants
+
+        updated = sum(self._save(guest_id, variants) for guest_id, variants in generated.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(len(v) for v in generated.values())} imagens processadas, "
+            f"{updated} convidados atualizados, {failed} falhas"
+        ))
+
+    def _save(self, guest_id, variants):
+        with transaction.atomic():
+            guest = Guest.objects.select_for_update().filter(pk=guest_id).first()
+            current = {guest.avatar_id, *(guest.memories or [])} if guest else set()
+            # Só grava variantes de ficheiros que o convidado ainda usa; as
+            # restantes e as que são substituídas (--force) perdem a referência
+            kept = {file_id: v for file_id, v in variants.items() if file_id in current}
+            discarded = [ImageDerivativeService.largest(v) for file_id, v in variants.items() if file_id not in kept]
+            if guest is not None:
+                discarded += [file_id for file_id in guest.blob_file_ids(kept) if file_id not in kept]
+            BlobIndex.release(discarded)
+            if guest is None:
+                return 0
+            guest.media_variants = {**(guest.media_variants or {}), **kept}
+            guest.refresh_media_manifest()
+            # save() dispara os sinais que invalidam as páginas do convite
+            guest.save(update_fields=['media_variants', 'media_manifest', 'updated_at'])
+        return 1
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.guests.models import Guest
+from apps.guests.services.media_manifest import MediaManifestService
+from apps.invitations.models import Invite
+from apps.invitations.signals import invalidate_invite
+
+
+class Command(BaseCommand):
+    help = "Reconstrói os manifestos de mídia dos convidados (ex.: depois de mudar o endpoint ou bucket do Appwrite)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Reconstrói todos os manifestos, não só os desatualizados")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rebuild_all = options['all']
+
+        guests = Guest.objects.only('id', 'avatar_id', 'memories', 'media_variants', 'media_manifest', 'updated_at').order_by('pk')
+        batch, updated, scanned = [], 0, 0
+
+        for guest in guests.iterator(chunk_size=batch_size):
+            scanned += 1
+            if not rebuild_all and not MediaManifestService.is_stale(guest.media_manifest):
+                continue
+            guest.refresh_media_manifest()
+            guest.updated_at = timezone.now()
+            batch.append(guest)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+                batch = []
+
+        if batch:
+            updated += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} manifestos reconstruídos ({scanned} convidados analisados)"
+        ))
+
+    def _flush(self, guests):
+        with transaction.atomic():
+            Guest.objects.bulk_update(guests, ['media_manifest', 'updated_at'])
+
+        # bulk_update não dispara sinais: invalida as páginas dos convites afetados
+        tokens = Invite.objects.filter(guest__in=guests).values_list('token', flat=True)
+        for token in tokens:
+            invalidate_invite(token)
+        return len(guests)
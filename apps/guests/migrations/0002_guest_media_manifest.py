@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guest',
+            name='media_manifest',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0002_guest_media_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guests', '0004_guest_media_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guest',
+            name='memory_order',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
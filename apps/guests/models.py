@@ -1,6 +1,6 @@
 from django.db import models
 import uuid
-from apps.core.services.appwrite_service import AppwriteService
+from apps.guests.services.media_manifest import MediaManifestService
 
 
 class Guest(models.Model):
@@ -31,6 +31,13 @@ class Guest(models.Model):
     # Recordações (Lista de imagens)
     # ------------------------
     memories = models.JSONField(default=list, blank=True, null=True)
+    # Posição de cada recordação na ordem do upload ({file_id: posição}); as
+    # tarefas de upload podem terminar por outra ordem (ver upload_jobs)
+    memory_order = models.JSONField(default=dict, blank=True)
+    # URLs e dimensões pré-calculadas no upload (ver MediaManifestService)
+    media_manifest = models.JSONField(default=dict, blank=True)
+    # Variantes por ficheiro: {file_id: {'thumb': {'width', 'height', 'webp', 'jpeg'}, ...}}
+    media_variants = models.JSONField(default=dict, blank=True)
 
     # ------------------------
     # Post-confirmation Preferences
@@ -40,17 +47,45 @@ class Guest(models.Model):
     dietary_restrictions = models.CharField(max_length=200, blank=True, null=True)
     music_suggestion = models.CharField(max_length=200, blank=True, null=True)
 
+    # Usado para Last-Modified nas páginas públicas
+    updated_at = models.DateTimeField(auto_now=True)
+
     # Property renomeada
+    @property
+    def manifest(self):
+        return MediaManifestService.for_guest(self)
+
     @property
     def avatar_url(self):
-        return AppwriteService.get_file_url(self.avatar_id)
+        avatar = self.manifest['avatar']
+        return avatar['url'] if avatar else None
 
     @property
     def memories_urls(self):
         """Retorna uma lista de URLs para as imagens de recordações"""
-        if not self.memories:
-            return []
-        return [AppwriteService.get_file_url(image_id) for image_id in self.memories]
+        return [memory['url'] for memory in self.manifest['memories']]
+
+    def blob_file_ids(self, file_ids):
+        """
+        Ids a libertar no BlobIndex quando o convidado deixa de usar `file_ids`:
+        os próprios ficheiros e, nas imagens cujas variantes foram geradas depois
+        do upload (generate_media_variants), o blob dessas variantes
+        """
+        from apps.core.services.image_derivatives import ImageDerivativeService  # importação local
+
+        file_ids = [file_id for file_id in file_ids if file_id]
+        variants = self.media_variants or {}
+        released = list(file_ids)
+        for file_id in dict.fromkeys(file_ids):
+            largest = ImageDerivativeService.largest(variants.get(file_id))
+            if largest and largest != file_id:
+                released.append(largest)
+        return released
+
+    def refresh_media_manifest(self, sizes=None):
+        """Reconstrói o manifesto de mídia (não grava o modelo)"""
+        self.media_manifest = MediaManifestService.build(self, sizes)
+        return self.media_manifest
 
     def __str__(self):
         return f"{self.first_name} {self.last_name or ''} ({self.token})"
\ No newline at end of file
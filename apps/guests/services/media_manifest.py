@@ -0,0 +1,150 @@
+import logging
+from typing import Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.storage_backends import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando a estrutura do manifesto mudar
+MANIFEST_VERSION = 2
+
+
+class MediaManifestService:
+    """
+    Manifesto de mídia do convidado (avatar, recordações ordenadas, variantes
+    e dimensões), gerado no upload e gravado em `Guest.media_manifest`, para
+    que a página do convite não tenha de reconstruir URLs a cada pedido.
+
+    As variantes (thumb/medium/full em WebP e JPEG) vêm de `Guest.media_variants`;
+    imagens ainda sem variantes usam o ficheiro principal em todos os tamanhos.
+    """
+
+    @staticmethod
+    def _storage_signature() -> dict:
+        return get_storage().signature()
+
+    @staticmethod
+    def image_size(file, bound: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """
+        Lê as dimensões de `file` a partir do cabeçalho e calcula o tamanho final
+        depois do redimensionamento para caber em `bound` (como `Image.thumbnail`).
+        """
+        try:
+            file.seek(0)
+            with Image.open(file) as img:
+                width, height = img.size
+        except (UnidentifiedImageError, OSError, ValueError):
+            return None
+        finally:
+            try:
+                file.seek(0)
+            except (OSError, ValueError):
+                pass
+
+        if bound:
+            ratio = min(bound[0] / width, bound[1] / height, 1)
+            width, height = max(1, round(width * ratio)), max(1, round(height * ratio))
+        return width, height
+
+    @staticmethod
+    def _entry(file_id, size=None, variants=None) -> dict:
+        url = AppwriteService.get_file_url(file_id)
+        width, height = size or (None, None)
+        entry_variants = {}
+        for label, variant in (variants or {}).items():
+            entry_variants[label] = {
+                'width': variant.get('width'),
+                'height': variant.get('height'),
+                **{
+                    image_format: AppwriteService.get_file_url(variant_id)
+                    for image_format, variant_id in variant.items()
+                    if image_format not in ('width', 'height') and variant_id
+                },
+            }
+        if entry_variants:
+            # o ficheiro principal é a maior variante
+            biggest = max(entry_variants.values(), key=lambda v: (v['width'] or 0) * (v['height'] or 0))
+            width, height = biggest['width'], biggest['height']
+
+        entry = {
+            'id': file_id,
+            'url': url,
+            'width': width,
+            'height': height,
+            'variants': entry_variants,
+        }
+        entry['thumbnail_url'] = MediaManifestService.variant_url(entry, 'thumb')
+        return entry
+
+    @staticmethod
+    def variant_url(entry: Optional[dict], label: str, image_format: str = 'jpeg') -> Optional[str]:
+        """
+        URL da variante `label` no formato pedido; sem ela, o ficheiro principal
+        (para WebP, None: o template usa só o JPEG)
+        """
+        if not entry:
+            return None
+        url = (entry.get('variants') or {}).get(label, {}).get(image_format)
+        if url:
+            return url
+        return entry['url'] if image_format == 'jpeg' else None
+
+    @staticmethod
+    def build(guest, sizes: Optional[dict] = None) -> dict:
+        """
+        Constrói o manifesto do convidado. `sizes` mapeia file_id -> (largura, altura);
+        dimensões já conhecidas no manifesto anterior são preservadas.
+        """
+        variants = guest.media_variants or {}
+        known = {}
+        previous = guest.media_manifest or {}
+        for entry in [previous.get('avatar')] + list(previous.get('memories') or []):
+            if entry and entry.get('width'):
+                known[entry['id']] = (entry['width'], entry['height'])
+        known.update(sizes or {})
+
+        avatar = None
+        if guest.avatar_id:
+            avatar = MediaManifestService._entry(
+                guest.avatar_id, known.get(guest.avatar_id), variants.get(guest.avatar_id)
+            )
+
+        memories = [
+            MediaManifestService._entry(memory_id, known.get(memory_id), variants.get(memory_id))
+            for memory_id in (guest.memories or [])
+            if memory_id
+        ]
+
+        return {
+            'version': MANIFEST_VERSION,
+            'storage': MediaManifestService._storage_signature(),
+            'avatar': avatar,
+            'memories': memories,
+        }
+
+    @staticmethod
+    def is_current(manifest: Optional[dict]) -> bool:
+        return bool(manifest) and manifest.get('version') == MANIFEST_VERSION
+
+    @staticmethod
+    def is_stale(manifest: Optional[dict]) -> bool:
+        """
+        Verdadeiro se o manifesto não existe, é de outra versão ou aponta
+        para outro endpoint/bucket do Appwrite
+        """
+        return (not MediaManifestService.is_current(manifest)
+                or manifest.get('storage') != MediaManifestService._storage_signature())
+
+    @staticmethod
+    def for_guest(guest) -> dict:
+        """
+        Retorna o manifesto gravado; se não existir ou for de outra versão,
+        constrói um em memória (sem gravar)
+        """
+        manifest = guest.media_manifest
+        if MediaManifestService.is_current(manifest):
+            return manifest
+        return MediaManifestService.build(guest)
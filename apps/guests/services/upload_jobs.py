@@ -0,0 +1,100 @@
+"""
+Handlers da fila de tarefas (`JobQueue`) para os uploads de mídia do convidado.
+"""
+from django.db import transaction
+
+from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.blob_index import BlobIndex
+from apps.core.services.image_derivatives import ImageDerivativeService
+from apps.guests.models import Guest
+
+
+def _upload(file, resize_to):
+    file_id = AppwriteService.upload_file(file, resize_to=resize_to)
+    if not file_id:
+        # upload_file devolve None em caso de erro: força nova tentativa
+        raise RuntimeError(f"Upload de {file.name} para o Appwrite falhou")
+    return file_id
+
+
+def _upload_with_variants(file, kind, resize_to):
+    """
+    Envia as variantes (WebP/JPEG em vários tamanhos) e retorna
+    (file_id principal, variantes). Ficheiros que não são imagens
+    seguem pelo upload simples, sem variantes.
+    """
+    data = b"".join(file.chunks())
+    variants = ImageDerivativeService.upload(data, file.name, ImageDerivativeService.sizes_for(kind))
+    if variants:
+        return ImageDerivativeService.largest(variants), variants
+    file.seek(0)
+    return _upload(file, resize_to), None
+
+
+def _store_variants(guest, file_id, variants):
+    if variants:
+        guest.media_variants = {**(guest.media_variants or {}), file_id: variants}
+
+
+def _sizes(file_id, payload):
+    size = payload.get('size')
+    return {file_id: tuple(size)} if size else None
+
+
+def upload_avatar(payload, file):
+    file_id, variants = _upload_with_variants(file, 'avatar', (500, 500))
+    with transaction.atomic():
+        guest = Guest.objects.select_for_update().filter(pk=payload['guest_id']).first()
+        if guest is None:
+            BlobIndex.release([file_id])
+            return {'file_id': file_id, 'skipped': 'guest deleted'}
+        previous = guest.avatar_id
+        guest.avatar_id = file_id
+        _store_variants(guest, file_id, variants)
+        if previous and previous != file_id:
+            # o avatar anterior perde esta referência (é apagado se ninguém mais o usar)
+            released = [previous]
+            if previous not in (guest.memories or []):
+                released = guest.blob_file_ids([previous])
+                (guest.media_variants or {}).pop(previous, None)
+            BlobIndex.release(released)
+        guest.refresh_media_manifest(_sizes(file_id, payload))
+        guest.save(update_fields=['avatar_id', 'media_variants', 'media_manifest', 'updated_at'])
+    return {'file_id': file_id}
+
+
+def _insert_memory(guest, file_id, position):
+    """
+    Insere a recordação na posição pedida no upload, antes das que vieram
+    depois dela; sem posição (tarefas antigas) vai para o fim
+    """
+    memories = list(guest.memories or [])
+    order = {memory_id: value for memory_id, value in (guest.memory_order or {}).items() if memory_id in memories}
+    index = len(memories)
+    if position is not None:
+        order[file_id] = position
+        index = next((i for i, memory_id in enumerate(memories)
+                      if memory_id in order and order[memory_id] > position), len(memories))
+    memories.insert(index, file_id)
+    guest.memories = memories
+    guest.memory_order = order
+
+
+def upload_memory(payload, file):
+    file_id, variants = _upload_with_variants(file, 'memory', (800, 800))
+    with transaction.atomic():
+        guest = Guest.objects.select_for_update().filter(pk=payload['guest_id']).first()
+        if guest is None:
+            BlobIndex.release([file_id])
+            return {'file_id': file_id, 'skipped': 'guest deleted'}
+        if file_id in (guest.memories or []):
+            # Nova tentativa de uma tarefa já gravada (ex.: o worker morreu antes
+            # de a marcar como concluída) ou o mesmo conteúdo enviado de novo:
+            # a recordação já lá está, só devolve a referência somada no upload
+            BlobIndex.release([file_id])
+            return {'file_id': file_id, 'skipped': 'already stored'}
+        _insert_memory(guest, file_id, payload.get('position'))
+        _store_variants(guest, file_id, variants)
+        guest.refresh_media_manifest(_sizes(file_id, payload))
+        guest.save(update_fields=['memories', 'memory_order', 'media_variants', 'media_manifest', 'updated_at'])
+    return {'file_id': file_id}
@@ -0,0 +1,174 @@
+import io
+from unittest import mock
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.models import BackgroundJob, MediaBlob
+from apps.core.services.blob_index import BlobIndex
+from apps.core.services.image_derivatives import ImageDerivativeService
+from apps.core.services.storage_backends import get_storage, reset_storage
+from apps.guests.management.commands import generate_media_variants
+from apps.guests.models import Guest
+from apps.guests.services.media_manifest import MANIFEST_VERSION, MediaManifestService
+from apps.guests.services.upload_jobs import upload_memory
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class MemoryOrderTests(TestCase):
+    """As recordações ficam pela ordem do upload, seja qual for a ordem das tarefas"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.guest = Guest.objects.create(first_name="Ana", memories=["antiga"])
+
+    def _finish(self, name, position):
+        file = SimpleUploadedFile(f"{name}.txt", name.encode())
+        return upload_memory({'guest_id': self.guest.pk, 'position': position}, file)['file_id']
+
+    def _contents(self):
+        self.guest.refresh_from_db()
+        storage = get_storage()
+        return [memory if memory == "antiga" else storage.read(memory).decode() for memory in self.guest.memories]
+
+    def test_jobs_finishing_in_reverse_order(self):
+        for name, position in (("c", 3), ("b", 2), ("a", 1)):
+            self._finish(name, position)
+        self.assertEqual(self._contents(), ["antiga", "a", "b", "c"])
+
+    def test_jobs_finishing_interleaved_with_a_later_batch(self):
+        self._finish("b", 2)
+        self._finish("d", 20)
+        self._finish("a", 1)
+        self._finish("c", 10)
+        self.assertEqual(self._contents(), ["antiga", "a", "b", "c", "d"])
+
+    def test_job_without_position_appends(self):
+        self._finish("a", 1)
+        upload_memory({'guest_id': self.guest.pk}, SimpleUploadedFile("z.txt", b"z"))
+        self.assertEqual(self._contents(), ["antiga", "a", "z"])
+
+    def test_retried_job_does_not_duplicate_the_memory(self):
+        # O worker morreu depois de gravar o convidado: a tarefa corre de novo
+        file_id = self._finish("a", 1)
+        self.assertEqual(self._finish("a", 1), file_id)
+        self.assertEqual(self._contents(), ["antiga", "a"])
+        self.assertEqual(MediaBlob.objects.get(file_id=file_id).ref_count, 1)
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class MediaManifestTests(TestCase):
+    """O manifesto é gravado no upload e só é reconstruído quando fica desatualizado"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.guest = Guest.objects.create(first_name="Ana")
+
+    def test_upload_stores_the_manifest_with_sizes_and_order(self):
+        first = upload_memory({'guest_id': self.guest.pk, 'position': 1, 'size': [800, 600]},
+                              SimpleUploadedFile("a.txt", b"a"))['file_id']
+        second = upload_memory({'guest_id': self.guest.pk, 'position': 2}, SimpleUploadedFile("b.txt", b"b"))['file_id']
+
+        self.guest.refresh_from_db()
+        manifest = self.guest.media_manifest
+        self.assertEqual(manifest['version'], MANIFEST_VERSION)
+        self.assertEqual([entry['id'] for entry in manifest['memories']], [first, second])
+        self.assertEqual((manifest['memories'][0]['width'], manifest['memories'][0]['height']), (800, 600))
+        self.assertFalse(MediaManifestService.is_stale(manifest))
+
+        # As dimensões já conhecidas sobrevivem a uma reconstrução
+        self.assertEqual(self.guest.refresh_media_manifest()['memories'][0]['width'], 800)
+
+    def test_stale_when_storage_or_version_changes(self):
+        manifest = self.guest.refresh_media_manifest()
+        moved = {**manifest['storage'], 'bucket': "outro"}
+        with mock.patch.object(MediaManifestService, '_storage_signature', return_value=moved):
+            self.assertTrue(MediaManifestService.is_stale(manifest))
+        self.assertTrue(MediaManifestService.is_stale({**manifest, 'version': MANIFEST_VERSION - 1}))
+        self.assertTrue(MediaManifestService.is_stale(None))
+
+    def test_for_guest_builds_an_old_manifest_in_memory_only(self):
+        self.guest.media_manifest = {'version': MANIFEST_VERSION - 1}
+        self.guest.save()
+        with self.assertNumQueries(0):
+            manifest = MediaManifestService.for_guest(self.guest)
+        self.assertEqual(manifest['version'], MANIFEST_VERSION)
+        self.guest.refresh_from_db()
+        self.assertEqual(self.guest.media_manifest, {'version': MANIFEST_VERSION - 1})
+
+    def test_image_size_reads_the_header_and_applies_the_bound(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200)).save(buffer, format='PNG')
+        self.assertEqual(MediaManifestService.image_size(buffer), (1600, 1200))
+        self.assertEqual(MediaManifestService.image_size(buffer, (800, 800)), (800, 600))
+        self.assertEqual(buffer.tell(), 0)
+        self.assertIsNone(MediaManifestService.image_size(io.BytesIO(b"texto")))
+
+
+@override_settings(STORAGE_BACKEND='memory')
+class GenerateMediaVariantsTests(TestCase):
+    """As variantes geradas pelo comando contam referências no BlobIndex e são libertadas"""
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), (10, 120, 200)).save(buffer, format='JPEG')
+        self.avatar_id = get_storage().save(buffer.getvalue(), "avatar.jpg", [])
+        self.guest = Guest.objects.create(first_name="Ana", avatar_id=self.avatar_id)
+
+    def _run(self):
+        # O comando corre _generate em threads, fora da transação do teste
+        variants = generate_media_variants._generate(self.avatar_id, 'avatar')
+        generate_media_variants.Command()._save(self.guest.pk, {self.avatar_id: variants})
+        self.guest.refresh_from_db()
+        return self.guest.media_variants[self.avatar_id]
+
+    def test_force_keeps_a_single_reference(self):
+        variants = self._run()
+        self.assertEqual(self._run(), variants)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+
+    def test_releasing_the_guest_files_deletes_the_variants(self):
+        variants = self._run()
+        released = self.guest.blob_file_ids([self.guest.avatar_id])
+        self.assertEqual(released, [self.avatar_id, ImageDerivativeService.largest(variants)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlobIndex.release(released)
+        self.assertFalse(MediaBlob.objects.exists())
+        job = BackgroundJob.objects.get(handler="apps.core.services.blob_index.delete_files")
+        self.assertNotIn(self.avatar_id, job.payload['file_ids'])
+
+
+class RebuildMediaManifestsTests(TestCase):
+    """O comando lê as variantes com os convidados, sem uma query por convidado"""
+
+    def _create(self, count):
+        variants = {'thumb': {'jpeg': "thumb", 'webp': "thumb-webp", 'width': 160, 'height': 120}}
+        Guest.objects.bulk_create([
+            Guest(first_name=f"Convidado {i}", avatar_id=f"avatar-{i}", media_variants={f"avatar-{i}": variants})
+            for i in range(count)
+        ])
+
+    def _rebuild_queries(self):
+        Guest.objects.update(media_manifest={})
+        with CaptureQueriesContext(connection) as context:
+            call_command('rebuild_media_manifests', stdout=io.StringIO())
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_guests(self):
+        self._create(1)
+        queries = self._rebuild_queries()
+        self._create(5)
+        self.assertEqual(self._rebuild_queries(), queries)
+
+        guest = Guest.objects.first()
+        self.assertIn("thumb", str(guest.media_manifest['avatar']))
+
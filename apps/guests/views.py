@@ -1,8 +1,39 @@
+from django.db import transaction
+from django.db.models import Count, Max
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.http import condition
+from apps.core.services.blob_index import BlobIndex
 from apps.guests.forms import GuestForm
 from apps.guests.models import Guest
 from django.contrib.admin.views.decorators import staff_member_required
 
+
+def _guest_detail_state(request, token):
+    """
+    Data da alteração mais recente do convidado e dos seus convites (uma única query)
+    """
+    if not hasattr(request, '_guest_detail_state'):
+        request._guest_detail_state = Guest.objects.filter(token=token).aggregate(
+            guest_updated=Max('updated_at'),
+            invites_updated=Max('invites__updated_at'),
+            invites_count=Count('invites'),
+        )
+    return request._guest_detail_state
+
+
+def _guest_detail_last_modified(request, token):
+    state = _guest_detail_state(request, token)
+    dates = [d for d in (state['guest_updated'], state['invites_updated']) if d]
+    return max(dates) if dates else None
+
+
+def _guest_detail_etag(request, token):
+    state = _guest_detail_state(request, token)
+    last_modified = _guest_detail_last_modified(request, token)
+    if last_modified is None:
+        return None
+    return f"{token}-{last_modified.timestamp()}-{state['invites_count']}"
+
 @staff_member_required
 def create_guest(request):
     if request.method == "POST":
@@ -30,7 +61,11 @@ def edit_guest(request, token):
 def delete_guest(request, pk):
     guest = get_object_or_404(Guest, pk=pk)
     if request.method == "POST":
-        guest.delete()
+        with transaction.atomic():
+            file_ids = guest.blob_file_ids([guest.avatar_id, *(guest.memories or [])])
+            guest.delete()
+            # Só apaga do Appwrite as imagens que mais nenhum convidado usa
+            BlobIndex.release(file_ids)
         return redirect("admin:guests_guest_changelist")
     return render(request, "guests/confirm_delete.html", {"guest": guest})
 
@@ -41,6 +76,7 @@ def guest_success(request, token=None):
         context["guest"] = guest
     return render(request, "guests/guest_success.html", context)
 
+@condition(etag_func=_guest_detail_etag, last_modified_func=_guest_detail_last_modified)
 def guest_detail(request, token):
     guest = get_object_or_404(Guest, token=token)
     return render(request, "guests/guest_detail.html", {"guest": guest})
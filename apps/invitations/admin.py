@@ -1,5 +1,6 @@
 from django.contrib import admin
 from apps.invitations.models import Invite
+from apps.invitations.services.token_guard import token_guard
 
 @admin.register(Invite)
 class InviteAdmin(admin.ModelAdmin):
@@ -8,3 +9,14 @@ class InviteAdmin(admin.ModelAdmin):
     search_fields = ['guest__first_name', 'guest__last_name', 'personalized_message']
     date_hierarchy = 'created_at'
     readonly_fields = ['token', 'created_at', 'interactions_count', 'response_date', 'last_access']
+
+    def changelist_view(self, request, extra_context=None):
+        # Contadores do processo que serve este pedido
+        stats = token_guard.stats()
+        self.message_user(
+            request,
+            f"Filtro de tokens: {stats['checks']} verificações, {stats['rejections']} recusas "
+            f"({stats['stale_misses']} convites criados noutro processo), "
+            f"{stats['false_positives']} falsos positivos, {stats['negative_hits']} acertos no cache negativo",
+        )
+        return super().changelist_view(request, extra_context)
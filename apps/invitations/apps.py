@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class InvitationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.invitations'
+
+    def ready(self):
+        import atexit
+
+        from apps.invitations.services.access_recorder import access_recorder
+        from apps.invitations.signals import connect_signals
+        connect_signals()
+        # Grava os acessos ainda no buffer quando o processo (worker) termina
+        atexit.register(access_recorder.shutdown)
@@ -1,4 +1,5 @@
 from django import forms
+from apps.core.services.appwrite_service import AppwriteService
 from apps.invitations.models import Invite
 from apps.guests.models import Guest
 
@@ -18,3 +19,37 @@ class InviteForm(forms.ModelForm):
             'pre_confirmation_video_url',
             'thank_you_video_url',
         ]
+
+    # Vídeos alojados no Appwrite (alternativa aos URLs externos)
+    pre_confirmation_video_file = forms.FileField(required=False)
+    thank_you_video_file = forms.FileField(required=False)
+
+    VIDEO_FIELDS = [
+        ('pre_confirmation_video_file', 'pre_confirmation_video_url'),
+        ('thank_you_video_file', 'thank_you_video_url'),
+    ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for file_field, _ in self.VIDEO_FIELDS:
+            video = cleaned_data.get(file_field)
+            if video and not (video.content_type or '').startswith('video/'):
+                self.add_error(file_field, "O ficheiro tem de ser um vídeo.")
+        return cleaned_data
+
+    def upload_videos(self, invite):
+        """
+        Envia os vídeos em partes para o Appwrite e preenche os URLs do convite.
+        Retorna False (com erro no formulário) se algum envio falhar; submeter
+        o mesmo ficheiro de novo retoma o envio onde parou.
+        """
+        for file_field, url_field in self.VIDEO_FIELDS:
+            video = self.cleaned_data.get(file_field)
+            if not video:
+                continue
+            file_id = AppwriteService.upload_large(video)
+            if not file_id:
+                self.add_error(file_field, "Falha ao enviar o vídeo. Envie-o de novo para retomar.")
+                return False
+            setattr(invite, url_field, AppwriteService.get_file_url(file_id))
+        return True
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.invitations.services.bulk_import import BulkImportError, BulkInviteImporter
+from digital_invite.settings import base
+
+
+class Command(BaseCommand):
+    help = ("Cria convidados e convites a partir de um CSV (colunas: first_name, last_name, "
+            "nickname, gender, emoji, expiration_date, personalized_message, ...) e gera os QR codes. "
+            "Escreve um relatório CSV com o token e o link de cada convite.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="Ficheiro CSV (UTF-8, separador , ou ;)")
+        parser.add_argument('--base-url', default=None,
+                            help="Domínio dos links (por omissão, INVITE_BASE_URL)")
+        parser.add_argument('--expiration-date', default=None,
+                            help="Data de expiração dos convites sem a coluna preenchida")
+        parser.add_argument('--message', default=None,
+                            help="Mensagem personalizada dos convites sem a coluna preenchida")
+        parser.add_argument('--inactive', action='store_true',
+                            help="Cria os convites inativos")
+        parser.add_argument('--report', default=None,
+                            help="Ficheiro do relatório (por omissão, a saída padrão)")
+        parser.add_argument('--no-qr', action='store_true',
+                            help="Não gera os QR codes (podem ser gerados depois com regenerate_qr_codes)")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Processos para gerar os PNG (por omissão, nº de CPUs)")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Uploads em paralelo (por omissão, UPLOAD_CONCURRENCY)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Linhas por INSERT e QR codes por lote")
+
+    def handle(self, *args, **options):
+        base_url = (options['base_url'] or getattr(base, 'INVITE_BASE_URL', '')).rstrip('/')
+        if not base_url:
+            raise CommandError("Indique o domínio com --base-url ou INVITE_BASE_URL")
+
+        started = time.perf_counter()
+        try:
+            with open(options['csv_path'], 'rb') as stream:
+                rows = BulkInviteImporter.parse_csv(stream)
+            invites = BulkInviteImporter.create(
+                rows,
+                expiration_date=options['expiration_date'],
+                personalized_message=options['message'],
+                is_active=not options['inactive'],
+                batch_size=options['batch_size'],
+            )
+        except OSError as exc:
+            raise CommandError(f"Não foi possível ler o CSV: {exc}")
+        except BulkImportError as exc:
+            for error in exc.errors:
+                self.stderr.write(error)
+            raise CommandError(f"{exc}; nenhum convite criado")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        created_in = time.perf_counter() - started
+
+        def link_for(invite):
+            return f"{base_url}{reverse('invitations:invite_detail', kwargs={'token': invite.token})}"
+
+        generated = failed = 0
+        if not options['no_qr']:
+            generated, failed = BulkInviteImporter.generate_qr_codes(
+                [(invite, link_for(invite)) for invite in invites],
+                processes=options['processes'],
+                concurrency=options['concurrency'],
+                batch_size=options['batch_size'],
+            )
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as report:
+                BulkInviteImporter.write_report(invites, link_for, report)
+        else:
+            BulkInviteImporter.write_report(invites, link_for, self.stdout)
+
+        self.stderr.write(self.style.SUCCESS(
+            f"{len(invites)} convites criados em {created_in:.2f}s, {generated} QR codes gerados, "
+            f"{failed} falhas (total {time.perf_counter() - started:.2f}s)"
+        ))
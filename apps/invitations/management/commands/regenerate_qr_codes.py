@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.invitations.models import Invite
+from apps.invitations.services.qr_service import QRCodeService
+from digital_invite.settings import base
+
+
+class Command(BaseCommand):
+    help = ("Regenera os QR codes de um conjunto de convites (ex.: depois de mudar de domínio). "
+            "Convites cujo QR code já aponta para o link certo são ignorados.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=None,
+                            help="Domínio dos links (por omissão, INVITE_BASE_URL)")
+        parser.add_argument('--token', action='append', dest='tokens',
+                            help="Limita a um convite (pode repetir)")
+        parser.add_argument('--guest', type=int, action='append', dest='guest_ids',
+                            help="Limita aos convites de um convidado (pode repetir)")
+        parser.add_argument('--status', choices=['pending', 'accepted', 'declined'],
+                            help="Limita a um estado do convite")
+        parser.add_argument('--active-only', action='store_true',
+                            help="Ignora convites inativos")
+        parser.add_argument('--missing-only', action='store_true',
+                            help="Só convites sem QR code")
+        parser.add_argument('--force', action='store_true',
+                            help="Regenera mesmo os QR codes que já estão atualizados")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Processos para gerar os PNG (por omissão, nº de CPUs)")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Uploads em paralelo (por omissão, UPLOAD_CONCURRENCY)")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Convites gerados e enviados por lote")
+
+    def handle(self, *args, **options):
+        base_url = (options['base_url'] or getattr(base, 'INVITE_BASE_URL', '')).rstrip('/')
+        if not base_url:
+            raise CommandError("Indique o domínio com --base-url ou INVITE_BASE_URL")
+
+        invites = Invite.objects.only('id', 'token', 'qr_code_id', 'qr_code_link').order_by('pk')
+        if options['tokens']:
+            invites = invites.filter(token__in=options['tokens'])
+        if options['guest_ids']:
+            invites = invites.filter(guest_id__in=options['guest_ids'])
+        if options['status']:
+            invites = invites.filter(invitation_status=options['status'])
+        if options['active_only']:
+            invites = invites.filter(is_active=True)
+        if options['missing_only']:
+            invites = invites.filter(qr_code_id__isnull=True)
+
+        pending, skipped = [], 0
+        for invite in invites.iterator():
+            # Mesmo link que views.invite_link codifica nos QR codes servidos a pedido
+            link = f"{base_url}{reverse('invitations:invite_detail', kwargs={'token': invite.token})}"
+            if not options['force'] and invite.qr_code_id and invite.qr_code_link == link:
+                skipped += 1
+                continue
+            pending.append((invite, link))
+
+        if not pending:
+            self.stdout.write(f"Nenhum QR code a regenerar ({skipped} já atualizados)")
+            return
+
+        batch_size = max(1, options['batch_size'])
+        updated, failed = 0, 0
+        results = QRCodeService.generate_many(
+            pending,
+            processes=options['processes'],
+            concurrency=options['concurrency'],
+            batch_size=batch_size,
+        )
+        for done, (invite, link, qr_code_id, error) in enumerate(results, start=1):
+            if error is not None:
+                failed += 1
+                self.stderr.write(f"Falha no convite {invite.token}: {error}")
+            else:
+                QRCodeService.assign(invite, qr_code_id, link)
+                updated += 1
+            if done % batch_size == 0 or done == len(pending):
+                self.stdout.write(f"{done}/{len(pending)} convites processados")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} QR codes regenerados, {skipped} já atualizados, {failed} falhas"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invitations', '0002_invite_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invite',
+            name='qr_code_link',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+    ]
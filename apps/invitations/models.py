@@ -20,9 +20,13 @@ class Invite(models.Model):
     is_active = models.BooleanField(default=True)
     # modelanaia para criarr evento
     created_at = models.DateTimeField(auto_now_add=True)
+    # Não é atualizado pelo registo de acessos (feito com queryset.update)
+    updated_at = models.DateTimeField(auto_now=True)
 
     # QR code também como ID do Appwrite(que devera ser gerado automticamente, logo nao deve aparecer no form)
     qr_code_id = models.CharField(max_length=100, blank=True, null=True)  # ID do arquivo no Appwrite
+    # Link codificado no QR code atual (permite regenerar só os desatualizados)
+    qr_code_link = models.URLField(max_length=500, blank=True, null=True)
 
     # Status e interações
     invitation_status = models.CharField(max_length=20, choices=[('pending', 'Pendente'), ('accepted', 'Aceito'),
@@ -38,14 +42,8 @@ class Invite(models.Model):
     decline_reason = models.TextField(blank=True, null=True)
 
     def accept_invitation(self):
-        from apps.gamification.models import Gamification  # importação local
-        self.invitation_status = 'accepted'
-        self.response_date = timezone.now()
-        self.save()
-        gamification, created = Gamification.objects.get_or_create(invite=self)
-        if created:
-            gamification.add_badge("first_acceptance")
-            gamification.add_points(10)
+        from apps.invitations.services.invite_service import InviteService  # importação local
+        InviteService.process_rsvp_response(self, 'accepted')
 
     # Property renomeada
     @property
@@ -0,0 +1,179 @@
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class AccessRecorder:
+    """
+    Buffer de escrita (write-behind) para os contadores de acesso dos convites.
+
+    Os acessos são acumulados em memória por processo e gravados em lote,
+    quando o buffer atinge `flush_threshold` convites ou a cada
+    `flush_interval` segundos. A gravação usa incrementos atómicos com F(),
+    por isso vários workers não sobrescrevem as contagens uns dos outros.
+
+    Cada acesso fica associado à base de dados em que foi registado (alias e
+    nome); um lote cuja base de dados já não é a da ligação (ex.: a base de
+    testes depois de destruída) é descartado em vez de ir parar a outra.
+    O flush final do processo é registado em `InvitationsConfig.ready`.
+    """
+
+    def __init__(self, flush_interval=5.0, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # (alias, nome da base de dados) -> {invite_id: [incremento, último acesso]}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_written = 0
+
+    @staticmethod
+    def _database(using=None):
+        alias = using or DEFAULT_DB_ALIAS
+        return alias, connections[alias].settings_dict['NAME']
+
+    def record(self, invite_id, when=None, using=None):
+        """
+        Regista um acesso ao convite `invite_id` no buffer.
+        """
+        if self._add(invite_id, when, using):
+            self.flush()
+
+    async def arecord(self, invite_id, when=None, using=None):
+        """
+        Versão assíncrona de `record`: o flush por limite corre numa thread.
+        """
+        if self._add(invite_id, when, using):
+            await sync_to_async(self.flush)()
+
+    def _add(self, invite_id, when=None, using=None):
+        """
+        Acumula o acesso; retorna True quando o buffer atingiu o limite.
+        """
+        when = when or timezone.now()
+        database = self._database(using)
+        with self._lock:
+            pending = self._pending.setdefault(database, {})
+            entry = pending.get(invite_id)
+            if entry is None:
+                pending[invite_id] = [1, when]
+            else:
+                entry[0] += 1
+                if when > entry[1]:
+                    entry[1] = when
+            should_flush = sum(len(batch) for batch in self._pending.values()) >= self.flush_threshold
+        self._ensure_timer()
+        return should_flush
+
+    def flush(self):
+        """
+        Grava os incrementos pendentes, numa transação por base de dados.
+        Retorna o número de linhas atualizadas.
+        """
+        from apps.invitations.models import Invite  # importação local
+
+        with self._flush_lock:
+            with self._lock:
+                batches, self._pending = self._pending, {}
+            if not batches:
+                return 0
+
+            written = 0
+            for (alias, name), batch in batches.items():
+                if alias not in connections or connections[alias].settings_dict['NAME'] != name:
+                    logger.warning(f"Base de dados {alias} ({name}) já não está ligada; "
+                                   f"{len(batch)} acessos descartados")
+                    continue
+                try:
+                    with transaction.atomic(using=alias):
+                        for invite_id, (count, last_access) in batch.items():
+                            # Greatest: outro processo pode já ter gravado um acesso mais recente
+                            written += Invite.objects.using(alias).filter(pk=invite_id).update(
+                                interactions_count=F('interactions_count') + count,
+                                last_access=Greatest(Coalesce('last_access', Value(last_access)), Value(last_access)),
+                            )
+                except Exception as e:
+                    logger.warning(f"Erro ao gravar acessos de {len(batch)} convites: {e}")
+                    self._requeue((alias, name), batch)
+                    continue
+                self.flushes += 1
+
+            self.rows_written += written
+            return written
+
+    def _requeue(self, database, batch):
+        with self._lock:
+            pending = self._pending.setdefault(database, {})
+            for invite_id, (count, last_access) in batch.items():
+                entry = pending.get(invite_id)
+                if entry is None:
+                    pending[invite_id] = [count, last_access]
+                else:
+                    entry[0] += count
+                    entry[1] = max(entry[1], last_access)
+
+    def stats(self):
+        """
+        Estatísticas do buffer para monitorização.
+        """
+        with self._lock:
+            entries = [entry for batch in self._pending.values() for entry in batch.values()]
+        return {
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'pending_invites': len(entries),
+            'pending_accesses': sum(count for count, _ in entries),
+        }
+
+    def _ensure_timer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="invite-access-recorder", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                # A thread de flush tem a sua própria ligação à base de dados
+                close_old_connections()
+
+    def shutdown(self):
+        """
+        Para a thread de flush e grava o que estiver pendente.
+        """
+        self._stop.set()
+        self.flush()
+
+    def discard(self):
+        """
+        Para a thread de flush e descarta o que estiver pendente (ex.: antes
+        de destruir a base de dados de testes)
+        """
+        self._stop.set()
+        with self._lock:
+            self._pending = {}
+
+
+access_recorder = AccessRecorder(
+    flush_interval=getattr(settings, 'INVITE_ACCESS_FLUSH_INTERVAL', 5.0),
+    flush_threshold=getattr(settings, 'INVITE_ACCESS_FLUSH_THRESHOLD', 100),
+)
@@ -0,0 +1,172 @@
+import csv
+import io
+import logging
+from datetime import datetime, time
+from typing import Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.guests.models import Guest
+from apps.invitations.models import Invite
+from apps.invitations.services.qr_service import QRCodeService
+
+logger = logging.getLogger(__name__)
+
+GUEST_COLUMNS = ('first_name', 'last_name', 'nickname', 'gender', 'emoji',
+                 'favorite_dish', 'favorite_drink', 'dietary_restrictions', 'music_suggestion')
+REPORT_COLUMNS = ('first_name', 'last_name', 'guest_token', 'token', 'link', 'qr_code_id')
+
+
+class BulkImportError(ValueError):
+    """CSV inválido; `errors` tem as mensagens por linha"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} erros no CSV")
+        self.errors = errors
+
+
+class BulkInviteImporter:
+    """
+    Criação de convidados e convites em lote a partir de um CSV (uma linha por
+    convidado). As colunas do convite (`expiration_date`, `personalized_message`, ...)
+    sobrepõem-se às opções comuns passadas a `create`.
+
+    Convidados e convites são criados com `bulk_create` numa única transação;
+    os QR codes são gerados depois, em paralelo (QRCodeService.generate_many).
+    """
+
+    @staticmethod
+    def _parse_expiration(value) -> Optional[datetime]:
+        if value in (None, ''):
+            return None
+        if isinstance(value, datetime):
+            parsed = value
+        elif parse_date(value) is not None:
+            # Só a data: o convite vale até ao fim desse dia
+            parsed = datetime.combine(parse_date(value), time(23, 59, 59))
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(f"data inválida: {value!r}")
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    @staticmethod
+    def parse_csv(stream) -> List[dict]:
+        """
+        Lê o CSV (ficheiro de texto ou binário, UTF-8, separador `,` ou `;`).
+        Levanta BulkImportError com todos os erros encontrados.
+        """
+        if isinstance(stream, (bytes, bytearray)):
+            stream = io.BytesIO(stream)
+        if not isinstance(stream, io.TextIOBase):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        # Excel em português exporta com `;`: decide pelo cabeçalho
+        header = stream.readline()
+        stream.seek(0)
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        reader = csv.DictReader(stream, delimiter=delimiter)
+
+        if 'first_name' not in (reader.fieldnames or []):
+            raise BulkImportError(["Falta a coluna obrigatória 'first_name'"])
+
+        rows, errors = [], []
+        for line, raw in enumerate(reader, start=2):
+            row = {key.strip(): (value or '').strip() for key, value in raw.items() if key}
+            if not row['first_name']:
+                errors.append(f"Linha {line}: 'first_name' vazio")
+                continue
+            if row.get('gender') and row['gender'].upper() not in ('M', 'F'):
+                errors.append(f"Linha {line}: 'gender' tem de ser M ou F")
+                continue
+            try:
+                row['expiration_date'] = BulkInviteImporter._parse_expiration(row.get('expiration_date'))
+            except ValueError as exc:
+                errors.append(f"Linha {line}: {exc}")
+                continue
+            rows.append(row)
+
+        if errors:
+            raise BulkImportError(errors)
+        return rows
+
+    @staticmethod
+    def create(rows: Iterable[dict], expiration_date=None, personalized_message: Optional[str] = None,
+               is_active: bool = True, batch_size: int = 500) -> List[Invite]:
+        """
+        Cria um convidado e um convite por linha. Tudo ou nada: um erro a meio
+        desfaz a importação inteira.
+        """
+        expiration_date = BulkInviteImporter._parse_expiration(expiration_date)
+        guests, invites = [], []
+        for row in rows:
+            guest = Guest(**{field: row.get(field) or None for field in GUEST_COLUMNS})
+            guest.first_name = row['first_name']
+            if guest.gender:
+                guest.gender = guest.gender.upper()
+            guests.append(guest)
+            invites.append(Invite(
+                guest=guest,
+                is_active=is_active,
+                expiration_date=row.get('expiration_date') or expiration_date,
+                personalized_message=row.get('personalized_message') or personalized_message,
+                pre_confirmation_video_url=row.get('pre_confirmation_video_url') or None,
+                thank_you_video_url=row.get('thank_you_video_url') or None,
+            ))
+
+        with transaction.atomic():
+            Guest.objects.bulk_create(guests, batch_size=batch_size)
+            for invite in invites:
+                invite.guest_id = invite.guest.pk  # pk atribuída pelo bulk_create
+            Invite.objects.bulk_create(invites, batch_size=batch_size)
+
+            # bulk_create não dispara post_save: avisa o filtro de tokens diretamente
+            from apps.invitations.services.token_guard import token_guard  # importação local
+            tokens = [invite.token for invite in invites]
+            transaction.on_commit(lambda: token_guard.tokens_added(tokens))
+
+        logger.info(f"Importação em lote: {len(invites)} convidados e convites criados")
+        return invites
+
+    @staticmethod
+    def generate_qr_codes(items: Iterable[Tuple[Invite, str]], processes: Optional[int] = None,
+                          concurrency: Optional[int] = None, batch_size: int = 500) -> Tuple[int, int]:
+        """
+        Gera os QR codes de (convite, link) em paralelo e grava-os com
+        `bulk_update`. Retorna (gerados, falhas).
+        """
+        from apps.invitations.signals import invalidate_invite  # importação local
+
+        done, failed = [], 0
+        for invite, link, qr_code_id, error in QRCodeService.generate_many(
+                items, processes=processes, concurrency=concurrency, batch_size=batch_size):
+            if error is not None:
+                failed += 1
+                logger.error(f"Falha no QR code do convite {invite.token}: {error}")
+                continue
+            invite.qr_code_id = qr_code_id
+            invite.qr_code_link = link
+            invite.updated_at = timezone.now()
+            done.append(invite)
+
+        Invite.objects.bulk_update(done, ['qr_code_id', 'qr_code_link', 'updated_at'], batch_size=batch_size)
+        # bulk_update não dispara post_save: invalida as páginas em cache
+        for invite in done:
+            invalidate_invite(invite.token)
+        return len(done), failed
+
+    @staticmethod
+    def write_report(invites: Iterable[Invite], link_for, stream) -> None:
+        """CSV com o token e o link de cada convite criado"""
+        writer = csv.writer(stream)
+        writer.writerow(REPORT_COLUMNS)
+        for invite in invites:
+            writer.writerow([
+                invite.guest.first_name,
+                invite.guest.last_name or '',
+                invite.guest.token,
+                invite.token,
+                link_for(invite),
+                invite.qr_code_id or '',
+            ])
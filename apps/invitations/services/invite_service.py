@@ -1,74 +1,156 @@
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from django.shortcuts import get_object_or_404
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
 from apps.invitations.models import Invite
-from apps.core.services.appwrite_service import AppwriteService
+from apps.guests.services.media_manifest import MediaManifestService
+from apps.invitations.services.access_recorder import access_recorder
+from apps.invitations.services.snapshot import InviteSnapshot
+from apps.invitations.services.token_guard import token_guard
+from apps.core.services.single_flight import SingleFlightCache
+from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Cache dos convites com proteção contra stampede (ver SingleFlightCache)
+invite_cache = SingleFlightCache(
+    use_lock=getattr(settings, 'INVITE_CACHE_CROSS_PROCESS_LOCK', False),
+    beta=getattr(settings, 'INVITE_CACHE_EARLY_REFRESH_BETA', 1.0),
+)
+
 class InviteService:
     """
     Serviço para gerenciar lógica de negócio dos convites
     """
     
     @staticmethod
-    def get_invite_with_cache(token, request_ip=None):
+    def get_invite_with_cache(token, request_ip=None, record_access=True):
         """
-        Busca convite com cache e registra acesso
+        Busca convite com cache, registra acesso (exceto com `record_access=False`,
+        ex.: o QR code) e valida-o.
+        Retorna um InviteSnapshot (convite, convidado e mídia numa única query).
+        Levanta Http404 para tokens desconhecidos e PermissionDenied para
+        convites inativos ou expirados, usando o cache negativo quando possível.
         """
-        cache_key = f"invite_{token}"
-        invite = cache.get(cache_key)
-        
-        if not invite:
-            invite = get_object_or_404(Invite, token=token, is_active=True)
-            # Cache por 15 minutos
-            cache.set(cache_key, invite, 900)
+        InviteService._check_denied(token, token_guard.get_denial(token))
+        if not token_guard.might_exist(token):
+            raise Http404("Convite não encontrado")
+
+        def load():
+            invite = Invite.objects.select_related('guest', 'gamification').filter(token=token).first()
+            if invite is None or not invite.is_active:
+                token_guard.remember_missing(token, exists=invite is not None)
+                raise Http404("Convite não encontrado")
+            return InviteSnapshot.from_invite(invite)
+
+        # Cache por 15 minutos; só um pedido por processo recalcula cada convite
+        invite = invite_cache.get_or_load(f"invite_{token}", load, 900)
         
         # Registra acesso (sem cache para estatísticas precisas)
-        InviteService._register_access(invite, request_ip)
+        if record_access:
+            InviteService._register_access(invite, request_ip)
+
+        is_valid, error_message = InviteService.validate_invite_access(invite)
+        if not is_valid:
+            token_guard.remember_denial(token, error_message)
+            raise PermissionDenied(error_message)
         
         return invite
+
+    @staticmethod
+    async def aget_invite_with_cache(token, request_ip=None):
+        """
+        Versão assíncrona de `get_invite_with_cache` (ORM e cache assíncronos)
+        """
+        InviteService._check_denied(token, await token_guard.aget_denial(token))
+        if not await token_guard.amight_exist(token):
+            raise Http404("Convite não encontrado")
+
+        async def load():
+            invite = await Invite.objects.select_related('guest', 'gamification').filter(token=token).afirst()
+            if invite is None or not invite.is_active:
+                await token_guard.aremember_missing(token, exists=invite is not None)
+                raise Http404("Convite não encontrado")
+            return InviteSnapshot.from_invite(invite)
+
+        invite = await invite_cache.aget_or_load(f"invite_{token}", load, 900)
+
+        await InviteService._aregister_access(invite, request_ip)
+
+        is_valid, error_message = InviteService.validate_invite_access(invite)
+        if not is_valid:
+            await token_guard.aremember_denial(token, error_message)
+            raise PermissionDenied(error_message)
+
+        return invite
+
+    @staticmethod
+    def _check_denied(token, reason):
+        """
+        Levanta a exceção correspondente a uma recusa guardada no cache negativo
+        """
+        if reason is None:
+            return
+        if reason == token_guard.MISSING:
+            raise Http404("Convite não encontrado")
+        raise PermissionDenied(reason)
     
     @staticmethod
     def _register_access(invite, request_ip=None):
         """
-        Registra acesso ao convite
+        Registra acesso ao convite no buffer de escrita; a gravação na base
+        de dados é feita em lote pelo `access_recorder`
         """
         try:
-            invite.last_access = timezone.now()
-            invite.interactions_count += 1
-            invite.save(update_fields=['last_access', 'interactions_count'])
+            access_recorder.record(invite.pk)
+        except Exception as e:
+            logger.warning(f"Erro ao registrar acesso para convite {invite.token}: {e}")
+
+    @staticmethod
+    async def _aregister_access(invite, request_ip=None):
+        try:
+            await access_recorder.arecord(invite.pk)
         except Exception as e:
             logger.warning(f"Erro ao registrar acesso para convite {invite.token}: {e}")
     
+    @staticmethod
+    def _media_item(entry):
+        variant_url = MediaManifestService.variant_url
+        return {
+            'url': entry['url'],
+            'width': entry['width'],
+            'height': entry['height'],
+            'thumb': variant_url(entry, 'thumb'),
+            'thumb_webp': variant_url(entry, 'thumb', 'webp'),
+            'medium': variant_url(entry, 'medium'),
+            'medium_webp': variant_url(entry, 'medium', 'webp'),
+            'full': variant_url(entry, 'full'),
+            'full_webp': variant_url(entry, 'full', 'webp'),
+        }
+
     @staticmethod
     def get_optimized_media_urls(guest):
         """
-        Retorna URLs otimizadas das mídias do convidado
+        Retorna URLs otimizadas das mídias do convidado a partir do manifesto
+        pré-calculado: `memories` traz, por recordação, as variantes thumb/medium/full
+        em JPEG e WebP. Sem recordações, usa o avatar como slide único.
         """
-        media_data = {
-            'avatar_url': None,
-            'memories_urls': [],
-            'memories_thumbnails': []
+        manifest = MediaManifestService.for_guest(guest)
+        avatar = manifest['avatar']
+        memories = [InviteService._media_item(memory) for memory in manifest['memories']]
+        if not memories and avatar:
+            memories = [InviteService._media_item(avatar)]
+
+        return {
+            'avatar_url': avatar['url'] if avatar else None,
+            'avatar': InviteService._media_item(avatar) if avatar else None,
+            'memories': memories,
+            'memories_urls': [memory['full'] for memory in memories],
+            'memories_thumbnails': [memory['thumb'] for memory in memories],
         }
-        
-        # Avatar otimizado
-        if guest.avatar_id:
-            media_data['avatar_url'] = AppwriteService.get_file_url(guest.avatar_id)
-        
-        # Memórias com thumbnails
-        if guest.memories:
-            for memory_id in guest.memories:
-                full_url = AppwriteService.get_file_url(memory_id)
-                if full_url:
-                    media_data['memories_urls'].append(full_url)
-                    # Para thumbnails, você pode implementar redimensionamento no Appwrite
-                    # ou usar parâmetros de query para otimização
-                    thumbnail_url = f"{full_url}&width=300&height=300&quality=80"
-                    media_data['memories_thumbnails'].append(thumbnail_url)
-        
-        return media_data
     
     @staticmethod
     def validate_invite_access(invite):
@@ -86,25 +168,41 @@ class InviteService:
     @staticmethod
     def process_rsvp_response(invite, status, decline_reason=None):
         """
-        Processa resposta RSVP do convidado
+        Processa resposta RSVP do convidado numa única transação: um UPDATE
+        condicional do convite e, na primeira aceitação, o badge e os pontos
+        iniciais na Gamification (com os eventos como registo).
+        Repetir a mesma resposta não escreve nada.
         """
+        from apps.gamification.models import Gamification  # importação local
+        from apps.invitations.signals import invalidate_invite  # importação local
+
         if status not in ['accepted', 'declined']:
             return False, "Status inválido"
-        
-        invite.invitation_status = status
-        invite.response_date = timezone.now()
-        
+
+        now = timezone.now()
+        fields = {'invitation_status': status, 'response_date': now, 'updated_at': now}
+        unchanged = Q(invitation_status=status)
         if status == 'declined' and decline_reason:
-            invite.decline_reason = decline_reason
-        
-        invite.save()
-        
-        # Processa gamificação se aceito
-        if status == 'accepted':
-            invite.accept_invitation()
-        
-        # Limpa cache
-        cache_key = f"invite_{invite.token}"
-        cache.delete(cache_key)
-        
-        return True, "Resposta processada com sucesso"
\ No newline at end of file
+            fields['decline_reason'] = decline_reason
+            unchanged &= Q(decline_reason=decline_reason)
+
+        with transaction.atomic():
+            changed = Invite.objects.filter(pk=invite.pk).exclude(unchanged).update(**fields)
+            if changed and status == 'accepted':
+                Gamification.record_acceptance(invite.pk)
+            if changed:
+                # update() não dispara post_save: invalida o cache do convite e da página
+                transaction.on_commit(lambda: invalidate_invite(invite.token))
+
+        if changed:
+            for field, value in fields.items():
+                setattr(invite, field, value)
+
+        return True, "Resposta processada com sucesso"
+
+    @staticmethod
+    async def aprocess_rsvp_response(invite, status, decline_reason=None):
+        """
+        Versão assíncrona de `process_rsvp_response`
+        """
+        return await sync_to_async(InviteService.process_rsvp_response)(invite, status, decline_reason)
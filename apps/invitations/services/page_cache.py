@@ -0,0 +1,111 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.middleware.csrf import get_token
+
+
+class InvitePageCache:
+    """
+    Cache do HTML renderizado da página do convite, indexado pelo token e
+    por uma versão de conteúdo. A versão muda sempre que o Invite, o Guest ou
+    a Gamification associados são gravados ou apagados (ver `signals.py`),
+    pelo que as páginas antigas deixam simplesmente de ser lidas.
+
+    Com um cache local ao processo (LocMemCache) a nova versão só chega ao
+    worker que gravou; nos outros a página antiga é servida até expirar, por
+    isso o TTL fica limitado a `LOCAL_CACHE_MAX_TIMEOUT`. Com um cache
+    partilhado (ex.: Redis) vale `INVITE_PAGE_CACHE_TIMEOUT`.
+    """
+
+    LOCAL_CACHE_MAX_TIMEOUT = 900
+
+    # O token CSRF é por utilizador: a página é guardada com este marcador
+    # e o token real é inserido em cada resposta.
+    CSRF_PLACEHOLDER = "__INVITE_PAGE_CSRF_TOKEN__"
+
+    @staticmethod
+    def _version_key(token):
+        return f"invite_version_{token}"
+
+    @staticmethod
+    def _page_key(token, version):
+        return f"invite_page_{token}_{version}"
+
+    @staticmethod
+    def get_version(token):
+        """
+        Retorna a versão atual do conteúdo do convite, criando-a se necessário
+        """
+        key = InvitePageCache._version_key(token)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        return version
+
+    @staticmethod
+    async def aget_version(token):
+        key = InvitePageCache._version_key(token)
+        version = await cache.aget(key)
+        if version is None:
+            await cache.aadd(key, uuid.uuid4().hex, None)
+            version = await cache.aget(key)
+        return version
+
+    @staticmethod
+    def bump_version(token):
+        """
+        Invalida todas as páginas em cache do convite
+        """
+        cache.set(InvitePageCache._version_key(token), uuid.uuid4().hex, None)
+
+    @staticmethod
+    def get(token):
+        """
+        Retorna (versão, html); html é None quando não há página em cache
+        """
+        version = InvitePageCache.get_version(token)
+        return version, cache.get(InvitePageCache._page_key(token, version))
+
+    @staticmethod
+    async def aget(token):
+        version = await InvitePageCache.aget_version(token)
+        return version, await cache.aget(InvitePageCache._page_key(token, version))
+
+    @staticmethod
+    def timeout():
+        """
+        TTL das páginas em cache, limitado quando o cache é local ao processo
+        """
+        timeout = getattr(settings, 'INVITE_PAGE_CACHE_TIMEOUT', 900)
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+            return min(timeout, InvitePageCache.LOCAL_CACHE_MAX_TIMEOUT)
+        return timeout
+
+    @staticmethod
+    def set(token, version, html):
+        cache.set(InvitePageCache._page_key(token, version), html, InvitePageCache.timeout())
+
+    @staticmethod
+    async def aset(token, version, html):
+        await cache.aset(InvitePageCache._page_key(token, version), html, InvitePageCache.timeout())
+
+    @staticmethod
+    def etag(last_modified):
+        """
+        ETag fraco da página, da data de alteração na base de dados (igual em
+        todos os processos, ao contrário da versão no cache local). Fraco
+        porque o corpo leva um token CSRF novo em cada resposta.
+        """
+        return f'W/"{int(last_modified.timestamp() * 1_000_000):x}"'
+
+    @staticmethod
+    def restore_csrf(html, request):
+        """
+        Substitui o marcador pelo token CSRF do pedido atual
+        """
+        if InvitePageCache.CSRF_PLACEHOLDER not in html:
+            return html
+        return html.replace(InvitePageCache.CSRF_PLACEHOLDER, get_token(request))
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+from apps.invitations.services.qr_service import QRCodeService
+
+logger = logging.getLogger(__name__)
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class QRCodeCache:
+    """
+    QR codes gerados a pedido (ver a view `invite_qr_code`), guardados em dois níveis:
+
+    - memória do processo, LRU limitado a `memory_bytes`;
+    - disco (`directory`), partilhado pelos processos e limitado a `disk_bytes`:
+      quando passa o limite, apaga os ficheiros lidos há mais tempo.
+
+    A chave é o hash do link e do formato, por isso o mesmo conteúdo tem sempre
+    a mesma chave (e o mesmo ETag) e nunca precisa de ser invalidado.
+    """
+
+    def __init__(self, directory, memory_bytes=8 * 1024 * 1024, disk_bytes=200 * 1024 * 1024):
+        self.directory = str(directory)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(link: str, fmt: str) -> str:
+        return hashlib.sha256(f"{fmt}:{link}".encode()).hexdigest()[:32]
+
+    @staticmethod
+    def render(link: str, fmt: str) -> bytes:
+        if fmt == 'svg':
+            return QRCodeService.render_svg(link).encode()
+        return QRCodeService.render_png(link)
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    # ------------------------
+    # Memória
+    # ------------------------
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    # ------------------------
+    # Disco
+    # ------------------------
+    def _read_disk(self, key: str, fmt: str) -> Optional[bytes]:
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # conta como acesso recente para a remoção
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key: str, fmt: str, data: bytes):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = f"{self._path(key, fmt)}.{uuid.uuid4().hex}.tmp"
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, self._path(key, fmt))
+        except OSError as exc:
+            logger.warning(f"Não foi possível gravar o QR code {key} em disco: {exc}")
+            return
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan()[1]
+            else:
+                self._disk_size += len(data)
+            over = self._disk_size > self.disk_bytes
+        if over:
+            self.evict()
+
+    def _scan(self):
+        entries, total = [], 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except FileNotFoundError:
+            pass
+        return entries, total
+
+    def evict(self):
+        """
+        Apaga os ficheiros menos usados até o disco ficar em 90% do limite
+        """
+        entries, total = self._scan()
+        target = self.disk_bytes * 0.9
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_size = total
+        if removed:
+            logger.info(f"Cache de QR codes: {removed} ficheiros removidos do disco")
+
+    # ------------------------
+    # API
+    # ------------------------
+    def cached(self, link: str, fmt: str) -> bool:
+        """Se o QR code já está em memória ou em disco (sem o ler)"""
+        key = self.key(link, fmt)
+        return key in self._memory or os.path.exists(self._path(key, fmt))
+
+    def get_or_render(self, link: str, fmt: str) -> Tuple[str, bytes]:
+        """
+        Retorna (chave, bytes) do QR code, gerando-o se não estiver em cache
+        """
+        key = self.key(link, fmt)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return key, data
+
+        data = self._read_disk(key, fmt)
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            data = self.render(link, fmt)
+            self._write_disk(key, fmt, data)
+        self._remember(key, data)
+        return key, data
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._disk_size = None
+        for _, _, path in self._scan()[0]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_items': len(self._memory),
+            'memory_bytes': self._memory_size,
+            'disk_bytes': self._disk_size,
+        }
+
+
+qr_cache = QRCodeCache(
+    directory=getattr(settings, 'QR_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'qr_cache')),
+    memory_bytes=getattr(settings, 'QR_CACHE_MEMORY_BYTES', 8 * 1024 * 1024),
+    disk_bytes=getattr(settings, 'QR_CACHE_DISK_BYTES', 200 * 1024 * 1024),
+)
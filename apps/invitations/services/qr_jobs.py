@@ -0,0 +1,21 @@
+"""
+Handlers da fila de tarefas (`JobQueue`) para os QR codes dos convites.
+"""
+from apps.invitations.models import Invite
+from apps.invitations.services.qr_service import QRCodeService
+
+
+def generate_qr_code(payload, file):
+    invite = Invite.objects.filter(pk=payload['invite_id']).first()
+    if invite is None:
+        return {'skipped': 'invite deleted'}
+    if invite.qr_code_id and invite.qr_code_link == payload['link']:
+        return {'file_id': invite.qr_code_id, 'skipped': 'up to date'}
+
+    qr_code_id = QRCodeService.generate_and_upload(payload['link'], invite.token)
+    if not qr_code_id:
+        raise RuntimeError(f"Upload do QR code do convite {invite.token} falhou")
+
+    QRCodeService.assign(invite, qr_code_id, payload['link'])
+    return {'file_id': qr_code_id}
+
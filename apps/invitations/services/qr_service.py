@@ -0,0 +1,163 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from io import BytesIO
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import qrcode
+from PIL import Image
+from qrcode.main import QRCode
+
+from apps.core.services.appwrite_service import AppwriteService
+from digital_invite.settings import base
+
+logger = logging.getLogger(__name__)
+
+# Mesmos parâmetros usados desde o início nos convites impressos
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_H
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+# Tamanho por omissão (px) dos QR codes vetoriais e SVGs distintos guardados em cache
+QR_SVG_SIZE = 200
+QR_SVG_CACHE_SIZE = 1024
+
+
+def _svg_path(matrix) -> str:
+    """
+    Caminho SVG único com os módulos escuros: cada sequência horizontal de
+    módulos vira um retângulo `M x y h n v1 h -n z` (coordenadas em módulos)
+    """
+    parts = []
+    for y, row in enumerate(matrix):
+        x, width = 0, len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            run = x - start
+            parts.append(f"M{start} {y}h{run}v1h-{run}z")
+    return "".join(parts)
+
+
+@lru_cache(maxsize=QR_SVG_CACHE_SIZE)
+def _render_svg(link: str, size: int, border: int, fill: str, background: Optional[str]) -> str:
+    matrix = QRCodeService.matrix(link, border=border)
+    modules = len(matrix)
+    background_rect = f'<rect width="100%" height="100%" fill="{background}"/>' if background else ''
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {modules} {modules}" '
+        f'width="{size}" height="{size}" shape-rendering="crispEdges">'
+        f'{background_rect}<path fill="{fill}" d="{_svg_path(matrix)}"/></svg>'
+    )
+
+
+class QRCodeService:
+    """
+    Geração dos QR codes dos convites em memória (sem ficheiros temporários)
+    e upload para o storage.
+    """
+
+    @staticmethod
+    def matrix(link: str, border: int = QR_BORDER) -> List[List[bool]]:
+        """Matriz de módulos do QR code, já com a margem"""
+        qr = QRCode(version=1, error_correction=QR_ERROR_CORRECTION, border=border)
+        qr.add_data(link)
+        qr.make(fit=True)
+        return qr.get_matrix()
+
+    @staticmethod
+    def render_png(link: str, box_size: int = QR_BOX_SIZE) -> bytes:
+        """
+        PNG preto e branco do QR code. Desenha um píxel por módulo e amplia com
+        NEAREST, em vez de pintar um retângulo por módulo como o qrcode faz.
+        """
+        matrix = QRCodeService.matrix(link)
+        size = len(matrix)
+        img = Image.new("1", (size, size), 1)
+        img.putdata([0 if dark else 1 for row in matrix for dark in row])
+        img = img.resize((size * box_size, size * box_size), Image.NEAREST)
+
+        buffer = BytesIO()
+        img.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def render_svg(link: str, size: int = QR_SVG_SIZE, border: int = QR_BORDER,
+                   fill: str = "black", background: Optional[str] = None) -> str:
+        """
+        SVG do QR code para incluir diretamente no HTML ou imprimir: um único
+        `<path>` com os módulos escuros, sem declaração XML. O resultado fica
+        em cache (LRU) por link e opções.
+        """
+        return _render_svg(link, size, border, fill, background)
+
+    @staticmethod
+    def upload_png(data: bytes, token) -> str:
+        """Envia o PNG para o storage; levanta exceção se o upload falhar"""
+        return AppwriteService._upload_bytes(data, f"qrcode_{token}.png", ['read("any")'])
+
+    @staticmethod
+    def generate_and_upload(link: str, token) -> Optional[str]:
+        try:
+            return QRCodeService.upload_png(QRCodeService.render_png(link), token)
+        except Exception as exc:
+            logger.error(f"Erro ao gerar QR code do convite {token}: {exc}")
+            return None
+
+    @staticmethod
+    def generate_many(items: Iterable[tuple], processes: Optional[int] = None,
+                      concurrency: Optional[int] = None, batch_size: int = 200) -> Iterator[Tuple]:
+        """
+        Gera e envia os QR codes de vários convites. `items` são pares
+        (convite, link); produz (convite, link, file_id, erro) à medida que os
+        uploads terminam, com file_id None quando o envio falha.
+
+        Gerar o PNG é CPU puro (Python), por isso vai para um pool de processos;
+        o upload é rede e usa um pool de threads com concorrência limitada.
+        """
+        items = list(items)
+        if not items:
+            return
+        processes = processes or os.cpu_count() or 1
+        concurrency = concurrency or getattr(base, 'UPLOAD_CONCURRENCY', 4)
+        batch_size = max(1, batch_size)
+
+        with ProcessPoolExecutor(max_workers=processes) as encoders, \
+                ThreadPoolExecutor(max_workers=concurrency) as uploaders:
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                images = encoders.map(QRCodeService.render_png, [link for _, link in batch], chunksize=16)
+                futures = {
+                    uploaders.submit(QRCodeService.upload_png, data, invite.token): (invite, link)
+                    for (invite, link), data in zip(batch, images)
+                }
+                for future in as_completed(futures):
+                    invite, link = futures[future]
+                    try:
+                        qr_code_id = future.result()
+                    except Exception as exc:
+                        yield invite, link, None, exc
+                        continue
+                    if not qr_code_id:
+                        yield invite, link, None, RuntimeError("upload sem id")
+                        continue
+                    yield invite, link, qr_code_id, None
+
+    @staticmethod
+    def assign(invite, qr_code_id: str, link: str):
+        """
+        Grava o novo QR code no convite e liberta o anterior
+        """
+        from apps.core.services.blob_index import BlobIndex  # importação local
+
+        previous = invite.qr_code_id
+        invite.qr_code_id = qr_code_id
+        invite.qr_code_link = link
+        invite.save(update_fields=['qr_code_id', 'qr_code_link', 'updated_at'])
+        if previous and previous != qr_code_id:
+            # Cada QR code pertence a um só convite: pode ser apagado mesmo fora do índice
+            BlobIndex.release([previous], delete_untracked=True)
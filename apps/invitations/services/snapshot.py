@@ -0,0 +1,118 @@
+from django.core.exceptions import ObjectDoesNotExist
+
+from apps.core.services.appwrite_service import AppwriteService
+
+
+class _Snapshot:
+    """
+    Base para snapshots imutáveis com __slots__: ocupam pouca memória,
+    são serializados como tuplos e não disparam queries ao serem lidos.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} é imutável")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} é imutável")
+
+    def __reduce__(self):
+        return _rebuild, (type(self), tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {getattr(self, 'pk', None)}>"
+
+
+def _rebuild(cls, values):
+    obj = cls.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        object.__setattr__(obj, name, value)
+    return obj
+
+
+class GuestSnapshot(_Snapshot):
+    __slots__ = (
+        'pk', 'token', 'first_name', 'last_name', 'nickname', 'gender', 'emoji',
+        'avatar_id', 'memories', 'dietary_restrictions', 'music_suggestion',
+    )
+
+    @classmethod
+    def from_guest(cls, guest):
+        return cls(
+            pk=guest.pk,
+            token=guest.token,
+            first_name=guest.first_name,
+            last_name=guest.last_name,
+            nickname=guest.nickname,
+            gender=guest.gender,
+            emoji=guest.emoji,
+            avatar_id=guest.avatar_id,
+            memories=tuple(guest.memories or ()),
+            dietary_restrictions=guest.dietary_restrictions,
+            music_suggestion=guest.music_suggestion,
+        )
+
+
+class GamificationSnapshot(_Snapshot):
+    __slots__ = ('pk', 'points', 'rank')
+
+    @classmethod
+    def from_gamification(cls, gamification):
+        return cls(pk=gamification.pk, points=gamification.points, rank=gamification.rank)
+
+
+class InviteSnapshot(_Snapshot):
+    """
+    Representação compacta de um convite para a página pública:
+    campos do convite, do convidado, pontos de gamificação e manifesto de mídia.
+    `last_modified` é a data de alteração mais recente entre essas linhas.
+    """
+
+    __slots__ = (
+        'pk', 'token', 'expiration_date', 'is_active', 'qr_code_id',
+        'invitation_status', 'response_date', 'personalized_message',
+        'pre_confirmation_video_url', 'thank_you_video_url', 'decline_reason',
+        'guest', 'gamification', 'media', 'last_modified',
+    )
+
+    @classmethod
+    def from_invite(cls, invite):
+        """
+        Constrói o snapshot a partir de um Invite carregado com
+        select_related('guest', 'gamification')
+        """
+        from apps.invitations.services.invite_service import InviteService  # importação local
+
+        last_modified = max(invite.updated_at, invite.guest.updated_at)
+        try:
+            gamification = GamificationSnapshot.from_gamification(invite.gamification)
+            last_modified = max(last_modified, invite.gamification.updated_at)
+        except ObjectDoesNotExist:
+            gamification = None
+
+        return cls(
+            pk=invite.pk,
+            token=invite.token,
+            expiration_date=invite.expiration_date,
+            is_active=invite.is_active,
+            qr_code_id=invite.qr_code_id,
+            invitation_status=invite.invitation_status,
+            response_date=invite.response_date,
+            personalized_message=invite.personalized_message,
+            pre_confirmation_video_url=invite.pre_confirmation_video_url,
+            thank_you_video_url=invite.thank_you_video_url,
+            decline_reason=invite.decline_reason,
+            guest=GuestSnapshot.from_guest(invite.guest),
+            gamification=gamification,
+            media=InviteService.get_optimized_media_urls(invite.guest),
+            last_modified=last_modified,
+        )
+
+    @property
+    def get_qr_code_url(self):
+        return AppwriteService.get_file_url(self.qr_code_id)
@@ -0,0 +1,250 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Bloom filter simples sobre um bytearray, com double hashing (blake2b).
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TokenGuard:
+    """
+    Filtro à entrada da página pública do convite:
+
+    - Bloom filter (por processo) com os tokens de todos os convites, que
+      rejeita tokens desconhecidos sem queries;
+    - cache negativo de curta duração para tokens inexistentes e convites
+      inativos/expirados, para não repetir a query nem a validação.
+
+    O filtro é reconstruído quando a geração guardada no cache muda (convite
+    criado ou apagado noutro processo) ou quando fica mais velho que `max_age`.
+    Com um cache local ao processo a geração não é partilhada, por isso um
+    token recusado pelo filtro é confirmado na base de dados antes do 404
+    (um `exists()` pelo índice do token) e a recusa fica no cache negativo.
+    """
+
+    GENERATION_KEY = "invite_token_filter_generation"
+    MISSING = "missing"
+
+    def __init__(self, error_rate=0.001, negative_timeout=60, max_age=300):
+        self.error_rate = error_rate
+        self.negative_timeout = negative_timeout
+        self.max_age = max_age
+        self._filter = None
+        self._generation = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.rejections = 0
+        self.negative_hits = 0
+        self.false_positives = 0
+        self.stale_misses = 0
+
+    @staticmethod
+    def _negative_key(token):
+        return f"invite_negative_{token}"
+
+    @staticmethod
+    def _token_bytes(token):
+        return token.bytes if isinstance(token, uuid.UUID) else uuid.UUID(str(token)).bytes
+
+    # ------------------------
+    # Bloom filter
+    # ------------------------
+    def _fresh_filter(self, generation):
+        bloom = self._filter
+        if (bloom is not None
+                and generation == self._generation
+                and time.monotonic() - self._built_at < self.max_age):
+            return bloom
+        return None
+
+    def rebuild(self, generation=None):
+        """
+        Reconstrói o filtro a partir de todos os tokens da base de dados
+        """
+        from apps.invitations.models import Invite  # importação local
+
+        tokens = list(Invite.objects.values_list('token', flat=True))
+        bloom = BloomFilter(max(len(tokens) * 2, 1000), self.error_rate)
+        for token in tokens:
+            bloom.add(token.bytes)
+
+        with self._lock:
+            self._filter = bloom
+            self._generation = generation if generation is not None else cache.get(self.GENERATION_KEY)
+            self._built_at = time.monotonic()
+        logger.debug(f"Filtro de tokens reconstruído com {len(tokens)} convites")
+        return bloom
+
+    def _contains(self, bloom, token):
+        self.checks += 1
+        if self._token_bytes(token) in bloom:
+            return True
+        self.rejections += 1
+        return False
+
+    def might_exist(self, token):
+        """
+        False garante que o token não existe; True pode ser falso positivo.
+        A recusa do filtro é confirmada na base de dados
+        """
+        from apps.invitations.models import Invite  # importação local
+
+        generation = cache.get(self.GENERATION_KEY)
+        bloom = self._fresh_filter(generation) or self.rebuild(generation)
+        if self._contains(bloom, token):
+            return True
+        if Invite.objects.filter(token=token).exists():
+            return self._stale_miss(token)
+        self.remember_denial(token, self.MISSING)
+        return False
+
+    async def amight_exist(self, token):
+        from apps.invitations.models import Invite  # importação local
+
+        generation = await cache.aget(self.GENERATION_KEY)
+        bloom = self._fresh_filter(generation) or await sync_to_async(self.rebuild)(generation)
+        if self._contains(bloom, token):
+            return True
+        if await Invite.objects.filter(token=token).aexists():
+            return self._stale_miss(token)
+        await self.aremember_denial(token, self.MISSING)
+        return False
+
+    def _stale_miss(self, token):
+        """
+        Token recusado pelo filtro mas presente na base de dados (convite
+        criado noutro processo): passa a constar do filtro local
+        """
+        self.stale_misses += 1
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(self._token_bytes(token))
+        return True
+
+    def token_added(self, token):
+        """
+        Convite criado: adiciona localmente e avisa os outros processos
+        """
+        self.tokens_added([token])
+
+    def tokens_added(self, tokens):
+        """
+        Vários convites criados de uma vez (ex.: bulk_create, que não dispara
+        post_save): uma única nova geração para todos
+        """
+        generation = uuid.uuid4().hex
+        cache.set(self.GENERATION_KEY, generation, None)
+        with self._lock:
+            if self._filter is not None:
+                for token in tokens:
+                    self._filter.add(self._token_bytes(token))
+                self._generation = generation
+        cache.delete_many([self._negative_key(token) for token in tokens])
+
+    def token_removed(self, token):
+        """
+        Convite apagado: o Bloom filter não suporta remoção, força reconstrução
+        """
+        cache.set(self.GENERATION_KEY, uuid.uuid4().hex, None)
+        with self._lock:
+            self._filter = None
+
+    # ------------------------
+    # Cache negativo
+    # ------------------------
+    def get_denial(self, token):
+        """
+        Retorna o motivo em cache (MISSING ou mensagem de erro) ou None
+        """
+        reason = cache.get(self._negative_key(token))
+        if reason is not None:
+            self.negative_hits += 1
+        return reason
+
+    async def aget_denial(self, token):
+        reason = await cache.aget(self._negative_key(token))
+        if reason is not None:
+            self.negative_hits += 1
+        return reason
+
+    def remember_denial(self, token, reason):
+        cache.set(self._negative_key(token), reason, self.negative_timeout)
+
+    async def aremember_denial(self, token, reason):
+        await cache.aset(self._negative_key(token), reason, self.negative_timeout)
+
+    def remember_missing(self, token, exists=False):
+        """
+        Guarda a recusa de um token sem convite ativo. Só é um falso positivo
+        do filtro se não houver convite nenhum: os inativos estão no filtro
+        """
+        if not exists:
+            self.false_positives += 1
+        self.remember_denial(token, self.MISSING)
+
+    async def aremember_missing(self, token, exists=False):
+        if not exists:
+            self.false_positives += 1
+        await self.aremember_denial(token, self.MISSING)
+
+    def forget(self, token):
+        cache.delete(self._negative_key(token))
+
+    def stats(self):
+        """
+        Estatísticas para afinar `error_rate` e `negative_timeout`
+        """
+        passed = self.checks - self.rejections
+        return {
+            'checks': self.checks,
+            'rejections': self.rejections,
+            'rejection_rate': self.rejections / self.checks if self.checks else 0.0,
+            'false_positives': self.false_positives,
+            'false_positive_rate': self.false_positives / passed if passed else 0.0,
+            'negative_hits': self.negative_hits,
+            'stale_misses': self.stale_misses,
+            'filter_bits': self._filter.size if self._filter else 0,
+            'filter_hashes': self._filter.num_hashes if self._filter else 0,
+            'filter_items': self._filter.count if self._filter else 0,
+        }
+
+
+token_guard = TokenGuard(
+    error_rate=getattr(settings, 'INVITE_TOKEN_FILTER_ERROR_RATE', 0.001),
+    negative_timeout=getattr(settings, 'INVITE_NEGATIVE_CACHE_TIMEOUT', 60),
+    max_age=getattr(settings, 'INVITE_TOKEN_FILTER_MAX_AGE', 300),
+)
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.invitations.services.page_cache import InvitePageCache
+from apps.invitations.services.token_guard import token_guard
+
+
+def invalidate_invite(token):
+    """
+    Invalida o convite em cache e todas as páginas renderizadas dele
+    """
+    _invalidate(token)
+    if transaction.get_connection().in_atomic_block:
+        # Um pedido entre o save e o commit ainda lê (e guarda) os dados antigos
+        transaction.on_commit(lambda: _invalidate(token))
+
+
+def _invalidate(token):
+    from apps.invitations.services.invite_service import invite_cache  # importação local
+
+    invite_cache.invalidate(f"invite_{token}")
+    token_guard.forget(token)
+    InvitePageCache.bump_version(token)
+
+
+def _invite_changed(sender, instance, **kwargs):
+    invalidate_invite(instance.token)
+
+
+def _invite_created(sender, instance, created, **kwargs):
+    if created:
+        token_guard.token_added(instance.token)
+
+
+def _invite_deleted(sender, instance, **kwargs):
+    token_guard.token_removed(instance.token)
+
+
+def _guest_changed(sender, instance, **kwargs):
+    for token in instance.invites.values_list('token', flat=True):
+        invalidate_invite(token)
+
+
+def _gamification_changed(sender, instance, **kwargs):
+    from apps.invitations.models import Invite  # importação local
+
+    token = Invite.objects.filter(pk=instance.invite_id).values_list('token', flat=True).first()
+    if token:
+        invalidate_invite(token)
+
+
+def connect_signals():
+    post_save.connect(_invite_created, sender='invitations.Invite', dispatch_uid="invite_token_filter_created")
+    post_delete.connect(_invite_deleted, sender='invitations.Invite', dispatch_uid="invite_token_filter_deleted")
+    for signal in (post_save, post_delete):
+        signal.connect(_invite_changed, sender='invitations.Invite',
+                       dispatch_uid=f"invite_cache_invite_{signal is post_save}")
+        signal.connect(_guest_changed, sender='guests.Guest',
+                       dispatch_uid=f"invite_cache_guest_{signal is post_save}")
+        signal.connect(_gamification_changed, sender='gamification.Gamification',
+                       dispatch_uid=f"invite_cache_gamification_{signal is post_save}")
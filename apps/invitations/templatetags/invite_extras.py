@@ -27,6 +27,16 @@ def get_video_embed_url(url):
     
     return url
 
+@register.filter
+def is_hosted_video(url):
+    """
+    Verdadeiro para vídeos enviados para o nosso storage (Appwrite ou backend
+    local), que são reproduzidos com <video> em vez de um iframe
+    """
+    from apps.core.services.storage_backends import get_storage
+
+    return bool(url and url.startswith(f"{get_storage().endpoint}/storage/"))
+
 @register.filter
 def json_script_safe(value):
     """
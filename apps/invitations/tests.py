@@ -1,3 +1,503 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections
+from django.http import Http404
+from django.test import TestCase, override_settings
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+from qrcode.main import QRCode
+
+from apps.gamification.models import FIRST_ACCEPTANCE_BADGE, FIRST_ACCEPTANCE_POINTS, Gamification
+from apps.gamification.services.event_log import GamificationEventLog
+from apps.guests.models import Guest
+from apps.invitations import urls as invitation_urls, views
+from apps.invitations.models import Invite
+from apps.invitations.services.access_recorder import AccessRecorder
+from apps.invitations.services.invite_service import InviteService
+from apps.invitations.services.page_cache import InvitePageCache
+from apps.invitations.services.qr_cache import qr_cache
+from apps.invitations.services.qr_service import QR_BORDER, QR_ERROR_CORRECTION, QRCodeService
+from apps.invitations.services.snapshot import InviteSnapshot
+from apps.invitations.services.token_guard import token_guard
+
+
+class RsvpWritePathTests(TestCase):
+    """
+    A resposta RSVP é uma única transação: UPDATE condicional do convite e,
+    na primeira aceitação, os eventos de gamificação (chave única) e o
+    upsert da Gamification, visíveis logo a seguir ao RSVP
+    """
+
+    def setUp(self):
+        guest = Guest.objects.create(first_name="Ana", dietary_restrictions="Nenhuma", music_suggestion="Fado")
+        self.invite = Invite.objects.create(guest=guest)
+
+    def test_accept_query_count(self):
+        # SAVEPOINT, UPDATE do convite, verificação e INSERT dos eventos,
+        # upsert da Gamification (INSERT OR IGNORE, UPDATE com F(), SELECT),
+        # badge (Achievement e GamificationAchievement), RELEASE
+        with self.assertNumQueries(10):
+            success, _ = InviteService.process_rsvp_response(self.invite, 'accepted')
+        self.assertTrue(success)
+
+        self.invite.refresh_from_db()
+        self.assertEqual(self.invite.invitation_status, 'accepted')
+        self.assertIsNotNone(self.invite.response_date)
+        gamification = Gamification.objects.get(invite=self.invite)
+        self.assertEqual(gamification.points, FIRST_ACCEPTANCE_POINTS)
+        self.assertEqual(gamification.badges, [FIRST_ACCEPTANCE_BADGE])
+
+    def test_repeated_accept_is_idempotent(self):
+        InviteService.process_rsvp_response(self.invite, 'accepted')
+        response_date = Invite.objects.get(pk=self.invite.pk).response_date
+
+        # Só o UPDATE condicional, que não encontra linhas para alterar
+        with self.assertNumQueries(3):
+            success, _ = InviteService.process_rsvp_response(self.invite, 'accepted')
+        self.assertTrue(success)
+
+        self.assertEqual(Invite.objects.get(pk=self.invite.pk).response_date, response_date)
+        gamification = Gamification.objects.get(invite=self.invite)
+        self.assertEqual(gamification.points, FIRST_ACCEPTANCE_POINTS)
+        self.assertEqual(gamification.badges, [FIRST_ACCEPTANCE_BADGE])
+
+    def test_accept_after_decline_does_not_award_twice(self):
+        InviteService.process_rsvp_response(self.invite, 'accepted')
+        InviteService.process_rsvp_response(self.invite, 'declined', "Viagem")
+        # SAVEPOINT, UPDATE do convite, verificação dos eventos já gravados, RELEASE
+        with self.assertNumQueries(4):
+            InviteService.process_rsvp_response(self.invite, 'accepted')
+
+        self.assertEqual(Gamification.objects.get(invite=self.invite).points, FIRST_ACCEPTANCE_POINTS)
+        self.assertEqual(Invite.objects.get(pk=self.invite.pk).decline_reason, "Viagem")
+
+    def test_invalid_status_writes_nothing(self):
+        with self.assertNumQueries(0):
+            success, _ = InviteService.process_rsvp_response(self.invite, 'maybe')
+        self.assertFalse(success)
+
+    def test_respond_view_query_count(self):
+        url = reverse('invitations:respond_invite', kwargs={'token': self.invite.token})
+        # Convite com o convidado (1 query) e a transação do RSVP (10)
+        with self.assertNumQueries(11):
+            response = self.client.post(url, {'invitation_status': 'accepted'})
+        self.assertRedirects(
+            response,
+            reverse('invitations:invite_detail', kwargs={'token': self.invite.token}),
+            fetch_redirect_response=False,
+        )
+
+
+class AsyncInviteViewsTests(TestCase):
+    """As views assíncronas (INVITE_ASYNC_VIEWS) respondem como as síncronas"""
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Ana", dietary_restrictions="Nenhuma", music_suggestion="Fado")
+        self.invite = Invite.objects.create(guest=self.guest)
+        # As URLs escolhem as views ao importar: recarrega-as com a opção ativa
+        with override_settings(INVITE_ASYNC_VIEWS=True):
+            importlib.reload(invitation_urls)
+        clear_url_caches()
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, invitation_urls)
+
+    def _url(self, name, token=None):
+        return reverse(f'invitations:{name}', kwargs={'token': token or self.invite.token})
+
+    def _expire(self):
+        self.invite.expiration_date = timezone.now() - timedelta(days=1)
+        self.invite.save()
+
+    def test_urls_use_the_async_views(self):
+        self.assertIs(invitation_urls.invite_detail, views.invite_detail_async)
+        self.assertIs(invitation_urls.respond_invite, views.respond_invite_async)
+        self.assertIs(invitation_urls.complete_profile, views.complete_profile_async)
+
+    async def test_invite_detail(self):
+        first = await self.async_client.get(self._url('invite_detail'))
+        self.assertContains(first, "Ana")
+        self.assertTrue(first['ETag'].startswith('W/"'))
+
+        cached = await self.async_client.get(self._url('invite_detail'), headers={'if-none-match': first['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_invite_detail_refuses_unknown_and_expired_invites(self):
+        unknown = await self.async_client.get(self._url('invite_detail', uuid.uuid4()))
+        self.assertContains(unknown, "Ocorreu um erro", status_code=200)
+
+        await sync_to_async(self._expire)()
+        expired = await self.async_client.get(self._url('invite_detail'))
+        self.assertTemplateUsed(expired, "invitations/invite_expired.html")
+
+    async def test_respond_invite_accepts_and_awards_points(self):
+        response = await self.async_client.post(self._url('respond_invite'), {'invitation_status': 'accepted'})
+        self.assertRedirects(response, self._url('invite_detail'), fetch_redirect_response=False)
+
+        invite = await Invite.objects.aget(pk=self.invite.pk)
+        self.assertEqual(invite.invitation_status, 'accepted')
+        gamification = await Gamification.objects.aget(invite=self.invite)
+        self.assertEqual(gamification.points, FIRST_ACCEPTANCE_POINTS)
+
+    async def test_respond_invite_rejects_invalid_status(self):
+        response = await self.async_client.post(self._url('respond_invite'), {'invitation_status': 'maybe'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Invite.objects.aget(pk=self.invite.pk)).invitation_status, self.invite.invitation_status)
+
+    async def test_complete_profile(self):
+        response = await self.async_client.post(
+            self._url('complete_profile'), json.dumps({'music': "Jazz", 'gender': 'female'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'success': True})
+        guest = await Guest.objects.aget(pk=self.guest.pk)
+        self.assertEqual((guest.music_suggestion, guest.gender), ("Jazz", 'F'))
+
+    async def test_complete_profile_errors(self):
+        url = self._url('complete_profile')
+        self.assertEqual((await self.async_client.get(url)).status_code, 405)
+        self.assertEqual((await self.async_client.post(url, "{", content_type='application/json')).status_code, 400)
+        missing = await self.async_client.post(self._url('complete_profile', uuid.uuid4()), "{}",
+                                               content_type='application/json')
+        self.assertEqual(missing.status_code, 404)
+
+        with mock.patch.object(InviteService, 'validate_invite_access', side_effect=PermissionDenied("Convite expirado")):
+            denied = await self.async_client.post(url, "{}", content_type='application/json')
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(denied.json()['error'], "Convite expirado")
+
+        await sync_to_async(self._expire)()
+        self.assertEqual((await self.async_client.post(url, "{}", content_type='application/json')).status_code, 403)
+
+
+class InvitePageValidatorTests(TestCase):
+    """ETag da página do convite: fraco e derivado das datas na base de dados"""
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Ana", dietary_restrictions="Nenhuma", music_suggestion="Fado")
+        self.invite = Invite.objects.create(guest=self.guest)
+        self.url = reverse('invitations:invite_detail', kwargs={'token': self.invite.token})
+
+    def test_weak_etag_survives_a_lost_version_and_changes_with_the_data(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+
+        # Outro processo (sem a versão no cache local) dá o mesmo validador
+        cache.clear()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        self.guest.first_name = "Beatriz"
+        self.guest.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+
+class InviteSnapshotTests(TestCase):
+    """O snapshot serve a página sem queries e data-a pela linha alterada mais recente"""
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Ana", dietary_restrictions="Nenhuma", music_suggestion="Fado")
+        self.invite = Invite.objects.create(guest=self.guest)
+        self.gamification = Gamification.objects.create(invite=self.invite)
+        self.url = reverse('invitations:invite_detail', kwargs={'token': self.invite.token})
+
+    def test_warm_cache_invite_detail_makes_no_queries(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Ana")
+
+    def test_last_modified_is_the_latest_of_the_three_rows(self):
+        base = timezone.now()
+        rows = {
+            Invite: self.invite.pk,
+            Guest: self.guest.pk,
+            Gamification: self.gamification.pk,
+        }
+        for latest in rows:
+            for model, pk in rows.items():
+                offset = timedelta(hours=1) if model is latest else timedelta(0)
+                model.objects.filter(pk=pk).update(updated_at=base + offset)
+            invite = Invite.objects.select_related('guest', 'gamification').get(pk=self.invite.pk)
+            self.assertEqual(InviteSnapshot.from_invite(invite).last_modified, base + timedelta(hours=1), latest)
+
+    def test_last_modified_without_gamification(self):
+        self.gamification.delete()
+        invite = Invite.objects.select_related('guest', 'gamification').get(pk=self.invite.pk)
+        self.assertEqual(InviteSnapshot.from_invite(invite).last_modified,
+                         max(invite.updated_at, invite.guest.updated_at))
+        self.assertIsNone(InviteSnapshot.from_invite(invite).gamification)
+
+
+class InvitePageCacheTests(TestCase):
+    """A página em cache muda quando o Invite, o Guest ou a Gamification são gravados"""
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Guest.objects.create(first_name="Ana", dietary_restrictions="Nenhuma", music_suggestion="Fado")
+        self.invite = Invite.objects.create(guest=self.guest, personalized_message="Vem celebrar connosco")
+        self.url = reverse('invitations:invite_detail', kwargs={'token': self.invite.token})
+
+    def test_saving_invite_changes_served_page(self):
+        self.assertContains(self.client.get(self.url), "Vem celebrar connosco")
+
+        self.invite.personalized_message = "Contamos contigo"
+        self.invite.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "Contamos contigo")
+        self.assertNotContains(response, "Vem celebrar connosco")
+
+    def test_saving_guest_changes_served_page(self):
+        self.assertContains(self.client.get(self.url), "Ana")
+
+        self.guest.first_name = "Beatriz"
+        self.guest.save()
+        self.assertContains(self.client.get(self.url), "Beatriz")
+
+    def test_saving_gamification_changes_served_page(self):
+        gamification = Gamification.objects.create(invite=self.invite)
+        first = self.client.get(self.url)
+        version = InvitePageCache.get_version(self.invite.token)
+
+        gamification.points = 5
+        gamification.save()
+        self.assertNotEqual(InvitePageCache.get_version(self.invite.token), version)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    @override_settings(INVITE_PAGE_CACHE_TIMEOUT=3600)
+    def test_local_cache_caps_timeout(self):
+        # A invalidação num LocMemCache não chega aos outros workers
+        self.assertEqual(InvitePageCache.timeout(), InvitePageCache.LOCAL_CACHE_MAX_TIMEOUT)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(InvitePageCache.timeout(), 3600)
+
+
+class InviteQrCodeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Nada de escrever em MEDIA_ROOT: o qr_cache lê o diretório ao importar
+        self.qr_dir = tempfile.mkdtemp()
+        self.enterContext(override_settings(QR_CACHE_DIR=self.qr_dir))
+        self.enterContext(mock.patch.object(qr_cache, 'directory', self.qr_dir))
+        qr_cache.clear()
+        self.invite = Invite.objects.create(guest=Guest.objects.create(first_name="Ana"))
+        self.url = reverse('invitations:invite_qr_code', kwargs={'token': self.invite.token, 'fmt': 'svg'})
+
+    def tearDown(self):
+        qr_cache.clear()
+        shutil.rmtree(self.qr_dir, ignore_errors=True)
+
+    def test_short_revalidated_cache_keyed_by_link(self):
+        with self.settings(INVITE_BASE_URL="https://a.example"):
+            first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('immutable', first['Cache-Control'])
+        self.assertEqual(len(os.listdir(self.qr_dir)), 1)
+
+        with self.settings(INVITE_BASE_URL="https://b.example"):
+            moved = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(moved.status_code, 200)
+        self.assertNotEqual(moved['ETag'], first['ETag'])
+
+    def test_inactive_or_expired_invites_are_refused(self):
+        self.invite.is_active = False
+        self.invite.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.invite.is_active = True
+        self.invite.expiration_date = timezone.now() - timedelta(days=1)
+        self.invite.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class QrSvgPathTests(TestCase):
+    """O caminho do SVG desenha exatamente os módulos escuros da matriz do QR code"""
+
+    RECT = re.compile(r"M(\d+) (\d+)h(\d+)v1h-\3z")
+
+    def _parse(self, svg):
+        modules = int(re.search(r'viewBox="0 0 (\d+) \1"', svg).group(1))
+        path = re.search(r' d="([^"]*)"', svg).group(1)
+        self.assertEqual("".join(match.group(0) for match in self.RECT.finditer(path)), path)
+
+        matrix = [[False] * modules for _ in range(modules)]
+        for match in self.RECT.finditer(path):
+            x, y, run = (int(value) for value in match.groups())
+            for column in range(x, x + run):
+                self.assertFalse(matrix[y][column], "retângulos sobrepostos")
+                matrix[y][column] = True
+        return matrix
+
+    def test_path_matches_the_qr_matrix(self):
+        for link, border in (("https://example.com/invitations/detail/abc/", QR_BORDER),
+                             ("https://example.com/" + "x" * 300, 0)):
+            qr = QRCode(version=1, error_correction=QR_ERROR_CORRECTION, border=border)
+            qr.add_data(link)
+            qr.make(fit=True)
+            self.assertEqual(self._parse(QRCodeService.render_svg(link, border=border)), qr.get_matrix())
+
+
+class TokenGuardFalsePositiveTests(TestCase):
+    """Só um token sem convite nenhum conta como falso positivo do filtro"""
+
+    def setUp(self):
+        cache.clear()
+        self.invite = Invite.objects.create(guest=Guest.objects.create(first_name="Ana"))
+
+    def _false_positives(self, token):
+        before = token_guard.false_positives
+        with mock.patch.object(token_guard, 'might_exist', return_value=True), \
+                self.assertRaises((Http404, PermissionDenied)):
+            InviteService.get_invite_with_cache(token)
+        return token_guard.false_positives - before
+
+    def test_unknown_token_is_a_false_positive(self):
+        token = uuid.uuid4()
+        self.assertEqual(self._false_positives(token), 1)
+        # A recusa fica no cache negativo: o segundo pedido não volta à base de dados
+        self.assertEqual(self._false_positives(token), 0)
+
+    def test_inactive_or_expired_invite_is_not(self):
+        self.invite.is_active = False
+        self.invite.save()
+        self.assertEqual(self._false_positives(self.invite.token), 0)
+
+        self.invite.is_active = True
+        self.invite.expiration_date = timezone.now() - timedelta(days=1)
+        self.invite.save()
+        self.assertEqual(self._false_positives(self.invite.token), 0)
+
+
+class TokenGuardStaleFilterTests(TestCase):
+    """Um convite criado noutro processo não é recusado pelo filtro local"""
+
+    def setUp(self):
+        cache.clear()
+        token_guard.rebuild()
+        # bulk_create não dispara post_save: o filtro e a geração não mudam,
+        # como num worker com outro cache local
+        self.invite = Invite.objects.bulk_create([Invite(guest=Guest.objects.create(first_name="Ana"))])[0]
+        self.url = reverse('invitations:invite_detail', kwargs={'token': self.invite.token})
+
+    def test_rejected_token_is_confirmed_in_the_database(self):
+        before = token_guard.stale_misses
+        self.assertTrue(token_guard.might_exist(self.invite.token))
+        self.assertEqual(token_guard.stale_misses, before + 1)
+        # Passa a constar do filtro local
+        with self.assertNumQueries(0):
+            self.assertTrue(token_guard.might_exist(self.invite.token))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_unknown_token_is_remembered(self):
+        token = uuid.uuid4()
+        with self.assertNumQueries(1):
+            self.assertFalse(token_guard.might_exist(token))
+        self.assertEqual(token_guard.get_denial(token), token_guard.MISSING)
+
+    def test_admin_shows_stats(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        response = self.client.get(reverse('admin:invitations_invite_changelist'))
+        self.assertContains(response, "Filtro de tokens")
+
+
+class RegenerateQrCodesTests(TestCase):
+
+    def test_link_matches_the_invite_view_url(self):
+        invite = Invite.objects.create(guest=Guest.objects.create(first_name="Ana"))
+        link = "https://a.example" + reverse('invitations:invite_detail', kwargs={'token': invite.token})
+        Invite.objects.filter(pk=invite.pk).update(qr_code_id="qr", qr_code_link=link)
+
+        out = io.StringIO()
+        call_command('regenerate_qr_codes', '--base-url', 'https://a.example/', stdout=out)
+        self.assertIn("Nenhum QR code a regenerar (1 já atualizados)", out.getvalue())
+
+
+class BulkCreateInvitesTests(TestCase):
+
+    def test_report_links_point_at_the_invite_view(self):
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        upload = SimpleUploadedFile("convidados.csv", b"first_name,last_name\nAna,Silva\n", content_type="text/csv")
+
+        with self.settings(INVITE_BASE_URL="https://a.example"):
+            response = self.client.post(reverse('invitations:bulk_create_invites'), {'csv_file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        row = next(csv.DictReader(io.StringIO(response.content.decode())))
+        invite = Invite.objects.get(token=row['token'])
+        self.assertEqual(row['link'], "https://a.example" + reverse('invitations:invite_detail',
+                                                                    kwargs={'token': invite.token}))
+
+
+@mock.patch.object(AccessRecorder, '_ensure_timer', lambda self: None)
+class AccessRecorderTests(TestCase):
+    """Buffer dos acessos: flush por limite e por tempo, incrementos somados"""
+
+    def setUp(self):
+        self.invite = Invite.objects.create(guest=Guest.objects.create(first_name="Ana"))
+        self.other = Invite.objects.create(guest=Guest.objects.create(first_name="Rui"))
+        self.recorder = AccessRecorder(flush_interval=3600, flush_threshold=2)
+
+    def _counts(self):
+        return [invite.interactions_count for invite in Invite.objects.order_by('pk')]
+
+    def test_threshold_flush(self):
+        self.recorder.record(self.invite.pk)
+        self.assertEqual(self._counts(), [0, 0])
+        self.recorder.record(self.other.pk)
+        self.assertEqual(self._counts(), [1, 1])
+        self.assertEqual(self.recorder.stats()['pending_invites'], 0)
+
+    def test_timer_flush(self):
+        self.recorder.record(self.invite.pk)
+        with mock.patch.object(self.recorder._stop, 'wait', side_effect=[False, True]), \
+                mock.patch('apps.invitations.services.access_recorder.close_old_connections'):
+            self.recorder._run()
+        self.assertEqual(self._counts(), [1, 0])
+
+    def test_accesses_are_merged_into_one_increment(self):
+        for _ in range(3):
+            self.recorder.record(self.invite.pk)
+        Invite.objects.filter(pk=self.invite.pk).update(interactions_count=10)
+
+        with self.assertNumQueries(3):  # SAVEPOINT, UPDATE, RELEASE
+            self.assertEqual(self.recorder.flush(), 1)
+        self.assertEqual(self._counts(), [13, 0])
+
+    def test_last_access_never_moves_backwards(self):
+        now = timezone.now()
+        Invite.objects.filter(pk=self.invite.pk).update(last_access=now)
+        self.recorder.record(self.invite.pk, when=now - timedelta(hours=1))
+        self.recorder.record(self.other.pk, when=now - timedelta(hours=1))
+
+        self.assertEqual(Invite.objects.get(pk=self.invite.pk).last_access, now)
+        self.assertEqual(Invite.objects.get(pk=self.other.pk).last_access, now - timedelta(hours=1))
+
+    def test_batch_of_a_database_that_is_gone_is_discarded(self):
+        self.recorder.record(self.invite.pk)
+        with mock.patch.dict(connections['default'].settings_dict, {'NAME': 'outra.sqlite3'}):
+            self.assertEqual(self.recorder.flush(), 0)
+        self.assertEqual(self.recorder.flush(), 0)
+        self.assertEqual(self._counts(), [0, 0])
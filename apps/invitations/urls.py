@@ -1,11 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from apps.invitations import views
 
 app_name = 'invitations'
 
+# Em ASGI (uvicorn/daphne) usa as views assíncronas; em WSGI mantém as síncronas
+if getattr(settings, 'INVITE_ASYNC_VIEWS', False):
+    invite_detail = views.invite_detail_async
+    complete_profile = views.complete_profile_async
+    respond_invite = views.respond_invite_async
+else:
+    invite_detail = views.invite_detail
+    complete_profile = views.complete_profile
+    respond_invite = views.respond_invite
+
 urlpatterns = [
     path("create/", views.create_invite, name="create_invite"),
-    path("detail/<uuid:token>/", views.invite_detail, name="invite_detail"),
-    path("detail/<uuid:token>/complete_profile/", views.complete_profile, name="complete_profile"),
-    path("respond/<uuid:token>/", views.respond_invite, name="respond_invite"),
+    path("bulk/", views.bulk_create_invites, name="bulk_create_invites"),
+    path("detail/<uuid:token>/", invite_detail, name="invite_detail"),
+    path("detail/<uuid:token>/complete_profile/", complete_profile, name="complete_profile"),
+    path("respond/<uuid:token>/", respond_invite, name="respond_invite"),
+    path("qr/<uuid:token>.<str:fmt>", views.invite_qr_code, name="invite_qr_code"),
 ]
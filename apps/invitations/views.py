@@ -1,25 +1,34 @@
-import re
-from io import BytesIO
 
-from django.http import Http404, JsonResponse
-from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import PermissionDenied
 from django.views.decorators.vary import vary_on_headers
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.urls import reverse
 from urllib.parse import urlencode
 
 from apps.core.services.appwrite_service import AppwriteService
+from apps.core.services.job_queue import JobQueue
+from apps.invitations.services.bulk_import import BulkImportError, BulkInviteImporter
 from apps.invitations.services.invite_service import InviteService
+from apps.invitations.services.page_cache import InvitePageCache
+from apps.invitations.services.qr_cache import QR_FORMATS, qr_cache
+from apps.invitations.services.qr_service import QRCodeService
 from apps.invitations.forms import InviteForm
 from apps.invitations.models import Invite
 from apps.guests.models import Guest
 
-import qrcode
-from qrcode.main import QRCode
-from qrcode.image.svg import SvgImage
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 @staff_member_required
 def create_invite(request):
@@ -52,117 +61,230 @@ def process_invite_form(request):
     """
     Processa o formulário de convite quando submetido.
     """
-    form = InviteForm(request.POST)
+    form = InviteForm(request.POST, request.FILES)
     if form.is_valid():
         invite = form.save(commit=False)
 
-        # Gere o link para o QR Code
-        link = generate_link(request, f"/invitations/detail/{invite.token}/")
-
-        # Gera e faz upload do QR code
-        invite.qr_code_id = generate_and_upload_qrcode(link, invite.token)
-
+        if not form.upload_videos(invite):
+            return render(request, "invitations/create_invite.html", {"form": form})
         invite.save()
+
+        # O QR code é gerado só quando for pedido (ver invite_qr_code)
         return redirect("invitations:invite_detail", token=invite.token)
 
     return render(request, "invitations/create_invite.html", {"form": form})
 
-def generate_and_upload_qrcode(link, token):
+@staff_member_required
+def bulk_create_invites(request):
     """
-    Gera uma imagem QR code e faz upload para o Appwrite.
-    Retorna o ID do arquivo no Appwrite.
+    Cria convites em lote a partir de um CSV de convidados e devolve um CSV
+    com o token e o link de cada convite. Os QR codes são gerados a pedido
+    (ver invite_qr_code).
     """
-    import tempfile  # Use o módulo tempfile do Python padrão
-    from django.core.files import File
-    import os
-
-    # Gera a imagem do QR code
-    qr_image = generate_qr_code_image(link)
-
-    # Convertendo a imagem PIL para arquivo temporário
-    temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-    qr_image.save(temp_file.name, format='PNG')
-    temp_file.close()
+    if request.method != "POST":
+        return render(request, "invitations/bulk_invites.html")
 
-    # Upload como arquivo Django
-    qr_code_id = None
+    upload = request.FILES.get('csv_file')
+    if upload is None:
+        return render(request, "invitations/bulk_invites.html", {"errors": ["Escolha um ficheiro CSV."]}, status=400)
     try:
-        with open(temp_file.name, 'rb') as f:
-            django_file = File(f)
-            django_file.name = f"qrcode_{token}.png"
-            qr_code_id = AppwriteService.upload_file(django_file)
-    finally:
-        # Remove arquivo temporário
-        os.unlink(temp_file.name)
+        rows = BulkInviteImporter.parse_csv(upload.file)
+        invites = BulkInviteImporter.create(
+            rows,
+            expiration_date=request.POST.get('expiration_date') or None,
+            personalized_message=request.POST.get('personalized_message') or None,
+        )
+    except BulkImportError as exc:
+        return render(request, "invitations/bulk_invites.html", {"errors": exc.errors}, status=400)
+    except ValueError as exc:
+        return render(request, "invitations/bulk_invites.html", {"errors": [str(exc)]}, status=400)
 
-    return qr_code_id
+    response = HttpResponse(content_type="text/csv; charset=utf-8")
+    response['Content-Disposition'] = 'attachment; filename="convites.csv"'
+    # Mesmo link que o QR code de cada convite (ver invite_link)
+    BulkInviteImporter.write_report(invites, lambda invite: invite_link(request, invite.token), response)
+    return response
+
+def generate_and_upload_qrcode(link, token):
+    """
+    Gera uma imagem QR code (em memória) e faz upload para o storage.
+    Retorna o ID do arquivo ou None.
+    """
+    return QRCodeService.generate_and_upload(link, token)
 
 def generate_link(request,path):
     link = request.build_absolute_uri(path)
 
     return link
 
+def invite_link(request, token):
+    """
+    Link público do convite codificado no QR code (INVITE_BASE_URL ou o domínio do pedido)
+    """
+    base_url = getattr(settings, 'INVITE_BASE_URL', '').rstrip('/')
+    path = reverse('invitations:invite_detail', kwargs={'token': token})
+    return f"{base_url}{path}" if base_url else generate_link(request, path)
+
+def _schedule_qr_backfill(token, link):
+    """
+    Envia o QR code para o storage em segundo plano (QR_BACKFILL_STORAGE),
+    no máximo uma vez por dia e por convite
+    """
+    invite = Invite.objects.filter(token=token).only('pk', 'qr_code_id', 'qr_code_link').first()
+    if invite is None:
+        return False
+    if (getattr(settings, 'QR_BACKFILL_STORAGE', False)
+            and not (invite.qr_code_id and invite.qr_code_link == link)
+            and cache.add(f"qr_backfill_{token}", True, 24 * 3600)):
+        JobQueue.enqueue(
+            "apps.invitations.services.qr_jobs.generate_qr_code",
+            {'invite_id': invite.pk, 'link': link},
+        )
+    return True
+
+def invite_qr_code(request, token, fmt):
+    """
+    QR code do convite (PNG ou SVG), gerado no primeiro pedido e guardado em
+    cache (memória e disco). Só para convites ativos e dentro do prazo.
+
+    O conteúdo depende do link (INVITE_BASE_URL ou o domínio do pedido), por
+    isso o ETag é o hash do link e a cache HTTP é curta (QR_HTTP_MAX_AGE):
+    depois de uma mudança de domínio os navegadores revalidam e recebem o novo.
+    """
+    if fmt not in QR_FORMATS:
+        raise Http404("Formato desconhecido")
+    # Filtro de tokens, cache negativo e snapshot em cache: sem queries no caso comum
+    InviteService.get_invite_with_cache(token, record_access=False)
+
+    link = invite_link(request, token)
+    headers = {
+        'ETag': f'"{qr_cache.key(link, fmt)}"',
+        'Cache-Control': f"public, max-age={getattr(settings, 'QR_HTTP_MAX_AGE', 3600)}",
+    }
+    not_modified = get_conditional_response(request, etag=headers['ETag'])
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    # Na primeira geração agenda também o upload para o storage
+    if not qr_cache.cached(link, fmt):
+        _schedule_qr_backfill(token, link)
+
+    _, data = qr_cache.get_or_render(link, fmt)
+    return HttpResponse(data, content_type=QR_FORMATS[fmt], headers=headers)
+
+def _profile_incomplete(guest):
+    return (not getattr(guest, 'dietary_restrictions', None)) or (not getattr(guest, 'music_suggestion', None))
+
+def _conditional_headers(request, invite):
+    """
+    Cabeçalhos ETag/Last-Modified da página do convite e, se o navegador já
+    tem a versão atual, a resposta 304 correspondente
+    """
+    headers = {
+        'ETag': InvitePageCache.etag(invite.last_modified),
+        'Last-Modified': http_date(invite.last_modified.timestamp()),
+    }
+    not_modified = get_conditional_response(
+        request,
+        etag=headers['ETag'],
+        last_modified=int(invite.last_modified.timestamp()),
+    )
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+    return headers, not_modified
+
+def _invite_page_context(invite):
+    # Determine whether we should auto-open the profile completion modal on page load
+    should_show_profile_modal = invite.invitation_status == 'accepted' and _profile_incomplete(invite.guest)
+
+    return {
+        'invite': invite,
+        # URLs das mídias vêm do manifesto guardado no snapshot
+        'media_data': invite.media,
+        'should_show_profile_modal': should_show_profile_modal,
+        'csrf_token': InvitePageCache.CSRF_PLACEHOLDER,
+    }
+
+def _invite_error_response(request, token, exc):
+    if isinstance(exc, PermissionDenied):
+        return render(request, "invitations/invite_expired.html", {
+            'error_message': str(exc)
+        })
+
+    # Log do erro para debugging
+    logger.error(f"Erro ao carregar convite {token}: {exc}")
+
+    return render(request, "invitations/invite_error.html", {
+        'error_message': "Ocorreu um erro ao carregar o convite."
+    })
+
 @vary_on_headers('User-Agent')
 def invite_detail(request, token):
     """
     Exibe detalhes do convite com otimizações de performance e segurança
     """
     try:
-        # Busca convite com cache e validação
+        # Busca convite com cache e validação (tokens desconhecidos, inativos
+        # ou expirados são recusados pelo filtro/cache negativo sem queries)
         client_ip = get_client_ip(request)
         invite = InviteService.get_invite_with_cache(token, client_ip)
+
+        # GET condicional: o acesso já foi registado acima, responde 304
+        # antes de renderizar se o navegador tem a versão atual
+        version, html = InvitePageCache.get(token)
+        headers, not_modified = _conditional_headers(request, invite)
+        if not_modified is not None:
+            return not_modified
+
+        # Página já renderizada para a versão atual do convite
+        if html is None:
+            html = render_to_string("invitations/invite_detail.html", _invite_page_context(invite), request=request)
+            InvitePageCache.set(token, version, html)
+
+        return HttpResponse(InvitePageCache.restore_csrf(html, request), headers=headers)
         
-        # Valida acesso ao convite
-        is_valid, error_message = InviteService.validate_invite_access(invite)
-        if not is_valid:
-            raise PermissionDenied(error_message)
-        
-        # Obtém URLs otimizadas das mídias
-        media_data = InviteService.get_optimized_media_urls(invite.guest)
-        # If there are no memories, use the avatar as a single splash slide as a graceful fallback
-        if not media_data.get('memories_urls') or len(media_data.get('memories_urls')) == 0:
-            if invite.guest and getattr(invite.guest, 'avatar_url', None):
-                media_data['memories_urls'] = [invite.guest.avatar_url]
-                # also provide a thumbnail copy
-                media_data['memories_thumbnails'] = [invite.guest.avatar_url]
-
-        # Determine whether we should auto-open the profile completion modal on page load
-        should_show_profile_modal = False
-        try:
-            guest = invite.guest
-            profile_incomplete = (not getattr(guest, 'dietary_restrictions', None)) or (not getattr(guest, 'music_suggestion', None))
-            if invite.invitation_status == 'accepted' and profile_incomplete:
-                should_show_profile_modal = True
-        except Exception:
-            should_show_profile_modal = False
-
-        context = {
-            'invite': invite,
-            'media_data': media_data,
-            'should_show_profile_modal': should_show_profile_modal,
-        }
-        
-        return render(request, "invitations/invite_detail.html", context)
-        
-    except PermissionDenied as e:
-        return render(request, "invitations/invite_expired.html", {
-            'error_message': str(e)
-        })
     except Exception as e:
-        # Log do erro para debugging
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Erro ao carregar convite {token}: {e}")
-        
-        return render(request, "invitations/invite_error.html", {
-            'error_message': "Ocorreu um erro ao carregar o convite."
-        })
+        return _invite_error_response(request, token, e)
+
+@vary_on_headers('User-Agent')
+async def invite_detail_async(request, token):
+    """
+    Versão assíncrona (ASGI) de `invite_detail`
+    """
+    try:
+        invite = await InviteService.aget_invite_with_cache(token, get_client_ip(request))
+
+        version, html = await InvitePageCache.aget(token)
+        headers, not_modified = _conditional_headers(request, invite)
+        if not_modified is not None:
+            return not_modified
+
+        if html is None:
+            # O snapshot não faz queries, por isso a renderização pode correr no event loop
+            html = render_to_string("invitations/invite_detail.html", _invite_page_context(invite), request=request)
+            await InvitePageCache.aset(token, version, html)
+
+        return HttpResponse(InvitePageCache.restore_csrf(html, request), headers=headers)
+
+    except Exception as e:
+        return _invite_error_response(request, token, e)
+
+def _rsvp_redirect_url(token, status, guest):
+    # If accepted, and guest profile incomplete, redirect with a flag to open profile modal
+    redirect_url = reverse('invitations:invite_detail', kwargs={'token': token})
+    if status == 'accepted' and _profile_incomplete(guest):
+        redirect_url = f"{redirect_url}?{urlencode({'profile_modal': '1'})}"
+    return redirect_url
 
 def respond_invite(request, token):
     """
     Processa resposta RSVP do convidado com validações aprimoradas
     """
-    invite = get_object_or_404(Invite, token=token, is_active=True)
+    # O convidado é usado no redirect e no template: carregado na mesma query
+    invite = get_object_or_404(Invite.objects.select_related('guest'), token=token, is_active=True)
     
     # Valida acesso
     is_valid, error_message = InviteService.validate_invite_access(invite)
@@ -179,14 +301,7 @@ def respond_invite(request, token):
         )
         
         if success:
-            # If accepted, and guest profile incomplete, redirect with a flag to open profile modal
-            redirect_url = reverse('invitations:invite_detail', kwargs={'token': token})
-            if status == 'accepted':
-                guest = invite.guest
-                profile_incomplete = (not getattr(guest, 'dietary_restrictions', None)) or (not getattr(guest, 'music_suggestion', None))
-                if profile_incomplete:
-                    redirect_url = f"{redirect_url}?{urlencode({'profile_modal': '1'})}"
-            return redirect(redirect_url)
+            return redirect(_rsvp_redirect_url(token, status, invite.guest))
         else:
             # Retorna erro se processamento falhou
             return render(request, "invitations/invite_detail.html", {
@@ -200,6 +315,35 @@ def respond_invite(request, token):
         'media_data': InviteService.get_optimized_media_urls(invite.guest)
     })
 
+async def respond_invite_async(request, token):
+    """
+    Versão assíncrona (ASGI) de `respond_invite`
+    """
+    invite = await aget_object_or_404(Invite.objects.select_related('guest'), token=token, is_active=True)
+
+    is_valid, error_message = InviteService.validate_invite_access(invite)
+    if not is_valid:
+        raise PermissionDenied(error_message)
+
+    context = {
+        'invite': invite,
+        'media_data': InviteService.get_optimized_media_urls(invite.guest),
+    }
+
+    if request.method == "POST":
+        status = request.POST.get('invitation_status')
+        decline_reason = request.POST.get('decline_reason', '').strip()
+
+        success, message = await InviteService.aprocess_rsvp_response(
+            invite, status, decline_reason
+        )
+        if success:
+            return redirect(_rsvp_redirect_url(token, status, invite.guest))
+        context['error_message'] = message
+
+    # O template acede a invite.gamification (query), por isso renderiza numa thread
+    return await sync_to_async(render)(request, "invitations/invite_detail.html", context)
+
 def get_client_ip(request):
     """
     Obtém o IP real do cliente
@@ -211,106 +355,67 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-def generate_qr_code_image(link):
-    """Gera um QR code em formato PNG para o link fornecido e retorna o objeto de imagem"""
-    qr = QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(link)
-    qr.make(fit=True)
+def generate_qr_code_vector(link):
+    return mark_safe(QRCodeService.render_svg(link))
 
-    img = qr.make_image(fill_color="black", back_color="white")
-    return img
+def _parse_profile_payload(request):
+    """
+    Lê o corpo JSON { dietary, music, gender } do pedido.
+    Retorna (payload, resposta de erro).
+    """
+    if request.method != 'POST':
+        return None, JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
 
-def generate_qr_code_vector(link):
-    qr = QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(link)
-    qr.make(fit=True)
-
-    img = qr.make_image(image_factory=SvgImage)
-
-    buffer = BytesIO()
-    img.save(buffer)
-    svg = buffer.getvalue().decode("utf-8")
-
-    # Remove declaração XML
-    svg = re.sub(r'^\s*<\?xml[^>]*>\s*', '', svg)
-    svg = re.sub(r'\s+xmlns:svg="[^"]+"', '', svg)
-    svg = re.sub(r'<(/?)svg:', r'<\1', svg)
-    svg = re.sub(r'([0-9]+(?:\.[0-9]+)?)mm', r'\1', svg)
-
-    # Adiciona fill="black" em todos os <rect>
-    svg = re.sub(r'<rect\b([^>]*)>', r'<rect\1 fill="black">', svg)
-
-    wh_match = re.search(r'<svg[^>]*\bwidth="([\d\.]+)(?:mm|px)?"[^>]*\bheight="([\d\.]+)(?:mm|px)?"[^>]*>', svg)
-    open_tag_match = re.search(r'<svg[^>]*>', svg)
-    if open_tag_match:
-        if wh_match:
-            w = float(wh_match.group(1))
-            h = float(wh_match.group(2))
-        else:
-            w = h = 200.0
-        new_tag = f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {int(w)} {int(h)}" width="200" height="200">'
-        svg = svg[:open_tag_match.start()] + new_tag + svg[open_tag_match.end():]
+    try:
+        return json.loads(request.body.decode('utf-8') or '{}'), None
+    except Exception:
+        return None, JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+
+def _apply_profile_payload(guest, payload):
+    """
+    Aplica o payload ao convidado.
+    Maps gender ('male'|'female'|'other'|'') to Guest.gender ('M'|'F'|None).
+    """
+    dietary = payload.get('dietary')
+    music = payload.get('music')
+    gender_in = (payload.get('gender') or '').lower()
+
+    # Map gender to Guest.gender choices
+    if gender_in == 'male' or gender_in == 'm':
+        gender_val = 'M'
+    elif gender_in == 'female' or gender_in == 'f':
+        gender_val = 'F'
     else:
-        svg = f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 200 200" width="200" height="200">{svg}</svg>'
+        gender_val = None
 
-    return mark_safe(svg)
+    if dietary is not None:
+        guest.dietary_restrictions = dietary.strip()[:200]
+    if music is not None:
+        guest.music_suggestion = music.strip()[:200]
+    # Update gender only if provided
+    if gender_in != '':
+        guest.gender = gender_val
 
 def complete_profile(request, token):
     """
     Endpoint to complete guest profile after RSVP accept.
     Expects JSON body: { dietary, music, gender }
-    Maps gender ('male'|'female'|'other'|'') to Guest.gender ('M'|'F'|None).
     Returns JSON response.
     """
     try:
-        invite = get_object_or_404(Invite, token=token, is_active=True)
+        invite = get_object_or_404(Invite.objects.select_related('guest'), token=token, is_active=True)
 
         # Validate access
         is_valid, error_message = InviteService.validate_invite_access(invite)
         if not is_valid:
             return JsonResponse({'success': False, 'error': str(error_message)}, status=403)
 
-        if request.method != 'POST':
-            return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
-
-        # Parse JSON body
-        try:
-            payload = json.loads(request.body.decode('utf-8') or '{}')
-        except Exception:
-            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
-
-        dietary = payload.get('dietary')
-        music = payload.get('music')
-        gender_in = (payload.get('gender') or '').lower()
-
-        # Map gender to Guest.gender choices
-        if gender_in == 'male' or gender_in == 'm':
-            gender_val = 'M'
-        elif gender_in == 'female' or gender_in == 'f':
-            gender_val = 'F'
-        else:
-            gender_val = None
+        payload, error_response = _parse_profile_payload(request)
+        if error_response is not None:
+            return error_response
 
         guest = invite.guest
-
-        if dietary is not None:
-            guest.dietary_restrictions = dietary.strip()[:200]
-        if music is not None:
-            guest.music_suggestion = music.strip()[:200]
-        # Update gender only if provided
-        if gender_in != '':
-            guest.gender = gender_val
-
+        _apply_profile_payload(guest, payload)
         guest.save()
 
         return JsonResponse({'success': True})
@@ -320,7 +425,34 @@ def complete_profile(request, token):
     except PermissionDenied as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=403)
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
+        logger.exception('Error saving profile')
+        return JsonResponse({'success': False, 'error': 'Server error'}, status=500)
+
+async def complete_profile_async(request, token):
+    """
+    Versão assíncrona (ASGI) de `complete_profile`
+    """
+    try:
+        invite = await aget_object_or_404(Invite.objects.select_related('guest'), token=token, is_active=True)
+
+        is_valid, error_message = InviteService.validate_invite_access(invite)
+        if not is_valid:
+            return JsonResponse({'success': False, 'error': str(error_message)}, status=403)
+
+        payload, error_response = _parse_profile_payload(request)
+        if error_response is not None:
+            return error_response
+
+        guest = invite.guest
+        _apply_profile_payload(guest, payload)
+        await guest.asave()
+
+        return JsonResponse({'success': True})
+
+    except Http404:
+        return JsonResponse({'success': False, 'error': 'Invite not found'}, status=404)
+    except PermissionDenied as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=403)
+    except Exception:
         logger.exception('Error saving profile')
         return JsonResponse({'success': False, 'error': 'Server error'}, status=500)
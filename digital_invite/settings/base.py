@@ -52,6 +52,9 @@ TEMPLATES = [
 WSGI_APPLICATION = 'digital_invite.wsgi.application'
 ASGI_APPLICATION = 'digital_invite.asgi.application'
 
+# Descarta o buffer de acessos antes de destruir a base de dados de testes
+TEST_RUNNER = 'digital_invite.test_runner.TestRunner'
+
 # Default DB (can be overridden in prod.py via DATABASE_URL)
 DATABASES = {
     'default': {
@@ -76,6 +79,9 @@ USE_I18N = True
 USE_TZ = True
 
 # Cache Configuration
+# O LocMemCache é por processo: com vários workers em produção use um cache
+# partilhado (Redis, Memcached), senão o ranking (LEADERBOARD_*) e as
+# invalidações do cache das páginas só chegam ao processo que as fez.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -143,3 +149,91 @@ APPWRITE_PROJECT_ID = os.getenv('APPWRITE_PROJECT_ID')
 APPWRITE_API_KEY = os.getenv('APPWRITE_API_KEY')
 APPWRITE_BUCKET_ID = os.getenv('APPWRITE_BUCKET_ID')
 APPWRITE_ENDPOINT = os.getenv('APPWRITE_ENDPOINT')
+
+# Buffer de escrita dos acessos aos convites (apps/invitations/services/access_recorder.py)
+INVITE_ACCESS_FLUSH_INTERVAL = float(os.getenv('INVITE_ACCESS_FLUSH_INTERVAL', '5'))
+INVITE_ACCESS_FLUSH_THRESHOLD = int(os.getenv('INVITE_ACCESS_FLUSH_THRESHOLD', '100'))
+
+# Cache do HTML renderizado da página do convite (invalidado por sinais). Com o
+# LocMemCache a invalidação só chega a um worker: o TTL é limitado a 900 segundos
+INVITE_PAGE_CACHE_TIMEOUT = int(os.getenv('INVITE_PAGE_CACHE_TIMEOUT', '900'))
+
+# Views assíncronas do convite (ative quando servir com ASGI, ex.: uvicorn)
+INVITE_ASYNC_VIEWS = os.getenv('INVITE_ASYNC_VIEWS', '0') == '1'
+
+# Proteção contra stampede no cache dos convites: lock partilhado entre processos
+# (útil com um cache partilhado, ex.: Redis) e refresh antecipado probabilístico
+INVITE_CACHE_CROSS_PROCESS_LOCK = os.getenv('INVITE_CACHE_CROSS_PROCESS_LOCK', '0') == '1'
+INVITE_CACHE_EARLY_REFRESH_BETA = float(os.getenv('INVITE_CACHE_EARLY_REFRESH_BETA', '1.0'))
+
+# Bloom filter de tokens válidos e cache negativo (apps/invitations/services/token_guard.py)
+INVITE_TOKEN_FILTER_ERROR_RATE = float(os.getenv('INVITE_TOKEN_FILTER_ERROR_RATE', '0.001'))
+INVITE_TOKEN_FILTER_MAX_AGE = int(os.getenv('INVITE_TOKEN_FILTER_MAX_AGE', '300'))
+INVITE_NEGATIVE_CACHE_TIMEOUT = int(os.getenv('INVITE_NEGATIVE_CACHE_TIMEOUT', '60'))
+
+# Fila de tarefas em segundo plano (processada com `python manage.py run_jobs`).
+# Com JOB_QUEUE_ENABLED=0 as tarefas são executadas de imediato no pedido.
+JOB_QUEUE_ENABLED = os.getenv('JOB_QUEUE_ENABLED', '1') == '1'
+JOB_QUEUE_DIR = BASE_DIR / 'media' / 'job_queue'
+JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv('JOB_QUEUE_MAX_ATTEMPTS', '5'))
+JOB_QUEUE_BACKOFF_SECONDS = int(os.getenv('JOB_QUEUE_BACKOFF_SECONDS', '5'))
+
+# Upload em lote (AppwriteService.upload_many): processos para redimensionar e
+# threads para enviar em paralelo
+UPLOAD_RESIZE_PROCESSES = int(os.getenv('UPLOAD_RESIZE_PROCESSES', '0')) or None
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '4'))
+
+# Ligações ao Appwrite (apps/core/services/appwrite_client.py)
+APPWRITE_CONNECT_TIMEOUT = float(os.getenv('APPWRITE_CONNECT_TIMEOUT', '5'))
+APPWRITE_READ_TIMEOUT = float(os.getenv('APPWRITE_READ_TIMEOUT', '30'))
+APPWRITE_POOL_SIZE = int(os.getenv('APPWRITE_POOL_SIZE', '10'))
+# Acima deste tamanho os uploads usam um ficheiro temporário em vez de memória
+UPLOAD_MEMORY_LIMIT = int(os.getenv('UPLOAD_MEMORY_LIMIT', str(25 * 1024 * 1024)))
+
+# Variantes geradas no upload (lado maior em píxeis), em WebP e JPEG.
+# A maior variante JPEG é o ficheiro principal (Guest.avatar_id / Guest.memories),
+# por isso fica no tamanho que os uploads já tinham (500 e 800).
+MEDIA_DERIVATIVE_SIZES = {
+    'avatar': {'thumb': 160, 'medium': 500},
+    'memory': {'thumb': 300, 'medium': 600, 'full': 800},
+}
+MEDIA_DERIVATIVE_FORMATS = ('webp', 'jpeg')
+
+# Uploads em partes (vídeos): tentativas por parte antes de interromper o envio
+UPLOAD_CHUNK_RETRIES = int(os.getenv('UPLOAD_CHUNK_RETRIES', '3'))
+
+# Backend de armazenamento dos ficheiros (apps/core/services/storage_backends.py):
+# 'appwrite', 'local' (disco, servido pelo Django) ou 'memory' (testes e benchmarks).
+# Os backends locais usam os mesmos ids e o mesmo formato de URL do Appwrite.
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'appwrite')
+STORAGE_LOCAL_ROOT = BASE_DIR / 'media' / 'storage'
+STORAGE_LOCAL_ENDPOINT = os.getenv('STORAGE_LOCAL_ENDPOINT', '/local/v1')
+
+# Domínio público dos convites, usado nos links dos QR codes regenerados em lote
+# (python manage.py regenerate_qr_codes); ex.: https://convites.exemplo.com
+INVITE_BASE_URL = os.getenv('INVITE_BASE_URL', '')
+
+# QR codes gerados a pedido (invitations:invite_qr_code): cache em memória por
+# processo e em disco, partilhado. Com QR_BACKFILL_STORAGE=1 o primeiro pedido
+# também envia o QR code para o storage (Invite.qr_code_id) em segundo plano.
+QR_CACHE_DIR = BASE_DIR / 'media' / 'qr_cache'
+QR_CACHE_MEMORY_BYTES = int(os.getenv('QR_CACHE_MEMORY_BYTES', str(8 * 1024 * 1024)))
+QR_CACHE_DISK_BYTES = int(os.getenv('QR_CACHE_DISK_BYTES', str(200 * 1024 * 1024)))
+QR_BACKFILL_STORAGE = os.getenv('QR_BACKFILL_STORAGE', '0') == '1'
+# Cache HTTP do QR code (segundos); o ETag muda com o link codificado
+QR_HTTP_MAX_AGE = int(os.getenv('QR_HTTP_MAX_AGE', '3600'))
+
+# Ranking (apps/gamification/services/leaderboard.py): lugares mostrados, idade
+# máxima da cópia em memória (as alterações dos outros processos chegam pelo
+# cache, que tem de ser partilhado), intervalo mínimo entre gravações de
+# Gamification.rank e validade da página renderizada
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', '20'))
+LEADERBOARD_MAX_AGE = int(os.getenv('LEADERBOARD_MAX_AGE', '300'))
+LEADERBOARD_PERSIST_INTERVAL = int(os.getenv('LEADERBOARD_PERSIST_INTERVAL', '60'))
+LEADERBOARD_PAGE_CACHE_TIMEOUT = int(os.getenv('LEADERBOARD_PAGE_CACHE_TIMEOUT', '3600'))
+
+# Eventos de gamificação (apps/gamification/services/event_log.py): segundos
+# entre o primeiro evento e a agregação (junta os eventos num só lote) e
+# eventos por lote
+GAMIFICATION_AGGREGATE_DELAY = int(os.getenv('GAMIFICATION_AGGREGATE_DELAY', '2'))
+GAMIFICATION_EVENT_BATCH_SIZE = int(os.getenv('GAMIFICATION_EVENT_BATCH_SIZE', '1000'))
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Descarta o buffer de acessos dos convites antes de destruir as bases de
+    dados de testes, para que o flush no fim do processo não o grave noutra
+    base de dados (ver AccessRecorder)
+    """
+
+    def teardown_databases(self, old_config, **kwargs):
+        from apps.invitations.services.access_recorder import access_recorder  # importação local
+
+        access_recorder.discard()
+        super().teardown_databases(old_config, **kwargs)
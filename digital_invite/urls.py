@@ -29,6 +29,12 @@ urlpatterns = [
     path('gamification/', include('apps.gamification.urls')),
 ]
 
+# Ficheiros dos backends de storage locais ('local'/'memory'), com o formato de URL do Appwrite
+if settings.STORAGE_BACKEND != 'appwrite':
+    urlpatterns += [
+        path(f"{settings.STORAGE_LOCAL_ENDPOINT.strip('/')}/", include('apps.core.urls')),
+    ]
+
 
 # Adiciona URLs para arquivos de mídia durante o desenvolvimento
 if settings.DEBUG:
@@ -0,0 +1,109 @@
+"""
+Compara o caminho síncrono (WSGI) e assíncrono (ASGI) da página do convite.
+
+Cria convites numa base de dados de teste e dispara pedidos concorrentes:
+as views síncronas através de um pool de threads (como um worker WSGI com
+threads) e as assíncronas com asyncio.gather num único event loop.
+
+Uso: python scripts/bench_async_views.py [--requests 500] [--concurrency 50] [--invites 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_invite.settings.dev')
+os.environ.setdefault('APPWRITE_ENDPOINT', 'http://appwrite.local/v1')
+os.environ.setdefault('APPWRITE_PROJECT_ID', 'bench')
+os.environ.setdefault('APPWRITE_BUCKET_ID', 'bench')
+
+import django
+django.setup()
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.utils import setup_test_environment
+
+from apps.guests.models import Guest
+from apps.invitations import views
+from apps.invitations.models import Invite
+from apps.invitations.services.access_recorder import access_recorder
+
+
+def create_invites(count):
+    tokens = []
+    for i in range(count):
+        guest = Guest.objects.create(first_name=f"Convidado {i}", avatar_id=f"avatar{i}",
+                                     memories=[f"mem{i}_{j}" for j in range(5)])
+        tokens.append(Invite.objects.create(guest=guest).token)
+    return tokens
+
+
+def bench_sync(tokens, total, concurrency):
+    factory = RequestFactory()
+
+    def hit(i):
+        token = tokens[i % len(tokens)]
+        request = factory.get(f"/invitations/detail/{token}/")
+        return views.invite_detail(request, token).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(hit, range(total)))
+    return time.perf_counter() - start, statuses
+
+
+def bench_async(tokens, total, concurrency):
+    factory = AsyncRequestFactory()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def hit(i):
+        token = tokens[i % len(tokens)]
+        async with semaphore:
+            request = factory.get(f"/invitations/detail/{token}/")
+            response = await views.invite_detail_async(request, token)
+            return response.status_code
+
+    async def run():
+        return await asyncio.gather(*(hit(i) for i in range(total)))
+
+    start = time.perf_counter()
+    statuses = asyncio.run(run())
+    return time.perf_counter() - start, statuses
+
+
+def report(label, elapsed, statuses):
+    ok = sum(1 for status in statuses if status == 200)
+    print(f"{label:<8} {len(statuses)} pedidos em {elapsed:.3f}s "
+          f"({len(statuses) / elapsed:.0f} req/s, {ok} com 200)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--invites', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        tokens = create_invites(args.invites)
+
+        for label, bench in (("sync", bench_sync), ("async", bench_async)):
+            cache.clear()
+            elapsed, statuses = bench(tokens, args.requests, args.concurrency)
+            report(label, elapsed, statuses)
+        access_recorder.flush()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
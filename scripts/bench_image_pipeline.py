@@ -0,0 +1,95 @@
+"""
+Compara o pipeline antigo de upload de imagens (ficheiro temporário, Pillow a
+abrir o ficheiro duas vezes, resize e nova escrita em disco) com o pipeline em
+memória de `AppwriteService.upload_file` (deteção pelo cabeçalho, modo draft
+para JPEG, um único decode). O envio para o Appwrite é substituído por um stub.
+
+Uso: python scripts/bench_image_pipeline.py [--files 10] [--size 4000x3000]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_invite.settings.dev')
+
+import django
+django.setup()
+
+from appwrite.input_file import InputFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from apps.core.services.appwrite_service import AppwriteService
+
+RESIZE_TO = (800, 800)
+
+
+def make_photo(width, height, seed):
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (width, height))
+    block = 50
+    for x in range(0, width, block):
+        for y in range(0, height, block):
+            img.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (x, y, x + block, y + block))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def stub_upload(input_file, permissions):
+    # Lê o conteúdo como o SDK faria antes de o enviar
+    if input_file.source_type == "path":
+        with open(input_file.path, "rb") as f:
+            f.read()
+    return "stub"
+
+
+def legacy_upload(file, resize_to):
+    """Pipeline anterior: tudo passa por um ficheiro temporário"""
+    temp_path = AppwriteService._save_temp_file(file)
+    try:
+        if AppwriteService._is_image(temp_path):
+            AppwriteService._resize_image(temp_path, resize_to)
+        return stub_upload(InputFile.from_path(temp_path), ['read("any")'])
+    finally:
+        os.unlink(temp_path)
+
+
+def measure(label, photos, upload):
+    files = [SimpleUploadedFile(f"foto{i}.jpg", data, content_type="image/jpeg") for i, data in enumerate(photos)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for f in files:
+        upload(f)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:6.2f}s  {elapsed / len(files) * 1000:7.1f} ms/ficheiro  pico {peak / 1024 / 1024:6.1f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--size', default="4000x3000")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    photos = [make_photo(width, height, seed) for seed in range(args.files)]
+    AppwriteService._upload_to_storage = staticmethod(stub_upload)
+
+    print(f"{args.files} fotos JPEG {args.size} -> {RESIZE_TO[0]}x{RESIZE_TO[1]}")
+    legacy = measure("temp-file", photos, lambda f: legacy_upload(f, RESIZE_TO))
+    current = measure("em memória", photos, lambda f: AppwriteService.upload_file(f, resize_to=RESIZE_TO))
+    print(f"speedup      {legacy / current:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
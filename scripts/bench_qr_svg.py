@@ -0,0 +1,83 @@
+"""
+Compara o SVG antigo dos QR codes (SvgImage do qrcode com um `<rect>` por
+módulo e sete passagens de regex) com `QRCodeService.render_svg` (um único
+`<path>`, com cache LRU): tempo por QR code, com e sem cache, e tamanho do markup.
+
+Uso: python scripts/bench_qr_svg.py [--links 200] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from io import BytesIO
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_invite.settings.dev')
+
+import django
+django.setup()
+
+import qrcode
+from qrcode.image.svg import SvgImage
+from qrcode.main import QRCode
+
+from apps.invitations.services import qr_service
+from apps.invitations.services.qr_service import QRCodeService
+
+
+def legacy_svg(link):
+    """Implementação anterior de generate_qr_code_vector"""
+    qr = QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(link)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(image_factory=SvgImage).save(buffer)
+    svg = buffer.getvalue().decode("utf-8")
+    svg = re.sub(r'^\s*<\?xml[^>]*>\s*', '', svg)
+    svg = re.sub(r'\s+xmlns:svg="[^"]+"', '', svg)
+    svg = re.sub(r'<(/?)svg:', r'<\1', svg)
+    svg = re.sub(r'([0-9]+(?:\.[0-9]+)?)mm', r'\1', svg)
+    svg = re.sub(r'<rect\b([^>]*)>', r'<rect\1 fill="black">', svg)
+    wh_match = re.search(r'<svg[^>]*\bwidth="([\d\.]+)(?:mm|px)?"[^>]*\bheight="([\d\.]+)(?:mm|px)?"[^>]*>', svg)
+    open_tag_match = re.search(r'<svg[^>]*>', svg)
+    w = float(wh_match.group(1)) if wh_match else 200.0
+    new_tag = f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {int(w)} {int(w)}" width="200" height="200">'
+    return svg[:open_tag_match.start()] + new_tag + svg[open_tag_match.end():]
+
+
+def measure(label, links, render, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        sizes = [len(render(link).encode()) for link in links]
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<16} {elapsed / len(links) * 1000:7.2f} ms/QR  markup médio {sum(sizes) / len(sizes) / 1024:6.1f} KB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    links = [f"https://convites.exemplo.com/invitations/detail/{i:032x}/" for i in range(args.links)]
+
+    print(f"{args.links} links, ERROR_CORRECT_H")
+    legacy = measure("rect + regex", links, legacy_svg, args.repeat)
+
+    def uncached(link):
+        qr_service._render_svg.cache_clear()
+        return QRCodeService.render_svg(link)
+
+    direct = measure("path", links, uncached, args.repeat)
+    for link in links:
+        QRCodeService.render_svg(link)
+    cached = measure("path (cache)", links, QRCodeService.render_svg, args.repeat)
+    print(f"speedup          {legacy / direct:.1f}x sem cache, {legacy / cached:.0f}x com cache")
+
+
+if __name__ == '__main__':
+    main()
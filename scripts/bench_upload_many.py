@@ -0,0 +1,84 @@
+"""
+Compara o upload sequencial (`AppwriteService.upload_file` em ciclo) com o
+upload em lote (`AppwriteService.upload_many`), usando um stub local no lugar
+do Appwrite que simula a latência de rede.
+
+Uso: python scripts/bench_upload_many.py [--files 12] [--latency 0.15] [--size 3000x2000]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_invite.settings.dev')
+
+import django
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from apps.core.services.appwrite_service import AppwriteService
+
+
+def make_photo(width, height, seed):
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (width, height))
+    # Blocos de cor para que o JPEG tenha um tamanho realista
+    block = 50
+    for x in range(0, width, block):
+        for y in range(0, height, block):
+            img.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (x, y, x + block, y + block))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def stub_upload(latency):
+    counter = {'n': 0}
+
+    def upload(input_file, permissions):
+        time.sleep(latency)
+        counter['n'] += 1
+        return f"stub{counter['n']}"
+
+    return upload
+
+
+def uploads(photos):
+    return [SimpleUploadedFile(f"foto{i}.jpg", data, content_type="image/jpeg") for i, data in enumerate(photos)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.15, help="latência simulada por upload (s)")
+    parser.add_argument('--size', default="3000x2000")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    photos = [make_photo(width, height, seed) for seed in range(args.files)]
+    AppwriteService._upload_to_storage = staticmethod(stub_upload(args.latency))
+
+    start = time.perf_counter()
+    sequential = [AppwriteService.upload_file(f, resize_to=(800, 800), dedupe=False) for f in uploads(photos)]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = AppwriteService.upload_many(uploads(photos), resize_to=(800, 800), dedupe=False)
+    batch_time = time.perf_counter() - start
+
+    failures = [r for r in batch if r['error']]
+    print(f"{args.files} fotos {args.size}, latência simulada {args.latency}s")
+    print(f"sequencial   {sequential_time:.2f}s ({sum(1 for r in sequential if r)} ok)")
+    print(f"upload_many  {batch_time:.2f}s ({len(batch) - len(failures)} ok, {len(failures)} falhas)")
+    print(f"speedup      {sequential_time / batch_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()